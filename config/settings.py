@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from decouple import config
+import json
 import os
 from pathlib import Path
 
@@ -50,6 +51,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -129,3 +133,120 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Load Gemini API key from environment variables
+
+# LLM response cache (a local SQLite file shared by every worker on the host)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'llm_cache.sqlite3'))
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+# ai_handler function names that should always go to the model. The
+# suggestion endpoints are asked again when the user wants a different
+# wording, so replaying the previous answer would defeat them.
+LLM_CACHE_EXCLUDED_FUNCTIONS = [
+    name.strip() for name in os.getenv(
+        'LLM_CACHE_EXCLUDED_FUNCTIONS',
+        'generate_ai_suggestion,generate_quick_suggestion,conversational_edit_suggestion'
+    ).split(',') if name.strip()
+]
+
+# LLM backend: 'gemini' (production), 'fake' (offline benchmarks/load tests)
+# or a dotted path to a core.llm_backends.LLMBackend subclass
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+LLM_MODEL_NAME = os.getenv('LLM_MODEL_NAME', 'gemini-2.0-flash-exp')
+# JSON keyword arguments for non-Gemini backends, e.g. for 'fake':
+# {"latency": {"distribution": "lognormal", "mean": 2.0, "stddev": 1.0, "max": 20},
+#  "error_rate": 0.02, "seed": 42}
+LLM_BACKEND_OPTIONS = json.loads(os.getenv('LLM_BACKEND_OPTIONS', '{}'))
+
+# Threads available to the async views (core/async_views.py) for blocking
+# model calls; bounds the number of in-flight generations per ASGI worker
+LLM_ASYNC_MAX_WORKERS = int(os.getenv('LLM_ASYNC_MAX_WORKERS', 200))
+
+# get_recommendations runs its internal/external branches concurrently
+RECOMMENDATION_WORKERS = int(os.getenv('RECOMMENDATION_WORKERS', 8))
+RECOMMENDATION_BRANCH_TIMEOUT = float(os.getenv('RECOMMENDATION_BRANCH_TIMEOUT', 60))
+
+# BM25 index over the internal product catalog (core/product_index.py)
+PRODUCT_INDEX_PATH = os.getenv('PRODUCT_INDEX_PATH', os.path.join(BASE_DIR, 'product_index.json'))
+
+# Passage store over product PDFs (core/passages.py)
+PASSAGE_INDEX_PATH = os.getenv('PASSAGE_INDEX_PATH', os.path.join(BASE_DIR, 'passage_index.json'))
+RECOMMENDATION_PASSAGES = int(os.getenv('RECOMMENDATION_PASSAGES', 8))  # top-k passages per prompt
+PASSAGE_PROMPT_CHARS = int(os.getenv('PASSAGE_PROMPT_CHARS', 3000))
+
+# Background ingestion of product PDFs (manage.py ingest_products)
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))  # PDF parsing processes
+INGESTION_STALE_SECONDS = int(os.getenv('INGESTION_STALE_SECONDS', 1800))  # reclaim stuck 'processing' rows
+
+# Uploaded RFPs/supporting documents are only parsed up to this many characters
+PDF_TEXT_MAX_CHARS = int(os.getenv('PDF_TEXT_MAX_CHARS', 20000))
+# Supporting documents' budget; 0 keeps their full text, parsed page-parallel below
+SUPPORTING_DOCUMENT_MAX_CHARS = int(os.getenv('SUPPORTING_DOCUMENT_MAX_CHARS', PDF_TEXT_MAX_CHARS))
+# Page-parallel extraction of large PDFs (full-text uploads and product ingestion)
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', 20))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', 8))
+
+# Content-addressed cache of uploaded document text (core/documents.py)
+DOCUMENT_CACHE_MAX_CHARS = int(os.getenv('DOCUMENT_CACHE_MAX_CHARS', 50_000_000))
+DOCUMENT_CACHE_MAX_AGE_DAYS = int(os.getenv('DOCUMENT_CACHE_MAX_AGE_DAYS', 30))
+
+# get_products pagination (core/catalog.py)
+PRODUCT_PAGE_SIZE = int(os.getenv('PRODUCT_PAGE_SIZE', 200))
+PRODUCT_PAGE_SIZE_MAX = int(os.getenv('PRODUCT_PAGE_SIZE_MAX', 1000))
+
+# Rendered concept-note PDFs (core/pdf_cache.py), pre-rendered after generation
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+PDF_PRERENDER_WORKERS = int(os.getenv('PDF_PRERENDER_WORKERS', 2))
+
+# PDF rendering process pool (core/pdf_service.py); a full queue answers 503
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_QUEUE_SIZE = int(os.getenv('PDF_RENDER_QUEUE_SIZE', 8))  # running + waiting renders per web process
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', 120))
+
+# Bulk concept-note export (core/export.py)
+EXPORT_RENDER_WORKERS = int(os.getenv('EXPORT_RENDER_WORKERS', os.cpu_count() or 1))
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', 50))  # rows per cursor fetch
+
+# Background jobs (core/jobs.py, manage.py run_jobs)
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 4))  # jobs run at once per worker process
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 900))  # reclaim 'running' jobs of dead workers
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+
+# Client-side Gemini quota (core/rate_limit.py). Token buckets live in a local
+# SQLite file so every worker process on the host shares one budget; 0 disables a bucket
+LLM_RATE_LIMIT_ENABLED = os.getenv('LLM_RATE_LIMIT_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+LLM_RATE_LIMIT_PATH = os.getenv('LLM_RATE_LIMIT_PATH', os.path.join(BASE_DIR, 'llm_rate_limit.sqlite3'))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 60))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', 1000000))
+LLM_RATE_LIMIT_MAX_WAIT = float(os.getenv('LLM_RATE_LIMIT_MAX_WAIT', 60))  # longer waits answer 429
+# Retries of ResourceExhausted/ServiceUnavailable with full-jitter exponential backoff
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', 4))
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', 1.0))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', 30))
+
+# Prometheus text metrics at /metrics (core/metrics.py), per worker process
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+
+# Server-Timing header on /api/ responses (core/middleware.py); SERVER_TIMING_LOG
+# also writes one JSON line per request to the 'core.timing' logger
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+SERVER_TIMING_LOG = os.getenv('SERVER_TIMING_LOG', 'False').lower() in ('1', 'true', 'yes')
+
+# Per-request cProfile capture (core/middleware.py): with PROFILING_ENABLED, requests
+# sent with an 'X-Profile: 1' header or ?profile=1 are profiled into PROFILE_DIR
+# as <time>_<endpoint>_<session_id>.prof; summarise with 'manage.py profile_summary'
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
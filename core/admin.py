@@ -1,5 +1,29 @@
 from django.contrib import admin
-from .models import InternalProduct, ConceptProject
+from .models import InternalProduct, ConceptProject, SupportingDocument, Job
 
-admin.site.register(InternalProduct)
-admin.site.register(ConceptProject)
\ No newline at end of file
+
+@admin.register(InternalProduct)
+class InternalProductAdmin(admin.ModelAdmin):
+    list_display = ('name', 'ingestion_status', 'ingested_at')
+    list_filter = ('ingestion_status',)
+    readonly_fields = ('extracted_text', 'ingestion_status', 'ingestion_started_at', 'ingested_at', 'ingestion_error')
+
+
+class SupportingDocumentInline(admin.TabularInline):
+    model = SupportingDocument
+    fields = ('filename', 'char_count', 'page_count', 'pages_read', 'truncated', 'created_at')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ConceptProject)
+class ConceptProjectAdmin(admin.ModelAdmin):
+    inlines = [SupportingDocumentInline]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'session_id', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'worker')
@@ -1,21 +1,155 @@
-import google.generativeai as genai
 from django.conf import settings
-import PyPDF2
-import io
 import json
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from io import BytesIO
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from .llm_cache import LLMResponseCache, get_response_cache, is_cacheable
+from .llm_backends import get_backend
+from .rate_limit import call_with_retry, estimate_tokens, get_rate_limiter
+from .single_flight import single_flight
+from . import metrics
+from .product_index import rank_products
+from .passages import retrieve_passages
+from .pdf_render import render_concept_note
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=settings.GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
+# LLM backend (Gemini in production, settings.LLM_BACKEND = 'fake' offline)
+model = get_backend()
+MODEL_NAME = model.model_name
 
+logger = logging.getLogger(__name__)
+
+
+def _generate(contents, function='unknown'):
+    """model.generate_content under the shared rate limiter, with backoff on quota errors"""
+    limiter = get_rate_limiter()
+    started = time.monotonic()
+    try:
+        response = call_with_retry(lambda: model.generate_content(contents), contents, limiter)
+        text = response.text
+    except Exception as e:
+        metrics.LLM_ERRORS.inc(function=function, type=type(e).__name__)
+        raise
+    metrics.record_llm_call(function, contents, text, time.monotonic() - started)
+    if limiter is not None:
+        limiter.charge(estimate_tokens(text))
+    return response
+
+
+def _open_stream(prompt, function='unknown'):
+    """
+    Start a streamed generation and wait for its first chunk. Quota errors
+    surface before anything is yielded, so only this part is retried.
+    Returns (first chunk or None, iterator over the rest).
+    """
+    def start():
+        chunks = iter(model.generate_content(prompt, stream=True))
+        return next(chunks, None), chunks
+    try:
+        return call_with_retry(start, prompt, get_rate_limiter())
+    except Exception as e:
+        metrics.LLM_ERRORS.inc(function=function, type=type(e).__name__)
+        raise
+
+
+def parse_json_response(text):
+    """JSON value of a model response, without a ```json code fence around it"""
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('```')[1]
+        if text.startswith('json'):
+            text = text[4:]
+    return json.loads(text)
+
+
+def is_json_response(text):
+    """validate= callback for prompts that must answer in JSON"""
+    try:
+        parse_json_response(text)
+    except ValueError:
+        return False
+    return True
+
+
+def generate_text(prompt, function='unknown', use_cache=True, validate=None):
+    """
+    Run a text prompt through the model, going through the persistent response
+    cache first. `function` names the caller for per-function opt-out and stats.
+    Identical prompts already in flight in this process share one model call.
+    A response that `validate(text)` rejects is returned but not cached, and a
+    cached one it rejects is generated again.
+    """
+    cache = get_response_cache() if use_cache and is_cacheable(function) else None
+    key = LLMResponseCache.make_key(MODEL_NAME, prompt)
+    if cache is not None:
+        try:
+            cached = cache.get(key, function)
+            if cached is not None and (validate is None or validate(cached)):
+                return cached
+        except Exception as e:
+            print(f"LLM cache read error: {e}")
+            cache = None
+
+    def call():
+        started = time.monotonic()
+        text = _generate(prompt, function).text
+        if cache is not None and (validate is None or validate(text)):
+            try:
+                cache.set(key, text, MODEL_NAME, function, time.monotonic() - started)
+            except Exception as e:
+                print(f"LLM cache write error: {e}")
+        return text
+
+    return single_flight(('generate_text', key), call)
+
+
+def stream_text(prompt, function='unknown', use_cache=True, validate=None):
+    """
+    Streaming counterpart of generate_text: yields text chunks as they arrive.
+    A cache hit is yielded as a single chunk; a completed stream is cached so
+    the blocking and streaming endpoints share entries. `validate` works as in
+    generate_text.
+    """
+    cache = get_response_cache() if use_cache and is_cacheable(function) else None
+    key = None
+    if cache is not None:
+        key = cache.make_key(MODEL_NAME, prompt)
+        try:
+            cached = cache.get(key, function)
+            if cached is not None and (validate is None or validate(cached)):
+                yield cached
+                return
+        except Exception as e:
+            print(f"LLM cache read error: {e}")
+            cache = None
+
+    started = time.monotonic()
+    parts = []
+    first, rest = _open_stream(prompt, function)
+    for chunk in itertools.chain([first] if first is not None else [], rest):
+        try:
+            chunk_text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata only)
+            continue
+        if chunk_text:
+            parts.append(chunk_text)
+            yield chunk_text
+
+    text = "".join(parts)
+    metrics.record_llm_call(function, prompt, text, time.monotonic() - started)
+    if cache is not None and parts and (validate is None or validate(text)):
+        try:
+            cache.set(key, text, MODEL_NAME, function, time.monotonic() - started)
+        except Exception as e:
+            print(f"LLM cache write error: {e}")
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limiter.charge(estimate_tokens(text))
+
+@metrics.instrumented
 def process_audio_with_gemini(audio_file):
     """
     Transcribe audio using Gemini API
@@ -34,7 +168,7 @@ def process_audio_with_gemini(audio_file):
         temp_file.close()
         
         # Upload audio file to Gemini
-        audio_file_gemini = genai.upload_file(temp_file.name)
+        audio_file_gemini = model.upload_file(temp_file.name)
         
         # Transcribe using Gemini
         prompt = """Transcribe this audio accurately. 
@@ -42,7 +176,7 @@ def process_audio_with_gemini(audio_file):
         Include all details mentioned.
         Format the output as clean, readable text."""
         
-        response = model.generate_content([prompt, audio_file_gemini])
+        response = _generate([prompt, audio_file_gemini], 'process_audio_with_gemini')
         
         # Clean up
         os.unlink(temp_file.name)
@@ -52,21 +186,9 @@ def process_audio_with_gemini(audio_file):
     except Exception as e:
         return f"Error transcribing audio: {str(e)}"
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
-    try:
-        pdf_file.seek(0)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return text
-    except Exception as e:
-        return f"Error reading PDF: {str(e)}"
-    
-
 # In ai_handler.py
 
+@metrics.instrumented
 def conversational_edit_suggestion(user_message, selected_text, conversation_history=None):
     """
     Performs precise, direct text editing based on user instructions without
@@ -116,11 +238,12 @@ Now, apply the user's instruction to the original text provided above.
     # --- End of The Fix ---
 
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        response_text = generate_text(prompt, 'conversational_edit_suggestion')
+        return response_text.strip()
     except Exception as e:
         # Return a clean error message without conversational filler
         return f"Error: Could not process the edit request. {str(e)}"
+@metrics.instrumented
 def generate_pre_preview_questions(raw_input, pdf_text=None, highlight_points=None):
     """
     Generate intelligent clarification questions BEFORE creating the preview.
@@ -206,16 +329,9 @@ Return ONLY the JSON array, no additional text.
 """
 
     try:
-        response = model.generate_content(prompt)
-        questions_text = response.text.strip()
-        
-        # Clean up markdown code blocks if present
-        if questions_text.startswith('```'):
-            questions_text = questions_text.split('```')[1]
-            if questions_text.startswith('json'):
-                questions_text = questions_text[4:]
-        
-        questions = json.loads(questions_text)
+        # Unparseable answers are not cached, so the next call asks again
+        response_text = generate_text(prompt, 'generate_pre_preview_questions', validate=is_json_response)
+        questions = parse_json_response(response_text)
         return questions
     
     except Exception as e:
@@ -242,11 +358,9 @@ Return ONLY the JSON array, no additional text.
             }
         ]
 
-def generate_preview(raw_input, highlight_points):
-    """
-    Convert raw client input into a DETAILED, BEAUTIFULLY FORMATTED preview
-    """
-    prompt = f"""You are a senior business analyst. Transform client requirements into a comprehensive, professional document.
+def build_preview_prompt(raw_input, highlight_points):
+    """Prompt used by generate_preview / generate_preview_stream"""
+    return f"""You are a senior business analyst. Transform client requirements into a comprehensive, professional document.
 
 CLIENT'S RAW INPUT:
 {raw_input}
@@ -357,9 +471,24 @@ MOST IMPORTANT: Every section must be filled with content SPECIFIC to this clien
 
 OUTPUT: Professional document following the structure above with content specific to: {raw_input[:100]}"""
 
-    response = model.generate_content(prompt)
-    return response.text.strip()
 
+@metrics.instrumented
+def generate_preview(raw_input, highlight_points):
+    """
+    Convert raw client input into a DETAILED, BEAUTIFULLY FORMATTED preview
+    """
+    prompt = build_preview_prompt(raw_input, highlight_points)
+    response_text = generate_text(prompt, 'generate_preview')
+    return response_text.strip()
+
+
+@metrics.instrumented
+def generate_preview_stream(raw_input, highlight_points):
+    """Same as generate_preview, yielding text chunks as the model produces them"""
+    prompt = build_preview_prompt(raw_input, highlight_points)
+    return stream_text(prompt, 'generate_preview')
+
+@metrics.instrumented
 def generate_clarification_questions(preview, conversation_history, raw_input):
     """
     Generate ONE intelligent clarification question at a time.
@@ -443,71 +572,78 @@ Avoid repeating already asked or answered questions.
 Return just the single question text or "NO_MORE_QUESTIONS".
 """
 
-    response = model.generate_content(prompt)
-    return response.text.strip()
+    response_text = generate_text(prompt, 'generate_clarification_questions')
+    return response_text.strip()
 
 
 # ai_handler.py
 
-def find_internal_matches(preview, all_clarifications, internal_products):
+def rank_internal_products(preview, all_clarifications, internal_products):
+    """
+    Rank products locally (BM25 over name, description and PDF text) and fetch
+    the most relevant PDF passages across them. Runs ORM queries, so
+    generate_recommendations calls it before fanning out to worker threads.
+    Returns: (ranked_products, retrieval or None)
+    """
+    query_text = f"{preview}\n{all_clarifications}"
+    ranked_products = rank_products(query_text, internal_products)
+    ranked_products.sort(key=lambda item: item[1], reverse=True)
+
+    retrieval = None
+    product_ids = [product.pk for product, _ in ranked_products if product.pk is not None]
+    if product_ids:
+        try:
+            retrieval = retrieve_passages(query_text, product_ids=product_ids)
+        except Exception as e:
+            print(f"Passage retrieval error: {e}")
+    if retrieval:
+        logger.debug("%d passages retrieved in %.1fms", len(retrieval), retrieval.retrieval_ms)
+    return ranked_products, retrieval
+
+
+@metrics.instrumented
+def find_internal_matches(preview, all_clarifications, internal_products, ranking=None):
     """
     Extract relevant FEATURES from internal products that can be integrated into client's project
+    `ranking` is the result of rank_internal_products when already computed.
     Returns: Bullet-point recommendations explaining specific features/capabilities that fit their needs
     """
     
-    # Step 1: Extract keywords for smart filtering
-    keywords_prompt = f"""Extract 5-7 key technology/domain keywords from this project.
-    Return ONLY comma-separated keywords (e.g., "healthcare, automation, AI, mobile, payment").
-    
-    PROJECT: {preview[:1000]}
-    CLARIFICATIONS: {all_clarifications[:500]}"""
+    # Steps 1-2: Rank products locally instead of asking the model for keywords
+    # first, and fill the prompt with the most relevant PDF passages
+    if ranking is None:
+        ranking = rank_internal_products(preview, all_clarifications, internal_products)
+    ranked_products, retrieval = ranking
     
-    try:
-        keywords_response = model.generate_content(keywords_prompt)
-        keywords = keywords_response.text.strip().lower()
-    except Exception as e:
-        print(f"Keyword extraction error: {e}")
-        keywords = ""
-    
-    # Step 2: Smart product filtering and feature extraction
-    products_content = ""
-    relevant_products = []
-    keyword_list = [k.strip() for k in keywords.split(',')] if keywords else []
-    
-    for product in internal_products:
-        product_name = product.name.lower()
-        product_desc = (product.description or "").lower()
-        
-        # Calculate relevance score
-        relevance_score = 0
-        for keyword in keyword_list:
-            if keyword in product_name:
-                relevance_score += 3
-            if keyword in product_desc:
-                relevance_score += 2
+    if retrieval:
+        products_content = retrieval.prompt_context()
+        passage_products = list(dict.fromkeys(passage.product.name for passage, _ in retrieval.passages))
+        top_products = passage_products + [
+            product.name for product, score in ranked_products
+            if score > 0 and product.name not in passage_products
+        ]
+    else:
+        # No passages indexed yet: fall back to the head of each product's text
+        products_content = ""
+        relevant_products = []
         
-        # Use cached extracted_text if available
-        if hasattr(product, 'extracted_text') and product.extracted_text:
-            pdf_text = product.extracted_text[:2500]
-        else:
-            try:
-                pdf_text = extract_text_from_pdf(product.pdf_file)[:2500]
-            except Exception as e:
-                print(f"Error reading {product.name}: {e}")
-                continue
+        for product, relevance_score in ranked_products:
+            # PDFs are parsed by the ingestion worker, never here; products it
+            # has not reached yet are described by name/description only
+            pdf_text = (product.extracted_text or "")[:2500]
+            
+            # Include high-relevance products
+            if relevance_score > 0 or len(relevant_products) < 5:
+                char_limit = 3000 if len(relevant_products) < 3 else 1500
+                products_content += f"\n\n=== {product.name} ===\n"
+                if product.description:
+                    products_content += f"Description: {product.description}\n"
+                products_content += f"Available Features: {pdf_text[:char_limit]}\n"
+                relevant_products.append((product.name, relevance_score))
         
-        # Include high-relevance products
-        if relevance_score > 0 or len(relevant_products) < 5:
-            char_limit = 3000 if relevance_score > 2 else 1500
-            products_content += f"\n\n=== {product.name} ===\n"
-            if product.description:
-                products_content += f"Description: {product.description}\n"
-            products_content += f"Available Features: {pdf_text[:char_limit]}\n"
-            relevant_products.append((product.name, relevance_score))
-    
-    # Sort by relevance
-    relevant_products.sort(key=lambda x: x[1], reverse=True)
-    top_products = [p[0] for p in relevant_products[:8]]
+        # Sort by relevance
+        relevant_products.sort(key=lambda x: x[1], reverse=True)
+        top_products = [p[0] for p in relevant_products[:8]]
     
     # Step 3: Generate feature-focused recommendations (IN BULLET POINTS)
     prompt = f"""Analyze which SPECIFIC FEATURES from our products can be ADDED to the client's project.
@@ -544,11 +680,12 @@ Shall I proceed with these suggestions, or would you like to review/add other pr
 
     # CORRECTED INDENTATION IS HERE
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        response_text = generate_text(prompt, 'find_internal_matches')
+        return response_text.strip()
     except Exception as e:
         return f"Error generating internal feature recommendations: {str(e)}"
     
+@metrics.instrumented
 def search_external_solutions(preview, all_clarifications):
     """
     Suggest external technologies (APIs, libraries, tools) that can be integrated
@@ -579,19 +716,68 @@ CRITICAL:
 Output 5–7 concise bullet points:"""
 
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        response_text = generate_text(prompt, 'search_external_solutions')
+        return response_text.strip()
     except Exception as e:
         return f"Error generating external feature recommendations: {str(e)}"
-    
 
-def generate_concept_note(description, highlight_points, document_content, client_vision, extracted_requirements, solution_design, external_features, implementation_plan, reference_context):
+
+INTERNAL_RECOMMENDATIONS_FALLBACK = "Unable to generate internal recommendations at this time. Please try again."
+EXTERNAL_RECOMMENDATIONS_FALLBACK = "Unable to generate external recommendations at this time. Please try again."
+
+# Shared by every recommendation request; each request uses one thread per branch
+_recommendation_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'RECOMMENDATION_WORKERS', 8),
+    thread_name_prefix='recommendations'
+)
+
+
+@metrics.instrumented
+def generate_recommendations(preview, all_clarifications, internal_products, timeout=None):
     """
-    Generate a polished, corporate-level concept note (2-3 pages) with a strategic, professional tone.
-    Updated: Refined for MNC-level professionalism and removed all revenue-related content.
+    Run the internal (find_internal_matches) and external (search_external_solutions)
+    branches concurrently, so the latency is that of the slowest branch instead
+    of the sum of all model round trips.
+    Each branch has its own timeout and error handling: a failed or slow branch
+    falls back to its error message without affecting the other one.
+    Returns: (internal, external)
     """
+    if timeout is None:
+        timeout = getattr(settings, 'RECOMMENDATION_BRANCH_TIMEOUT', 60)
+    # Evaluate the queryset and fetch passages here: worker threads must not touch the ORM
+    internal_products = list(internal_products)
+    ranking = rank_internal_products(preview, all_clarifications, internal_products)
+
+    branches = {
+        'internal': (
+            _recommendation_pool.submit(find_internal_matches, preview, all_clarifications, internal_products, ranking),
+            INTERNAL_RECOMMENDATIONS_FALLBACK,
+        ),
+        'external': (
+            _recommendation_pool.submit(search_external_solutions, preview, all_clarifications),
+            EXTERNAL_RECOMMENDATIONS_FALLBACK,
+        ),
+    }
 
-    concept_prompt = f"""
+    deadline = time.monotonic() + timeout
+    results = {}
+    for name, (future, fallback) in branches.items():
+        try:
+            results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # The branch keeps running; its response still lands in the LLM cache for a retry
+            print(f"{name.capitalize()} recommendations timed out after {timeout}s")
+            results[name] = fallback
+        except Exception as e:
+            print(f"{name.capitalize()} recommendations error: {e}")
+            results[name] = fallback
+
+    return results['internal'], results['external']
+
+
+def build_concept_note_prompt(description, highlight_points, document_content, client_vision, extracted_requirements, solution_design, external_features, implementation_plan, reference_context):
+    """Prompt used by generate_concept_note / generate_concept_note_stream"""
+    return f"""
 Generate a comprehensive, professional concept note (STRICTLY 2-3 pages / 1200-1500 words) that reflects the tone and structure of a top-tier consulting or technology firm document. 
 Use strategic, business-oriented language and focus on clarity, impact, and transformation — NOT on financials or revenue outcomes.
 
@@ -723,102 +909,39 @@ STRICT UNIQUENESS ACROSS SECTIONS:
 Generate the final polished concept note now.
 """
 
-    response = model.generate_content(concept_prompt)
-    return response.text.strip()
-
-
-def generate_pdf(concept_note_text, client_name=None):
-    import re
-    from reportlab.lib import colors
-    from io import BytesIO
-    from reportlab.lib.pagesizes import A4
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-
-    buffer = BytesIO()
-
-    # ✅ Initialize cleaned_text from input
-    cleaned_text = concept_note_text or ""  # fallback if None
-
-    # 🔹 1. Remove "Concept Note - xxxx" lines and similar headers
-    cleaned_text = re.sub(r"(?im)^\s*concept\s*note\s*[-:]\s*\w+\s*$", "", cleaned_text)
-
-    # 🔹 2. Remove markdown and extra characters
-    cleaned_text = cleaned_text.replace("**", "").replace("*", "")
-    cleaned_text = cleaned_text.replace("═", "").replace("─", "").replace("_", "")
-    cleaned_text = re.sub(r"\n{3,}", "\n\n", cleaned_text)  # normalize extra spacing
-
-    # 🔹 3. Convert markdown-style headers into formatted lines
-    cleaned_text = re.sub(r"(?m)^##\s*", "", cleaned_text)  # remove ##
-    cleaned_text = re.sub(r"(?m)^#\s*", "", cleaned_text)   # remove single #
-
-    # 🔹 4. Split lines for rendering
-    lines = cleaned_text.strip().split("\n")
-
-    # Create PDF
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        topMargin=0.75 * inch,
-        bottomMargin=0.75 * inch,
-        leftMargin=1 * inch,
-        rightMargin=1 * inch,
-    )
-
-    styles = getSampleStyleSheet()
 
-    client_style = ParagraphStyle(
-        "ClientTitle",
-        parent=styles["Heading1"],
-        fontSize=18,
-        textColor=colors.HexColor("#4d9eff"),
-        spaceAfter=14,
-        alignment=TA_CENTER,
-        fontName="Helvetica-Bold",
+@metrics.instrumented
+def generate_concept_note(description, highlight_points, document_content, client_vision, extracted_requirements, solution_design, external_features, implementation_plan, reference_context):
+    """
+    Generate a polished, corporate-level concept note (2-3 pages) with a strategic, professional tone.
+    Updated: Refined for MNC-level professionalism and removed all revenue-related content.
+    """
+    concept_prompt = build_concept_note_prompt(
+        description, highlight_points, document_content, client_vision, extracted_requirements,
+        solution_design, external_features, implementation_plan, reference_context
     )
+    response_text = generate_text(concept_prompt, 'generate_concept_note')
+    return response_text.strip()
 
-    heading_style = ParagraphStyle(
-        "CustomHeading",
-        parent=styles["Heading2"],
-        fontSize=14,
-        textColor=colors.HexColor("#4d9eff"),
-        spaceAfter=10,
-        spaceBefore=14,
-        fontName="Helvetica-Bold",
-    )
 
-    body_style = ParagraphStyle(
-        "CustomBody",
-        parent=styles["BodyText"],
-        fontSize=11,
-        leading=15,
-        alignment=TA_LEFT,
-        spaceAfter=8,
-        textColor=colors.black,
-    )
+@metrics.instrumented
+def generate_concept_note_stream(**note_inputs):
+    """Same as generate_concept_note, yielding text chunks as the model produces them"""
+    concept_prompt = build_concept_note_prompt(**note_inputs)
+    return stream_text(concept_prompt, 'generate_concept_note')
 
-    story = []
 
-    # Add client/project name at the top
-    if client_name:
-        story.append(Paragraph(client_name, client_style))
-        story.append(Spacer(1, 0.3 * inch))
+@metrics.instrumented(timing='pdf_render')
+def generate_pdf(concept_note_text, client_name=None):
+    """
+    Render the concept note to PDF. Headings, bullet/numbered lists, tables and
+    bold/italic text are kept (core.pdf_render compiles the Markdown in one pass).
+    Returns a BytesIO positioned at 0.
+    """
+    return render_concept_note(concept_note_text, client_name=client_name)
 
-    # Parse content line-by-line
-    for line in cleaned_text.split("\n"):
-        line = line.strip()
-        if not line:
-            story.append(Spacer(1, 0.1 * inch))
-        elif line.isupper() and len(line) > 5:
-            story.append(Paragraph(line, heading_style))
-        else:
-            story.append(Paragraph(line, body_style))
 
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+@metrics.instrumented
 def extract_client_name_from_content(raw_input, formatted_preview, conversation_history):
     """
     Intelligently extract the actual client/project name from available data.
@@ -877,8 +1000,8 @@ Based on the content above, return ONLY the project/client name or descriptive t
 """
     
     try:
-        response = model.generate_content(prompt)
-        extracted_name = response.text.strip()
+        response_text = generate_text(prompt, 'extract_client_name_from_content')
+        extracted_name = response_text.strip()
         
         # Clean up the response
         extracted_name = extracted_name.replace('"', '').replace("'", "")
@@ -918,6 +1041,7 @@ Based on the content above, return ONLY the project/client name or descriptive t
         
 
 
+@metrics.instrumented
 def generate_ai_suggestion(selected_text, full_context, suggestion_type="improve"):
     """
     Generate AI suggestions for selected text within the preview
@@ -974,8 +1098,8 @@ Just the refined text that can directly replace the original.
 """
 
     try:
-        response = model.generate_content(prompt)
-        suggested_text = response.text.strip()
+        response_text = generate_text(prompt, 'generate_ai_suggestion')
+        suggested_text = response_text.strip()
         
         # Clean up common AI artifacts
         suggested_text = suggested_text.strip('"\'`')
@@ -999,6 +1123,7 @@ Just the refined text that can directly replace the original.
         }
 
 
+@metrics.instrumented
 def generate_multiple_suggestions(selected_text, full_context, count=3):
     """
     Generate multiple alternative suggestions for the selected text
@@ -1017,4 +1142,31 @@ def generate_multiple_suggestions(selected_text, full_context, count=3):
                 'text': result['suggestion']
             })
     
-    return suggestions
\ No newline at end of file
+    return suggestions
+
+
+@metrics.instrumented
+def generate_quick_suggestion(selected_text, suggestion_type="improve", multiple=False):
+    """
+    Context-free rewrite of the selected text used by the inline suggestion
+    popup. Returns the raw model text (numbered options when multiple=True).
+    """
+    if multiple:
+        prompt = f"""
+Generate 3 improved variations of the following sentence or paragraph:
+"{selected_text}"
+
+Each version should maintain the same meaning but vary in tone or phrasing.
+Return only the 3 rewritten options, numbered clearly.
+"""
+    else:
+        prompt = f"""
+Rewrite or {suggestion_type} the following text:
+"{selected_text}"
+
+Make it concise, natural, and contextually improved, keeping the same intent.
+Return only the rewritten version, no explanations.
+"""
+
+    response_text = generate_text(prompt, 'generate_quick_suggestion')
+    return response_text.strip()
@@ -0,0 +1,329 @@
+"""
+Async variants of the LLM-bound endpoints, for ASGI deployments (config.asgi).
+
+Request handling and ORM access run on the event loop (Django's async ORM
+API); the blocking model calls in ai_handler run on a bounded thread pool
+(settings.LLM_ASYNC_MAX_WORKERS), so one uvicorn worker can keep many
+generations in flight without tying up a thread per connection.
+They are served under /api/async/... with the same payloads and responses
+as the synchronous views in views.py.
+"""
+import asyncio
+import contextvars
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from asgiref.sync import sync_to_async
+from google.api_core.exceptions import ResourceExhausted
+
+from .models import ConceptProject, UploadedDocument
+from .llm_backends import get_backend
+from .clarifications import aload_history
+from .pdf_cache import prerender as prerender_pdf
+from .responses import JsonResponse
+from .documents import parse_document_ids, get_documents, documents_text, attach_documents
+from . import ai_handler
+from .views import _build_preview_input, _map_concept_note_inputs, _recommendations_payload
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'LLM_ASYNC_MAX_WORKERS', 200),
+    thread_name_prefix='llm'
+)
+
+
+async def run_llm(func, *args, **kwargs):
+    """Run a blocking ai_handler call on the bounded LLM thread pool"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context so the call shows up in its Server-Timing breakdown
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(context.run, func, *args, **kwargs))
+
+
+def async_csrf_exempt(view_func):
+    """csrf_exempt for coroutine views (Django 4.2's decorator hides the coroutine)"""
+    view_func.csrf_exempt = True
+    return view_func
+
+
+@async_csrf_exempt
+async def upload_audio(request):
+    if request.method == 'POST':
+        try:
+            uploaded_file = request.FILES.get('audio')
+            if not uploaded_file:
+                return JsonResponse({'error': 'No audio file provided'}, status=400)
+            transcribed_text = await run_llm(ai_handler.process_audio_with_gemini, uploaded_file)
+            return JsonResponse({
+                'success': True,
+                'transcribed_text': transcribed_text,
+                'filename': uploaded_file.name
+            })
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'error': 'POST method required'}, status=405)
+
+
+@async_csrf_exempt
+async def initiate_project(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            raw_input = data.get('raw_input', '').strip()
+            highlight_points = data.get('highlight_points', '')
+
+            if not raw_input:
+                return JsonResponse({'error': 'Description is required'}, status=400)
+
+            try:
+                documents = await sync_to_async(get_documents)(parse_document_ids(data))
+            except UploadedDocument.DoesNotExist as e:
+                return JsonResponse({'error': str(e)}, status=404)
+            legacy_text = data.get('pdf_text', '')
+            pdf_text = documents_text(documents, legacy_text)
+
+            session_id = str(uuid.uuid4())[:8]
+            questions = await run_llm(ai_handler.generate_pre_preview_questions, raw_input, pdf_text, highlight_points)
+
+            project = await ConceptProject.objects.acreate(
+                session_id=session_id,
+                raw_input=raw_input,
+                pre_preview_questions=questions
+            )
+            await sync_to_async(attach_documents)(project, documents, legacy_text)
+
+            return JsonResponse({
+                'success': True,
+                'session_id': session_id,
+                'questions': questions,
+                'message': 'Please answer the clarification questions to improve the preview quality'
+            })
+
+        except Exception as e:
+            import traceback
+            print(f"Error in async initiate_project: {traceback.format_exc()}")
+            return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({'error': 'POST method required'}, status=405)
+
+
+@async_csrf_exempt
+async def generate_preview(request):
+    if request.method == 'POST':
+        if not get_backend().is_configured():
+            return JsonResponse({
+                'error': 'Server configuration error: Google API key is not set.'
+            }, status=500)
+
+        try:
+            data = json.loads(request.body)
+            session_id = data.get('session_id')
+            try:
+                documents = await sync_to_async(get_documents)(parse_document_ids(data))
+            except UploadedDocument.DoesNotExist as e:
+                return JsonResponse({'error': str(e)}, status=404)
+
+            if not session_id:
+                # OLD FLOW: Direct preview generation without pre-clarifications
+                raw_input = data.get('raw_input')
+                highlight_points = data.get('highlight_points', '')
+                if not raw_input:
+                    return JsonResponse({'error': 'raw_input is required'}, status=400)
+                if documents:
+                    highlight_points = f"{highlight_points}\n\nSUPPORTING DOCUMENTS:\n{documents_text(documents)[:2000]}"
+
+                session_id = str(uuid.uuid4())[:8]
+                project = ConceptProject(session_id=session_id, raw_input=raw_input)
+            else:
+                try:
+                    project = await ConceptProject.objects.aget(session_id=session_id)
+                except ConceptProject.DoesNotExist:
+                    return JsonResponse({
+                        'error': f'Project not found for session {session_id}'
+                    }, status=404)
+                if not project.raw_input:
+                    return JsonResponse({
+                        'error': 'No initial input found for this project. Please start over.'
+                    }, status=400)
+                await sync_to_async(attach_documents)(project, documents)
+                raw_input = await sync_to_async(_build_preview_input)(project)
+                highlight_points = ""
+
+            try:
+                formatted_preview = await run_llm(ai_handler.generate_preview, raw_input, highlight_points)
+                if formatted_preview and formatted_preview.startswith("Error:"):
+                    return JsonResponse({'error': formatted_preview}, status=500)
+            except ResourceExhausted:
+                return JsonResponse({
+                    'error': 'Quota exceeded. Please wait a moment and try again.'
+                }, status=429)
+            except Exception as ai_error:
+                return JsonResponse({
+                    'error': f'AI generation failed: {str(ai_error)}'
+                }, status=500)
+
+            project.formatted_preview = formatted_preview
+            await project.asave()
+
+            return JsonResponse({
+                'session_id': session_id,
+                'preview': formatted_preview
+            })
+
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except Exception as e:
+            import traceback
+            print(f"Error in async generate_preview: {traceback.format_exc()}")
+            return JsonResponse({
+                'error': f'An unexpected server error occurred: {str(e)}'
+            }, status=500)
+
+    return JsonResponse({'error': 'POST method required'}, status=405)
+
+
+def _recommendations_in_thread(project):
+    """_recommendations_payload off the shared sync thread, releasing its DB connection afterwards"""
+    try:
+        return _recommendations_payload(project)
+    finally:
+        close_old_connections()
+
+
+@async_csrf_exempt
+async def get_recommendations(request):
+    if request.method == 'POST':
+        data = json.loads(request.body)
+        session_id = data.get('session_id')
+
+        try:
+            project = await ConceptProject.objects.aget(session_id=session_id)
+            # Same caching, fallback handling and coalescing as the sync view
+            payload = await sync_to_async(_recommendations_in_thread, thread_sensitive=False)(project)
+            return JsonResponse(payload)
+
+        except ConceptProject.DoesNotExist:
+            return JsonResponse({
+                'error': f'Project not found for session {session_id}'
+            }, status=404)
+        except Exception as e:
+            import traceback
+            print(f"Error in async get_recommendations: {traceback.format_exc()}")
+            return JsonResponse({
+                'internal': 'Error generating internal recommendations',
+                'external': 'Error generating external recommendations',
+                'error': str(e)
+            }, status=500)
+
+    return JsonResponse({'error': 'POST method required'}, status=405)
+
+
+@async_csrf_exempt
+async def generate_final_note(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            session_id = data.get('session_id')
+            selected_internal = data.get('selected_internal', [])
+            selected_external = data.get('selected_external', [])
+
+            if not session_id:
+                return JsonResponse({'error': 'Missing session_id'}, status=400)
+
+            try:
+                project = await ConceptProject.objects.aget(session_id=session_id)
+            except ConceptProject.DoesNotExist:
+                return JsonResponse({'error': f'No project found for session_id {session_id}'}, status=404)
+
+            history = await aload_history(project)
+            actual_client_name = await run_llm(
+                ai_handler.extract_client_name_from_content,
+                project.raw_input or "",
+                project.formatted_preview or "",
+                history
+            )
+            project.client_name = actual_client_name
+            await project.asave(update_fields=['client_name', 'updated_at'])
+
+            note_inputs = _map_concept_note_inputs(
+                project, actual_client_name, selected_internal, selected_external, history
+            )
+            concept_note = await run_llm(ai_handler.generate_concept_note, **note_inputs)
+
+            project.final_concept_note = concept_note
+            await project.asave(update_fields=['final_concept_note', 'updated_at'])
+            prerender_pdf(concept_note, actual_client_name)
+
+            return JsonResponse({
+                'session_id': session_id,
+                'concept_note': concept_note,
+                'client_name': actual_client_name
+            })
+
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
+        except Exception as e:
+            import traceback
+            print("Error generating final note (async):", traceback.format_exc())
+            return JsonResponse({'error': str(e)}, status=500)
+
+    return JsonResponse({'error': 'POST method required'}, status=405)
+
+
+@async_csrf_exempt
+async def get_ai_suggestion(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            selected_text = data.get('selected_text', '').strip()
+            suggestion_type = data.get('suggestion_type', 'improve')
+            multiple = data.get('multiple', False)
+
+            if not selected_text:
+                return JsonResponse({'success': False, 'error': 'No text provided'}, status=400)
+
+            text = await run_llm(ai_handler.generate_quick_suggestion, selected_text, suggestion_type, multiple)
+
+            if multiple:
+                suggestions = []
+                for i, line in enumerate(text.split('\n')):
+                    if line.strip():
+                        suggestions.append({
+                            'id': i + 1,
+                            'type': suggestion_type,
+                            'text': line.strip().lstrip('123.- ')
+                        })
+                return JsonResponse({'success': True, 'suggestions': suggestions})
+            return JsonResponse({'success': True, 'suggestion': text})
+
+        except Exception as e:
+            import traceback
+            print("Error in async get_ai_suggestion:", traceback.format_exc())
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({'success': False, 'error': 'POST method required'}, status=405)
+
+
+@async_csrf_exempt
+async def chat_edit_assistant(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body)
+            user_message = data.get("message", "")
+            selected_text = data.get("selected_text", "")
+            conversation = data.get("conversation", [])
+
+            if not user_message or not selected_text:
+                return JsonResponse({"error": "Both 'message' and 'selected_text' are required."}, status=400)
+
+            ai_reply = await run_llm(
+                ai_handler.conversational_edit_suggestion, user_message, selected_text, conversation
+            )
+            return JsonResponse({"reply": ai_reply})
+        except Exception as e:
+            import traceback
+            print(traceback.format_exc())
+            return JsonResponse({"error": str(e)}, status=500)
+    return JsonResponse({"error": "POST method required"}, status=405)
@@ -0,0 +1,82 @@
+"""
+Lean, cacheable listing of the internal product catalog for get_products.
+
+Only id, name and the first 100 characters of the description are read
+(never extracted_text), pages are walked with a keyset cursor over
+(name, id) instead of OFFSET, and every response carries an ETag derived
+from a catalog version (row count, highest id, latest updated_at), so a
+browser revalidating an unchanged catalog gets a 304 after one aggregate
+query.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Substr
+
+from .models import InternalProduct
+
+DESCRIPTION_CHARS = 100
+
+
+def catalog_version():
+    """Changes whenever a product is added, removed or saved"""
+    stats = InternalProduct.objects.aggregate(count=Count('id'), last_id=Max('id'), last_update=Max('updated_at'))
+    last_update = stats['last_update'].isoformat() if stats['last_update'] else ''
+    return f"{stats['count']}-{stats['last_id'] or 0}-{last_update}"
+
+
+def encode_cursor(name, pk):
+    raw = json.dumps([name, pk], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(name, id) of the last product on the previous page. Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(name, str) or not isinstance(pk, int):
+        raise ValueError("Invalid cursor")
+    return name, pk
+
+
+def page_size(limit):
+    default = getattr(settings, 'PRODUCT_PAGE_SIZE', 200)
+    try:
+        limit = int(limit) if limit else default
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, getattr(settings, 'PRODUCT_PAGE_SIZE_MAX', 1000)))
+
+
+def catalog_page(cursor=None, limit=None):
+    """
+    One page of {'id', 'name', 'description'} dicts in catalog order.
+    Returns (products, next_cursor); next_cursor is None on the last page.
+    """
+    limit = page_size(limit)
+    products = InternalProduct.objects.order_by('name', 'id')
+    if cursor:
+        name, pk = decode_cursor(cursor)
+        products = products.filter(Q(name__gt=name) | Q(name=name, id__gt=pk))
+    rows = list(
+        products.annotate(short_description=Substr('description', 1, DESCRIPTION_CHARS))
+        .values_list('id', 'name', 'short_description')[:limit + 1]
+    )
+    page = [
+        {'id': pk, 'name': name, 'description': description or ''}
+        for pk, name, description in rows[:limit]
+    ]
+    next_cursor = encode_cursor(page[-1]['name'], page[-1]['id']) if len(rows) > limit else None
+    return page, next_cursor
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag for django.views.decorators.http.condition: catalog version plus the page requested"""
+    page = f"{request.GET.get('cursor', '')}|{request.GET.get('limit', '')}"
+    return hashlib.sha1(f"{catalog_version()}|{page}".encode('utf-8')).hexdigest()
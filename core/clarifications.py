@@ -0,0 +1,75 @@
+"""
+Append-only store for clarification answers.
+
+Each answer is one ClarificationTurn insert plus an F() bump of
+ConceptProject.version (and updated_at), so the write per answer stays the
+same size however long the session gets, and two tabs answering at once both
+land instead of one overwriting the other's copy of a JSON list. The
+(project, ordinal) unique constraint orders concurrent appends; a writer that
+loses the race for an ordinal retries with the next one.
+
+Callers that send back the version they last saw get an optimistic check:
+append_turn raises VersionConflict if the project moved on in the meantime.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import ClarificationTurn, ConceptProject
+
+
+class VersionConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__(f"Project was modified concurrently (current version {current_version})")
+        self.current_version = current_version
+
+
+def load_history(project):
+    """[{'question': ..., 'answer': ...}] in the order the answers were saved"""
+    return list(
+        ClarificationTurn.objects.filter(project=project).order_by('ordinal').values('question', 'answer')
+    )
+
+
+async def aload_history(project):
+    return [
+        turn async for turn in
+        ClarificationTurn.objects.filter(project=project).order_by('ordinal').values('question', 'answer')
+    ]
+
+
+def current_version(project_id):
+    return ConceptProject.objects.filter(pk=project_id).values_list('version', flat=True).first()
+
+
+def append_turn(project_id, question, answer, expected_version=None, attempts=5):
+    """
+    Append a clarification answer. Returns (turn, new_version).
+    Raises VersionConflict when expected_version no longer matches.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                projects = ConceptProject.objects.filter(pk=project_id)
+                if expected_version is not None:
+                    projects = projects.filter(version=expected_version)
+                if not projects.update(version=F('version') + 1, updated_at=timezone.now()):
+                    raise VersionConflict(current_version(project_id))
+                last = ClarificationTurn.objects.filter(project_id=project_id).aggregate(last=Max('ordinal'))['last']
+                turn = ClarificationTurn.objects.create(
+                    project_id=project_id,
+                    ordinal=0 if last is None else last + 1,
+                    question=question or '',
+                    answer=answer or '',
+                )
+                # Read inside the transaction: afterwards another writer's
+                # bump could already be included
+                project = ConceptProject(pk=project_id)
+                project.refresh_from_db(fields=['version'])
+        except IntegrityError:
+            # Another writer took this ordinal; with a version check its bump
+            # turns the next attempt into a VersionConflict
+            if attempt == attempts - 1:
+                raise
+            continue
+        return turn, project.version
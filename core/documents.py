@@ -0,0 +1,249 @@
+"""
+Content-addressed store for uploaded documents.
+
+Uploads are hashed while their chunks stream in; the extracted text and page
+metadata are cached in UploadedDocument rows under that hash, so the same
+RFP uploaded through upload_file, upload_supporting_document or by another
+session is only parsed once. The store is pruned by age and total text size
+(settings.DOCUMENT_CACHE_MAX_AGE_DAYS / DOCUMENT_CACHE_MAX_CHARS).
+
+The hash doubles as the document handle returned by upload_file: the text
+stays server-side and initiate_project/generate_preview take document ids
+instead of the browser posting the extracted text back. Documents attached
+to a project are copied into SupportingDocument rows (one per document) and
+prompts read only the prefix they need.
+"""
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.db.models.functions import Substr
+from django.utils import timezone
+
+from . import metrics
+from .models import SupportingDocument, UploadedDocument
+from .pdf_extraction import extract_pdf_text, extract_pdf_text_parallel
+
+
+class SHA256UploadHandler(FileUploadHandler):
+    """
+    Hashes each file while the request body streams in and passes the chunks
+    on unchanged to the regular upload handlers. Install it first:
+        request.upload_handlers.insert(0, SHA256UploadHandler(request))
+    before touching request.FILES/POST.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.digests = {}
+        self._digest = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._digest.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = self._digest.hexdigest()
+        return None
+
+
+def hash_upload(uploaded_file):
+    """SHA-256 of an uploaded file, read chunk by chunk"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def covers(document, max_chars):
+    """Whether the cached text holds everything a caller with this budget would get"""
+    if not document.truncated:
+        return True
+    return max_chars is not None and document.char_count >= max_chars
+
+
+def get_or_extract_document(uploaded_file, max_chars=None, sha256=None):
+    """
+    Returns (UploadedDocument, cached). The PDF is only parsed when no cached
+    extraction of the same bytes covers the requested budget. Pass the sha256
+    from SHA256UploadHandler to avoid reading the file a second time.
+    Without a budget (max_chars=None) the full text is needed, so large
+    documents are parsed page-parallel in the extraction process pool.
+    """
+    sha256 = sha256 or hash_upload(uploaded_file)
+    now = timezone.now()
+
+    document = UploadedDocument.objects.filter(sha256=sha256).first()
+    if document is not None and covers(document, max_chars):
+        UploadedDocument.objects.filter(pk=document.pk).update(last_used_at=now)
+        return document, True
+
+    mode = 'upload' if max_chars is not None else 'upload_parallel'
+    with metrics.phase('pdf_parse'), metrics.PDF_EXTRACTION_SECONDS.time(mode=mode):
+        if max_chars is None:
+            # Documents under PDF_PARALLEL_MIN_PAGES are still parsed in-process
+            extraction = extract_pdf_text_parallel(uploaded_file)
+        else:
+            extraction = extract_pdf_text(uploaded_file, max_chars=max_chars)
+    metrics.PDF_EXTRACTION_PAGES.inc(extraction.pages_read, mode=mode)
+    fields = {
+        'filename': uploaded_file.name or '',
+        'size_bytes': uploaded_file.size or 0,
+        'text': extraction.text,
+        'char_count': len(extraction.text),
+        'page_count': extraction.page_count,
+        'pages_read': extraction.pages_read,
+        'truncated': extraction.truncated,
+        'last_used_at': now,
+    }
+    try:
+        document, _created = UploadedDocument.objects.update_or_create(sha256=sha256, defaults=fields)
+    except IntegrityError:
+        # Another request stored the same document first
+        document = UploadedDocument.objects.get(sha256=sha256)
+
+    evict_documents()
+    return document, False
+
+
+def evict_documents(max_chars=None, max_age=None):
+    """
+    Drop documents unused for longer than max_age, then the least recently
+    used ones until the stored text fits in max_chars. Returns rows deleted.
+    """
+    if max_chars is None:
+        max_chars = getattr(settings, 'DOCUMENT_CACHE_MAX_CHARS', 50_000_000)
+    if max_age is None:
+        max_age = timedelta(days=getattr(settings, 'DOCUMENT_CACHE_MAX_AGE_DAYS', 30))
+
+    deleted, _ = UploadedDocument.objects.filter(last_used_at__lt=timezone.now() - max_age).delete()
+
+    total = UploadedDocument.objects.aggregate(total=Sum('char_count'))['total'] or 0
+    if total > max_chars:
+        doomed = []
+        for pk, char_count in UploadedDocument.objects.order_by('last_used_at').values_list('pk', 'char_count'):
+            if total <= max_chars:
+                break
+            doomed.append(pk)
+            total -= char_count
+        deleted += UploadedDocument.objects.filter(pk__in=doomed).delete()[0]
+    return deleted
+
+
+def parse_document_ids(data):
+    """
+    Document handles from a JSON payload: 'document_ids' (list) and/or a single
+    'document_id', de-duplicated in order.
+    """
+    ids = data.get('document_ids') or []
+    if isinstance(ids, str):
+        ids = [ids]
+    if data.get('document_id'):
+        ids = [data['document_id']] + list(ids)
+    return list(dict.fromkeys(str(document_id).strip() for document_id in ids if document_id))
+
+
+def get_documents(document_ids):
+    """
+    UploadedDocument rows for the handles returned by upload_file (the
+    upload's SHA-256), in the given order. Raises UploadedDocument.DoesNotExist
+    if any handle is unknown or its row has been evicted.
+    """
+    if not document_ids:
+        return []
+    documents = {document.sha256: document for document in UploadedDocument.objects.filter(sha256__in=document_ids)}
+    missing = [document_id for document_id in document_ids if document_id not in documents]
+    if missing:
+        raise UploadedDocument.DoesNotExist(f"Unknown or expired document id(s): {', '.join(missing)}")
+    UploadedDocument.objects.filter(sha256__in=document_ids).update(last_used_at=timezone.now())
+    return [documents[document_id] for document_id in document_ids]
+
+
+def join_documents(parts):
+    """
+    Concatenate (filename, text) pairs the way prompts see supporting
+    documents: the first as-is, every later one under an
+    '--- Additional Document: name ---' header.
+    """
+    text = ''
+    for filename, part in parts:
+        if text:
+            text = f"{text}\n\n--- Additional Document: {filename} ---\n{part}"
+        else:
+            text = part
+    return text
+
+
+def documents_text(documents, existing_text=''):
+    """Text of UploadedDocuments (after any existing_text) as one string"""
+    parts = [('', existing_text)] if existing_text else []
+    return join_documents(parts + [(document.filename, document.text) for document in documents])
+
+
+def attach_documents(project, documents, pdf_text=''):
+    """
+    Append UploadedDocuments (and optionally raw text from older clients) to
+    a project as SupportingDocument rows. Inserts only: neither the project
+    row nor earlier documents are rewritten.
+    """
+    rows = []
+    if pdf_text:
+        rows.append(SupportingDocument(project=project, text=pdf_text, char_count=len(pdf_text)))
+    rows.extend(
+        SupportingDocument(
+            project=project,
+            sha256=document.sha256,
+            filename=document.filename,
+            text=document.text,
+            char_count=document.char_count,
+            page_count=document.page_count,
+            pages_read=document.pages_read,
+            truncated=document.truncated,
+        )
+        for document in documents
+    )
+    return SupportingDocument.objects.bulk_create(rows)
+
+
+def supporting_context(project, max_chars):
+    """
+    The first max_chars characters of a project's supporting documents.
+    Only a DB-side prefix of each document is fetched, and rows stop being
+    read once the budget is filled.
+    """
+    rows = (
+        SupportingDocument.objects.filter(project=project)
+        .order_by('id')
+        .annotate(snippet=Substr('text', 1, max_chars))
+        .values_list('filename', 'snippet')
+    )
+    parts = []
+    chars = 0
+    for filename, snippet in rows.iterator():
+        parts.append((filename, snippet))
+        chars += len(snippet)
+        if chars >= max_chars:
+            break
+    return join_documents(parts)[:max_chars]
+
+
+def document_stats(project):
+    """Per-document size stats for a project, without loading any document text"""
+    documents = list(
+        SupportingDocument.objects.filter(project=project).order_by('id').values(
+            'id', 'filename', 'char_count', 'page_count', 'pages_read', 'truncated', 'created_at'
+        )
+    )
+    return {
+        'count': len(documents),
+        'total_chars': sum(document['char_count'] for document in documents),
+        'documents': documents,
+    }
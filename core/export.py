@@ -0,0 +1,108 @@
+"""
+Bulk export of concept notes as a streamed ZIP of PDFs.
+
+Projects are read with QuerySet.iterator() (a server-side cursor on
+PostgreSQL, chunked fetches elsewhere) and only the columns the PDF needs.
+Notes are rendered in a process pool with a bounded window of in-flight
+renders, results are consumed in submission order, and every PDF is written
+into the archive and handed to the response as soon as it is ready. Memory
+therefore depends on the window size, not on how many projects are exported.
+PDFs already in the rendered-PDF cache are read from disk instead.
+
+    GET /api/export-concept-notes/?from=2026-01-01&to=2026-03-31   (staff only)
+    python manage.py export_concept_notes --from 2026-01-01 --to 2026-03-31 -o notes.zip
+"""
+import csv
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .models import ConceptProject
+from .pdf_cache import cached_path, pdf_key
+from .pdf_service import render_pdf_bytes
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable file object for ZipFile; written bytes are drained by the response"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_queryset(start=None, end=None):
+    """Projects with a final concept note created between start and end (dates, inclusive)"""
+    projects = ConceptProject.objects.exclude(final_concept_note__isnull=True).exclude(final_concept_note='')
+    if start:
+        projects = projects.filter(created_at__date__gte=start)
+    if end:
+        projects = projects.filter(created_at__date__lte=end)
+    return projects.order_by('created_at', 'id').values_list(
+        'session_id', 'client_name', 'created_at', 'final_concept_note'
+    )
+
+
+def iter_rendered(rows, executor, window):
+    """
+    Yield (session_id, client_name, created_at, pdf bytes) in row order with at
+    most `window` renders in flight. Rows are pulled lazily from the iterator.
+    """
+    pending = deque()
+
+    def drain_one():
+        session_id, client_name, created_at, result = pending.popleft()
+        if isinstance(result, bytes):
+            return session_id, client_name, created_at, result
+        pdf, _seconds = result.result()
+        return session_id, client_name, created_at, pdf
+
+    for session_id, client_name, created_at, note in rows:
+        path = cached_path(pdf_key(note, client_name))
+        if path:
+            with open(path, 'rb') as cached:
+                result = cached.read()
+        else:
+            # Bulk exports never call the model for a missing client name
+            result = executor.submit(render_pdf_bytes, note, client_name)
+        pending.append((session_id, client_name, created_at, result))
+        if len(pending) >= window:
+            yield drain_one()
+    while pending:
+        yield drain_one()
+
+
+def stream_export(start=None, end=None, workers=None):
+    """Generator of ZIP archive bytes: one PDF per project plus an index.csv manifest"""
+    workers = workers or getattr(settings, 'EXPORT_RENDER_WORKERS', os.cpu_count() or 1)
+    rows = export_queryset(start, end).iterator(chunk_size=getattr(settings, 'EXPORT_FETCH_SIZE', 50))
+    sink = _ZipSink()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(['session_id', 'client_name', 'created_at', 'filename', 'bytes'])
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # PDFs are already compressed; storing them keeps zipping off the CPU
+        with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+            for session_id, client_name, created_at, pdf in iter_rendered(rows, executor, window=workers * 2):
+                filename = f"concept_note_{session_id}.pdf"
+                info = zipfile.ZipInfo(filename, date_time=created_at.timetuple()[:6])
+                archive.writestr(info, pdf)
+                writer.writerow([session_id, client_name or '', created_at.isoformat(), filename, len(pdf)])
+                yield sink.drain()
+            archive.writestr('index.csv', manifest.getvalue())
+        yield sink.drain()
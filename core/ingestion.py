@@ -0,0 +1,135 @@
+"""
+Background ingestion of InternalProduct PDFs.
+
+InternalProduct.save() only marks a product 'pending' when a new PDF is
+attached; the ingestion_status column doubles as a DB-backed queue. Workers
+(manage.py ingest_products) claim pending rows with a conditional UPDATE, parse
+the PDFs in a process pool, and store the extracted text and passages. Long
+PDFs are split into page ranges parsed by several workers. The request path
+never parses product PDFs.
+"""
+import io
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import PyPDF2
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import InternalProduct
+from .passages import rebuild_product_passages
+from .pdf_extraction import iter_pdf_pages
+
+
+def claim_pending(limit=10, stale_after=timedelta(minutes=30)):
+    """
+    Claim up to `limit` products for this worker. A row is ours only if our
+    UPDATE flipped it from pending (or from a stale 'processing' left by a
+    crashed worker), so several workers can drain the queue safely.
+    """
+    now = timezone.now()
+    claimable = Q(ingestion_status=InternalProduct.INGESTION_PENDING) | Q(
+        ingestion_status=InternalProduct.INGESTION_PROCESSING,
+        ingestion_started_at__lt=now - stale_after,
+    )
+    claimed = []
+    candidates = InternalProduct.objects.filter(claimable).order_by('created_at').values_list('pk', flat=True)[:limit]
+    for pk in list(candidates):
+        won = InternalProduct.objects.filter(claimable, pk=pk).update(
+            ingestion_status=InternalProduct.INGESTION_PROCESSING,
+            ingestion_started_at=now,
+        )
+        if won:
+            claimed.append(InternalProduct.objects.get(pk=pk))
+    return claimed
+
+
+def extract_pages(source, start=0, stop=None):
+    """
+    Process-pool task: [(page_number, text)] for pages [start, stop) of a PDF
+    given as a filesystem path or raw bytes (every page by default).
+    """
+    max_pages = None if stop is None else stop - start
+    if isinstance(source, bytes):
+        return list(iter_pdf_pages(io.BytesIO(source), max_pages=max_pages, start=start))
+    with open(source, 'rb') as pdf_file:
+        return list(iter_pdf_pages(pdf_file, max_pages=max_pages, start=start))
+
+
+def pdf_source(product):
+    """Path when the storage is on local disk, otherwise the file's bytes"""
+    try:
+        return product.pdf_file.path
+    except NotImplementedError:
+        with product.pdf_file.open('rb') as pdf_file:
+            return pdf_file.read()
+
+
+def submit_extraction(executor, source):
+    """
+    Futures whose results, concatenated, are the PDF's pages in order. PDFs on
+    local disk with at least settings.PDF_PARALLEL_MIN_PAGES pages are split
+    into ranges of settings.PDF_PAGES_PER_TASK pages, so one long brochure is
+    parsed by several workers. Byte sources are parsed in one task rather than
+    copied to every range.
+    """
+    if isinstance(source, bytes):
+        return [executor.submit(extract_pages, source)]
+    with open(source, 'rb') as pdf_file:
+        page_count = len(PyPDF2.PdfReader(pdf_file).pages)
+    if page_count < getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 20):
+        return [executor.submit(extract_pages, source)]
+    step = getattr(settings, 'PDF_PAGES_PER_TASK', 8)
+    return [executor.submit(extract_pages, source, start, min(start + step, page_count))
+            for start in range(0, page_count, step)]
+
+
+def store_ingestion(product, pages):
+    """Save the extracted text and passages of a claimed product"""
+    product.extracted_text = "\n".join(text for _number, text in pages)
+    rebuild_product_passages(product, pages=pages)
+    product.ingestion_status = InternalProduct.INGESTION_DONE
+    product.ingestion_error = ''
+    product.ingested_at = timezone.now()
+    # post_save refreshes the product search index, once per product;
+    # mark_failed's status-only save leaves it alone
+    product.save(update_fields=['extracted_text', 'ingestion_status', 'ingestion_error', 'ingested_at'])
+
+
+def mark_failed(product, error):
+    product.ingestion_status = InternalProduct.INGESTION_FAILED
+    product.ingestion_error = error
+    product.ingested_at = timezone.now()
+    product.save(update_fields=['ingestion_status', 'ingestion_error', 'ingested_at'])
+
+
+def run_ingestion(executor, batch_size=10, stale_after=timedelta(minutes=30), log=print):
+    """Claim and ingest one batch. Returns the number of products processed."""
+    products = claim_pending(batch_size, stale_after)
+    futures = []
+    for product in products:
+        if not product.pdf_file:
+            # Nothing to parse: the product is searchable by name/description only
+            store_ingestion(product, [])
+            continue
+        try:
+            futures.append((product, submit_extraction(executor, pdf_source(product))))
+        except Exception as e:
+            mark_failed(product, f"Could not read PDF: {e}")
+
+    for product, ranges in futures:
+        try:
+            store_ingestion(product, [page for future in ranges for page in future.result()])
+            log(f"Ingested {product.name}")
+        except Exception:
+            for future in ranges:
+                future.cancel()
+            mark_failed(product, traceback.format_exc(limit=3))
+            log(f"Failed to ingest {product.name}")
+    return len(products)
+
+
+def make_executor(workers=None):
+    return ProcessPoolExecutor(max_workers=workers)
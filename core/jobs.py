@@ -0,0 +1,179 @@
+"""
+DB-backed job queue for steps that outlive a load balancer's request timeout.
+
+generate_final_note, get_recommendations and audio transcription can be
+submitted as Job rows (POST /api/jobs/submit/, or "background": true on the
+regular endpoints), which return 202 with the job id straight away. Workers
+('manage.py run_jobs --concurrency N') claim queued rows with a conditional
+UPDATE, the same way the ingestion worker claims products, so any number of
+worker processes on any number of hosts can share one SQLite/PostgreSQL
+database. Jobs left 'running' by a crashed worker are reclaimed after
+JOB_STALE_SECONDS, up to JOB_MAX_ATTEMPTS attempts.
+Clients poll /api/jobs/<id>/status/ and fetch /api/jobs/<id>/result/.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ConceptProject, Job
+
+
+def _final_note(payload):
+    from .views import _final_note_payload
+    project = ConceptProject.objects.get(session_id=payload['session_id'])
+    return _final_note_payload(project, payload.get('selected_internal', []), payload.get('selected_external', []))
+
+
+def _recommendations(payload):
+    from .views import _recommendations_payload
+    project = ConceptProject.objects.get(session_id=payload['session_id'])
+    return _recommendations_payload(project)
+
+
+def _transcribe(payload):
+    from .ai_handler import process_audio_with_gemini
+    path = payload['path']
+    try:
+        with default_storage.open(path, 'rb') as stored:
+            transcribed_text = process_audio_with_gemini(File(stored, name=payload['filename']))
+    finally:
+        default_storage.delete(path)
+    return {
+        'success': True,
+        'transcribed_text': transcribed_text,
+        'filename': payload['filename']
+    }
+
+
+HANDLERS = {
+    Job.KIND_FINAL_NOTE: _final_note,
+    Job.KIND_RECOMMENDATIONS: _recommendations,
+    Job.KIND_AUDIO: _transcribe,
+}
+
+
+def submit_job(kind, payload, session_id=''):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, payload=payload, session_id=session_id or '')
+
+
+def save_job_upload(uploaded_file):
+    """Persist an uploaded file for a worker; returns the storage path"""
+    extension = os.path.splitext(uploaded_file.name or '')[1]
+    return default_storage.save(f"jobs/{uuid.uuid4().hex}{extension}", uploaded_file)
+
+
+def job_payload(job):
+    """Status document for a job, as returned by the job endpoints"""
+    return {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'session_id': job.session_id,
+        'attempts': job.attempts,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('job_status', args=[job.id]),
+        'result_url': reverse('job_result', args=[job.id]),
+    }
+
+
+def claim_jobs(worker, limit=1, stale_after=timedelta(minutes=15), max_attempts=3):
+    """
+    Claim up to `limit` jobs for this worker. A row is ours only if our UPDATE
+    flipped it from queued (or from a stale 'running' left by a dead worker).
+    """
+    now = timezone.now()
+    claimable = Q(status=Job.STATUS_QUEUED) | Q(status=Job.STATUS_RUNNING, started_at__lt=now - stale_after)
+    claimable &= Q(attempts__lt=max_attempts)
+    claimed = []
+    candidates = Job.objects.filter(claimable).order_by('created_at').values_list('pk', flat=True)[:limit]
+    for pk in list(candidates):
+        won = Job.objects.filter(claimable, pk=pk).update(
+            status=Job.STATUS_RUNNING,
+            started_at=now,
+            worker=worker,
+            attempts=F('attempts') + 1,
+        )
+        if won:
+            claimed.append(Job.objects.get(pk=pk))
+    return claimed
+
+
+def fail_exhausted(stale_after=timedelta(minutes=15), max_attempts=3):
+    """Give up on jobs whose workers died on every attempt"""
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        started_at__lt=timezone.now() - stale_after,
+        attempts__gte=max_attempts,
+    ).update(status=Job.STATUS_FAILED, error='Worker stopped responding', finished_at=timezone.now())
+
+
+def run_job(job, log=print):
+    """Run a claimed job and store its result or error"""
+    try:
+        result = HANDLERS[job.kind](job.payload)
+        Job.objects.filter(pk=job.pk, worker=job.worker).update(
+            status=Job.STATUS_DONE, result=result, error='', finished_at=timezone.now()
+        )
+        log(f"Job {job.id} ({job.kind}) done")
+    except Exception:
+        Job.objects.filter(pk=job.pk, worker=job.worker).update(
+            status=Job.STATUS_FAILED, error=traceback.format_exc(limit=3), finished_at=timezone.now()
+        )
+        log(f"Job {job.id} ({job.kind}) failed")
+    finally:
+        close_old_connections()
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def run_worker(concurrency=4, interval=1.0, loop=True, stale_after=None, max_attempts=None, log=print):
+    """
+    Claim and run jobs on `concurrency` threads (jobs are I/O bound model
+    calls). Without `loop`, returns once the queue is drained. Returns jobs run.
+    """
+    if stale_after is None:
+        stale_after = timedelta(seconds=getattr(settings, 'JOB_STALE_SECONDS', 900))
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+    worker = worker_name()
+    slots = threading.BoundedSemaphore(concurrency)
+    total = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job') as executor:
+        while True:
+            fail_exhausted(stale_after, max_attempts)
+            free = 0
+            while slots.acquire(blocking=False):
+                free += 1
+            jobs = claim_jobs(worker, free, stale_after, max_attempts) if free else []
+            for _ in range(free - len(jobs)):
+                slots.release()
+            for job in jobs:
+                future = executor.submit(run_job, job, log)
+                future.add_done_callback(lambda _done: slots.release())
+            total += len(jobs)
+            if jobs:
+                continue
+            if not loop and free == concurrency:
+                break
+            time.sleep(interval)
+    return total
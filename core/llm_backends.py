@@ -0,0 +1,213 @@
+"""
+LLM backends used by ai_handler.
+
+The backend is chosen with settings.LLM_BACKEND:
+  - "gemini": Google Gemini through google-generativeai (production)
+  - "fake":   offline, deterministic stand-in for benchmarks and load tests
+A dotted path to any LLMBackend subclass is accepted as well.
+
+Every backend exposes the small slice of the GenerativeModel API the app uses:
+generate_content(contents, stream=False) returning an object with `.text`
+(iterable over chunks when streaming) and upload_file(path).
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LLMBackend:
+    model_name = 'unknown'
+
+    def generate_content(self, contents, stream=False):
+        raise NotImplementedError
+
+    def upload_file(self, path):
+        raise NotImplementedError
+
+    def is_configured(self):
+        """Whether the backend has everything it needs (API keys etc.) to serve requests"""
+        return True
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, model_name='gemini-2.0-flash-exp', api_key=None):
+        import google.generativeai as genai
+        self._genai = genai
+        self.api_key = api_key
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate_content(self, contents, stream=False):
+        return self.model.generate_content(contents, stream=stream)
+
+    def upload_file(self, path):
+        return self._genai.upload_file(path)
+
+    def is_configured(self):
+        return bool(self.api_key)
+
+
+# Canned answers for the prompts whose output is parsed by ai_handler, so the
+# fake backend drives the same code paths as the real model.
+DEFAULT_CANNED_RESPONSES = [
+    ("Return ONLY the JSON array", """[
+  {"id": 1, "category": "client_identification", "question": "Is 'Fake Client Ltd' the official client/organization name?", "detected_value": "Fake Client Ltd", "field_type": "confirmation", "importance": "critical", "skip_allowed": false},
+  {"id": 2, "category": "supporting_docs", "question": "Do you have any supporting documents that would help us understand the requirements better?", "detected_value": null, "field_type": "yes_no_upload", "importance": "medium", "skip_allowed": true},
+  {"id": 3, "category": "budget", "question": "What is your estimated budget or investment range for this project?", "detected_value": null, "field_type": "text_input", "importance": "high", "skip_allowed": true}
+]"""),
+    ('Return just the single question text or "NO_MORE_QUESTIONS"', "NO_MORE_QUESTIONS"),
+    ("Return ONLY comma-separated keywords", "automation, ai, mobile, analytics, integration"),
+    ("return ONLY the project/client name or descriptive title", "Fake Client Platform"),
+]
+
+DEFAULT_TEMPLATE = (
+    "FAKE RESPONSE {digest}\n"
+    "────────────────────────────────────────\n\n"
+    "This deterministic text stands in for a model response to a {prompt_chars}-character prompt.\n\n"
+    "- Point derived from: {prompt_head}\n"
+    "- Second point\n"
+    "- Third point\n"
+)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline stand-in for Gemini.
+
+    Options (settings.LLM_BACKEND_OPTIONS):
+      latency:    {"distribution": "constant" | "uniform" | "normal" | "lognormal" | "exponential",
+                   "mean": seconds, "stddev": seconds, "min": seconds, "max": seconds}
+      responses:  list of (substring, text) pairs; the first substring found in the prompt wins
+      template:   fallback text, formatted with {digest}, {prompt_head} and {prompt_chars}
+      error_rate: probability (0-1) of raising google.api_core ResourceExhausted
+      chunk_size: characters per chunk when streaming
+      seed:       seed for the latency/error random generator
+    """
+    model_name = 'fake'
+
+    def __init__(self, latency=None, responses=None, template=None, error_rate=0.0,
+                 chunk_size=40, seed=0, model_name='fake'):
+        self.latency = dict(latency or {'distribution': 'constant', 'mean': 0.0})
+        self.responses = list(DEFAULT_CANNED_RESPONSES if responses is None else responses)
+        self.template = template or DEFAULT_TEMPLATE
+        self.error_rate = error_rate
+        self.chunk_size = max(1, int(chunk_size))
+        self.model_name = model_name
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self):
+        spec = self.latency
+        distribution = spec.get('distribution', 'constant')
+        mean = float(spec.get('mean', 0.0))
+        stddev = float(spec.get('stddev', 0.0))
+        with self._lock:
+            if distribution == 'uniform':
+                value = self._random.uniform(float(spec.get('min', 0.0)), float(spec.get('max', mean * 2)))
+            elif distribution == 'normal':
+                value = self._random.gauss(mean, stddev)
+            elif distribution == 'lognormal':
+                # mean/stddev describe the resulting distribution, not the underlying normal
+                if mean <= 0:
+                    value = 0.0
+                else:
+                    sigma2 = math.log(1 + (stddev / mean) ** 2)
+                    value = self._random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+            elif distribution == 'exponential':
+                value = self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            else:
+                value = mean
+        if 'max' in spec and distribution != 'uniform':
+            value = min(value, float(spec['max']))
+        return max(float(spec.get('min', 0.0)), value)
+
+    def _should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def render(self, prompt):
+        for needle, text in self.responses:
+            if needle in prompt:
+                return text
+        digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+        head = " ".join(prompt.split())[:80]
+        return self.template.format(digest=digest, prompt_head=head, prompt_chars=len(prompt))
+
+    def generate_content(self, contents, stream=False):
+        if isinstance(contents, (list, tuple)):
+            prompt = "\n".join(str(part) for part in contents)
+        else:
+            prompt = str(contents)
+
+        latency = self.sample_latency()
+        if self._should_fail():
+            from google.api_core.exceptions import ResourceExhausted
+            time.sleep(latency)
+            raise ResourceExhausted("Simulated quota exhaustion (fake LLM backend)")
+
+        text = self.render(prompt)
+        if stream:
+            return FakeStreamResponse(text, self.chunk_size, latency)
+        time.sleep(latency)
+        return FakeResponse(text)
+
+    def upload_file(self, path):
+        return f"[uploaded file: {path}]"
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def __iter__(self):
+        yield self
+
+
+class FakeStreamResponse:
+    """Yields the text in chunks, spreading the sampled latency across them"""
+
+    def __init__(self, text, chunk_size, latency):
+        self.text = text
+        self._chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or ['']
+        self._delay = latency / len(self._chunks)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            time.sleep(self._delay)
+            yield FakeResponse(chunk)
+
+
+BACKENDS = {
+    'gemini': 'core.llm_backends.GeminiBackend',
+    'fake': 'core.llm_backends.FakeBackend',
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def build_backend():
+    name = getattr(settings, 'LLM_BACKEND', 'gemini')
+    backend_class = import_string(BACKENDS.get(name, name))
+    model_name = getattr(settings, 'LLM_MODEL_NAME', 'gemini-2.0-flash-exp')
+    if backend_class is GeminiBackend or issubclass(backend_class, GeminiBackend):
+        return backend_class(model_name=model_name, api_key=settings.GEMINI_API_KEY)
+    return backend_class(**getattr(settings, 'LLM_BACKEND_OPTIONS', {}))
+
+
+def get_backend():
+    """Process-wide backend instance selected by settings.LLM_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_backend()
+    return _backend
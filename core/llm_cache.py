@@ -0,0 +1,174 @@
+"""
+Persistent prompt -> response cache for LLM calls.
+
+Responses are stored in a small SQLite file (separate from the Django database)
+so every gunicorn worker on the host shares the same entries. Keys are
+content-addressed: model name + SHA-256 of the whitespace-normalized prompt.
+Entries expire after a TTL and the least recently used ones are evicted once
+the cache grows past its size limit.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+class LLMResponseCache:
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._ensure_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model_name TEXT NOT NULL,
+                function TEXT NOT NULL,
+                response TEXT NOT NULL,
+                latency REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+            CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                function TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                saved_seconds REAL NOT NULL DEFAULT 0
+            );
+        """)
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        """Content address for a prompt: the model name plus a hash of the normalized prompt"""
+        normalized = " ".join(str(prompt).split())
+        digest = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def _count(self, conn, function, hits=0, misses=0, saved_seconds=0.0):
+        conn.execute(
+            """INSERT INTO counters (function, hits, misses, saved_seconds) VALUES (?, ?, ?, ?)
+               ON CONFLICT(function) DO UPDATE SET
+                   hits = hits + excluded.hits,
+                   misses = misses + excluded.misses,
+                   saved_seconds = saved_seconds + excluded.saved_seconds""",
+            (function, hits, misses, saved_seconds)
+        )
+
+    def get(self, key, function='unknown'):
+        """Return the cached response text, or None on a miss"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, latency FROM responses WHERE key = ? AND expires_at > ?",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            self._count(conn, function, misses=1)
+            return None
+        conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+        self._count(conn, function, hits=1, saved_seconds=row[1])
+        return row[0]
+
+    def set(self, key, response, model_name, function='unknown', latency=0.0):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            """INSERT OR REPLACE INTO responses
+               (key, model_name, function, response, latency, created_at, last_used_at, expires_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (key, model_name, function, response, latency, now, now, now + self.ttl_seconds)
+        )
+        self.evict(now)
+
+    def evict(self, now=None):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        conn = self._connect()
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now or time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                """DELETE FROM responses WHERE key IN (
+                       SELECT key FROM responses ORDER BY last_used_at ASC LIMIT ?
+                   )""",
+                (count - self.max_entries,)
+            )
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM counters")
+
+    def stats(self):
+        """Hit/miss counters (overall and per function) plus the latency they saved"""
+        conn = self._connect()
+        functions = {}
+        total_hits = total_misses = 0
+        total_saved = 0.0
+        for function, hits, misses, saved in conn.execute(
+            "SELECT function, hits, misses, saved_seconds FROM counters ORDER BY function"
+        ):
+            functions[function] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                'saved_seconds': round(saved, 3),
+            }
+            total_hits += hits
+            total_misses += misses
+            total_saved += saved
+        (entries,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {
+            'entries': entries,
+            'hits': total_hits,
+            'misses': total_misses,
+            'hit_ratio': round(total_hits / (total_hits + total_misses), 4) if total_hits + total_misses else 0.0,
+            'saved_seconds': round(total_saved, 3),
+            'functions': functions,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide cache instance, or None when caching is disabled in settings"""
+    global _cache
+    if not getattr(settings, 'LLM_CACHE_ENABLED', True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    getattr(settings, 'LLM_CACHE_PATH', os.path.join(settings.BASE_DIR, 'llm_cache.sqlite3')),
+                    ttl_seconds=getattr(settings, 'LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600),
+                    max_entries=getattr(settings, 'LLM_CACHE_MAX_ENTRIES', 5000),
+                )
+    return _cache
+
+
+def is_cacheable(function):
+    """Per-function opt-out via settings.LLM_CACHE_EXCLUDED_FUNCTIONS"""
+    return function not in getattr(settings, 'LLM_CACHE_EXCLUDED_FUNCTIONS', ())
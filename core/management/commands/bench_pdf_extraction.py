@@ -0,0 +1,71 @@
+"""
+Wall-clock PDF text extraction, serial vs. page-parallel, by worker count.
+
+    python manage.py bench_pdf_extraction
+    python manage.py bench_pdf_extraction --workers 1 2 4 8 --repeat 5 --pages-per-task 4
+"""
+import glob
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.pdf_extraction import extract_pdf_text, extract_pdf_text_parallel
+
+
+class Command(BaseCommand):
+    help = "Benchmark serial vs. page-parallel PDF text extraction over media/products"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=os.path.join(settings.MEDIA_ROOT, 'products'),
+                            help='Directory of PDFs to extract')
+        parser.add_argument('--workers', type=int, nargs='+', default=None,
+                            help='Pool sizes to try (default: 1, 2, 4 ... up to the CPU count)')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--pages-per-task', type=int, default=1,
+                            help='Pages per pool task (the product PDFs are short)')
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(os.path.join(options['path'], '*.pdf')))
+        if not paths:
+            self.stderr.write(f"No PDFs found in {options['path']}")
+            return
+
+        workers = options['workers']
+        if not workers:
+            cpus = os.cpu_count() or 1
+            workers = sorted({1, cpus} | {2 ** n for n in range(1, cpus.bit_length()) if 2 ** n <= cpus})
+
+        def serial():
+            pages = 0
+            for path in paths:
+                with open(path, 'rb') as pdf_file:
+                    pages += extract_pdf_text(pdf_file).page_count
+            return pages
+
+        pages = serial()  # warm the page cache
+        self.stdout.write(f"{len(paths)} PDFs, {pages} pages, {os.cpu_count()} CPUs")
+        baseline = self.time(serial, options['repeat'])
+        self.stdout.write(f"{'serial':>10}  {baseline * 1000:9.1f}ms  1.00x")
+
+        for count in workers:
+            with ProcessPoolExecutor(max_workers=count) as executor:
+                def parallel():
+                    for path in paths:
+                        extract_pdf_text_parallel(
+                            path, pages_per_task=options['pages_per_task'], executor=executor
+                        )
+                parallel()  # start the worker processes
+                elapsed = self.time(parallel, options['repeat'])
+            self.stdout.write(f"{f'{count} workers':>10}  {elapsed * 1000:9.1f}ms  {baseline / elapsed:.2f}x")
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
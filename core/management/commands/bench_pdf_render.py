@@ -0,0 +1,78 @@
+"""
+Render time and peak memory of concept-note PDFs by note length.
+
+    python manage.py bench_pdf_render
+    python manage.py bench_pdf_render --pages 10 100 500 --repeat 3
+
+Notes are synthetic Markdown with the structures the model produces (numbered
+section headings, paragraphs with bold/italic text, bullet lists and tables),
+sized to roughly the requested number of pages. Timings come from untraced
+runs; peak memory from a separate tracemalloc run.
+"""
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from core.pdf_render import build_story, render_story
+
+SECTION = """{n}. SECTION {n} OVERVIEW
+The proposed platform will **streamline** operations across departments and *empower* stakeholders with timely, reliable information. It will integrate with existing systems & workflows while keeping data secure.
+Each phase will deliver measurable improvements in efficiency, adoption and user experience, building confidence through regular reviews.
+
+**Key capabilities**
+- Unified dashboard with **role-based** access for administrators and end users
+- Automated notifications and *configurable* approval workflows
+- Analytics on usage, turnaround times and service quality
+- Integration APIs for the client's CRM and ERP platforms
+
+| Phase | Scope | Timeframe |
+|---|---|---|
+| I | Foundation and core development | 3 months |
+| II | Integration and enhancement | 2 months |
+| III | Optimization and expansion | 2 months |
+
+"""
+SECTIONS_PER_PAGE = 2.2  # measured: one section lays out to ~0.45 A4 pages
+
+
+def synthetic_note(pages):
+    sections = max(1, round(pages * SECTIONS_PER_PAGE))
+    return "Concept Note - Benchmark\n\n" + "".join(SECTION.format(n=n + 1) for n in range(sections))
+
+
+class Command(BaseCommand):
+    help = "Benchmark concept-note PDF rendering (time and peak memory) for 10/100/500-page notes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'target':>8} {'pages':>6} {'chars':>9} {'compile':>10} {'render p50':>11} "
+                          f"{'max':>9} {'peak MiB':>9} {'PDF KiB':>8}")
+        for pages in options['pages']:
+            note = synthetic_note(pages)
+
+            compile_times, render_times = [], []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                story = build_story(note, client_name="Benchmark Client")
+                compiled = time.perf_counter()
+                buffer, page_count = render_story(story)
+                compile_times.append(compiled - started)
+                render_times.append(time.perf_counter() - started)
+
+            tracemalloc.start()
+            render_story(build_story(note, client_name="Benchmark Client"))
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{pages:>8} {page_count:>6} {len(note):>9} "
+                f"{statistics.median(compile_times) * 1000:>8.1f}ms "
+                f"{statistics.median(render_times) * 1000:>9.1f}ms "
+                f"{max(render_times) * 1000:>7.1f}ms "
+                f"{peak / 2 ** 20:>9.1f} {len(buffer.getvalue()) / 1024:>8.0f}"
+            )
@@ -0,0 +1,112 @@
+"""
+get_products at catalog scale: the old full-model listing vs. the projected,
+paginated catalog and a conditional GET answered with 304.
+
+    python manage.py bench_products
+    python manage.py bench_products --products 10000 --text-chars 5000 --repeat 5
+
+Synthetic products are inserted inside a transaction that is rolled back.
+"""
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.models import InternalProduct
+from core.views import get_products
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark get_products (full listing vs. projected pages vs. 304) over a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--text-chars', type=int, default=5000,
+                            help='extracted_text size per synthetic product')
+        parser.add_argument('--limit', type=int, default=200, help='Page size')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.populate(options['products'], options['text_chars'])
+                self.run(options['limit'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def populate(self, count, text_chars):
+        text = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * (text_chars // 57 + 1))[:text_chars]
+        InternalProduct.objects.bulk_create(
+            [
+                InternalProduct(
+                    name=f"Bench product {n:06d}",
+                    description=f"Synthetic product {n} used to benchmark the catalog endpoint. " * 3,
+                    extracted_text=text,
+                    ingestion_status=InternalProduct.INGESTION_DONE,
+                )
+                for n in range(count)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(f"{InternalProduct.objects.count()} products, {text_chars} chars of extracted_text each")
+
+    def run(self, limit, repeat):
+        factory = RequestFactory()
+
+        def full_listing():
+            # Previous implementation: every column of every product
+            products = InternalProduct.objects.all()
+            return len([
+                {'id': p.id, 'name': p.name, 'description': p.description[:100] if p.description else ''}
+                for p in products
+            ])
+
+        def all_pages():
+            cursor, pages, size = None, 0, 0
+            while True:
+                params = {'limit': limit}
+                if cursor:
+                    params['cursor'] = cursor
+                response = get_products(factory.get('/api/get-products/', params))
+                pages += 1
+                size += len(response.content)
+                cursor = json.loads(response.content)['next_cursor']
+                if not cursor:
+                    return pages, size
+
+        first = get_products(factory.get('/api/get-products/', {'limit': limit}))
+        etag = first['ETag']
+
+        def revalidate():
+            response = get_products(factory.get('/api/get-products/', {'limit': limit}, HTTP_IF_NONE_MATCH=etag))
+            assert response.status_code == 304, response.status_code
+            return response
+
+        pages, size = all_pages()
+        self.stdout.write(f"Page size {limit}: {pages} pages, {size / 1024:.0f} KiB of JSON in total, "
+                          f"first page {len(first.content) / 1024:.1f} KiB")
+        self.report('full listing (old)', full_listing, repeat)
+        self.report('first page', lambda: get_products(factory.get('/api/get-products/', {'limit': limit})), repeat)
+        self.report('all pages', all_pages, repeat)
+        self.report('304 revalidation', revalidate, repeat)
+
+    def report(self, label, func, repeat):
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+        self.stdout.write(
+            f"{label:>20}  p50 {statistics.median(timings) * 1000:9.1f}ms  "
+            f"max {max(timings) * 1000:9.1f}ms  {len(queries) / repeat:.0f} queries"
+        )
@@ -0,0 +1,75 @@
+"""
+Benchmark the recommendation stage against a stubbed (fake) model.
+
+Compares the old sequential flow (find_internal_matches, then
+search_external_solutions) with ai_handler.generate_recommendations, which
+runs both branches concurrently. Nothing is sent to Gemini, and the LLM
+response cache and the shared rate limiter are bypassed, so fake calls
+neither wait for nor use up the real quota.
+
+    python manage.py bench_recommendations --latency 0.5 --rounds 5
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core import ai_handler
+from core.llm_backends import FakeBackend
+from core.models import InternalProduct
+
+
+class Command(BaseCommand):
+    help = "Benchmark sequential vs concurrent recommendation generation with a fake model"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=0.5,
+                            help='Simulated seconds per model call (default: 0.5)')
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--products', type=int, default=14,
+                            help='Number of in-memory products to rank (default: 14)')
+
+    def handle(self, *args, **options):
+        latency = options['latency']
+        products = [
+            InternalProduct(
+                name=f"Product {i}",
+                description=f"Automation and analytics platform number {i}",
+                extracted_text="AI workflow automation, mobile app, analytics dashboards. " * 40,
+            )
+            for i in range(options['products'])
+        ]
+        preview = "Healthcare automation platform with AI triage and a mobile app. " * 20
+        clarifications = "Q: Budget?\nA: Medium\nQ: Timeline?\nA: Six months"
+
+        def sequential():
+            ai_handler.find_internal_matches(preview, clarifications, products)
+            ai_handler.search_external_solutions(preview, clarifications)
+
+        def concurrent():
+            ai_handler.generate_recommendations(preview, clarifications, products)
+
+        original_model = ai_handler.model
+        ai_handler.model = FakeBackend(latency={'distribution': 'constant', 'mean': latency})
+        try:
+            with override_settings(LLM_CACHE_ENABLED=False, LLM_RATE_LIMIT_ENABLED=False):
+                results = {}
+                for label, func in (('sequential', sequential), ('concurrent', concurrent)):
+                    timings = []
+                    for _ in range(options['rounds']):
+                        started = time.perf_counter()
+                        func()
+                        timings.append(time.perf_counter() - started)
+                    results[label] = timings
+        finally:
+            ai_handler.model = original_model
+
+        self.stdout.write(f"Simulated model latency: {latency:.3f}s per call, {options['rounds']} rounds")
+        for label, timings in results.items():
+            self.stdout.write(
+                f"{label:>10}: mean {statistics.mean(timings):.3f}s  "
+                f"min {min(timings):.3f}s  max {max(timings):.3f}s"
+            )
+        speedup = statistics.mean(results['sequential']) / statistics.mean(results['concurrent'])
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.2f}x"))
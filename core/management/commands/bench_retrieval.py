@@ -0,0 +1,54 @@
+"""
+Measure the internal-recommendation context for a query: prompt size and
+retrieval latency of passage retrieval vs. the per-product text heads used
+before passages existed.
+
+    python manage.py bench_retrieval "AI compliance checks for uploaded contracts"
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import InternalProduct
+from core.passages import retrieve_passages
+from core.product_index import rank_products
+
+
+class Command(BaseCommand):
+    help = "Report prompt size and retrieval latency for passage-based recommendations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('query')
+        parser.add_argument('--k', type=int, default=None, help='Passages to retrieve')
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        query = options['query']
+        products = list(InternalProduct.objects.all())
+        product_ids = [product.pk for product in products]
+
+        # Head-of-document context (previous behaviour): up to 2,500 chars per product
+        started = time.perf_counter()
+        ranked = sorted(rank_products(query, products), key=lambda item: item[1], reverse=True)
+        heads = "".join(
+            f"\n\n=== {product.name} ===\nAvailable Features: {(product.extracted_text or '')[:2500]}\n"
+            for position, (product, score) in enumerate(ranked) if score > 0 or position < 5
+        )
+        rank_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        retrieval = None
+        for _ in range(options['runs']):
+            retrieval = retrieve_passages(query, product_ids=product_ids, k=options['k'])
+            timings.append(retrieval.retrieval_ms)
+        context = retrieval.prompt_context()
+
+        self.stdout.write(f"Products: {len(products)}")
+        self.stdout.write(f"Product heads:  {len(heads):>7} chars (ranking {rank_ms:.2f}ms)")
+        self.stdout.write(
+            f"Passages:       {len(context):>7} chars from {len(retrieval)} passages "
+            f"(retrieval p50 {statistics.median(timings):.2f}ms, max {max(timings):.2f}ms)"
+        )
+        for passage, score in retrieval.passages:
+            self.stdout.write(f"  {score:6.2f}  {passage.product.name} p.{passage.page_number} {passage.heading}")
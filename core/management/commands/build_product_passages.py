@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.models import InternalProduct
+from core.passages import get_passage_index, rebuild_product_passages
+
+
+class Command(BaseCommand):
+    help = "Split product PDFs into passages and rebuild the passage index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='*', type=int,
+                            help='Only rebuild these products (default: all)')
+
+    def handle(self, *args, **options):
+        products = InternalProduct.objects.all()
+        if options['product_ids']:
+            products = products.filter(pk__in=options['product_ids'])
+
+        total = 0
+        for product in products:
+            try:
+                count = rebuild_product_passages(product)
+            except Exception as e:
+                self.stderr.write(f"{product.name}: {e}")
+                continue
+            total += count
+            self.stdout.write(f"{product.name}: {count} passages")
+
+        if not options['product_ids']:
+            get_passage_index().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} passages"))
@@ -0,0 +1,41 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.export import export_queryset, stream_export
+
+
+def date_argument(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = "Write every final concept note created in a date range to a ZIP of PDFs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', type=date_argument, help='First creation date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', type=date_argument, help='Last creation date (YYYY-MM-DD)')
+        parser.add_argument('-o', '--output', default='-', help="ZIP file to write ('-' for stdout)")
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'EXPORT_RENDER_WORKERS', None),
+                            help='PDF rendering processes')
+
+    def handle(self, *args, **options):
+        count = export_queryset(options['start'], options['end']).count()
+        if not count:
+            raise CommandError("No concept notes in that date range")
+
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        written = 0
+        try:
+            for chunk in stream_export(options['start'], options['end'], workers=options['workers']):
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} concept notes ({written / 1024:.0f} KiB)"))
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.ingestion import make_executor, run_ingestion
+from core.models import InternalProduct
+
+
+class Command(BaseCommand):
+    help = "Extract text and passages from pending InternalProduct PDFs in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'INGESTION_WORKERS', 2),
+                            help='PDF parsing processes')
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Products claimed per round')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new products instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polls with --loop')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue previously failed products again before starting')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = InternalProduct.objects.filter(
+                ingestion_status=InternalProduct.INGESTION_FAILED
+            ).update(ingestion_status=InternalProduct.INGESTION_PENDING, ingestion_error='')
+            self.stdout.write(f"Requeued {requeued} failed products")
+
+        stale_after = timedelta(seconds=getattr(settings, 'INGESTION_STALE_SECONDS', 1800))
+        total = 0
+        with make_executor(options['workers']) as executor:
+            while True:
+                processed = run_ingestion(executor, options['batch'], stale_after, log=self.stdout.write)
+                total += processed
+                if processed:
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Ingested {total} products"))
@@ -0,0 +1,60 @@
+"""
+Top frames across profiles captured by ProfilerMiddleware.
+
+    python manage.py profile_summary
+    python manage.py profile_summary --endpoint generate_final_note --sort tottime --limit 40
+    python manage.py profile_summary --session 3f2a9c
+
+Profiles are merged with pstats, so a function's numbers are summed over
+every matching request.
+"""
+import glob
+import io
+import os
+import pstats
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Summarise the slowest frames across captured request profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')),
+                            help='Directory holding the .prof files')
+        parser.add_argument('--endpoint', help='Only profiles of this URL name (e.g. generate_final_note)')
+        parser.add_argument('--session', help='Only profiles whose session id contains this text')
+        parser.add_argument('--sort', default='cumulative', choices=['cumulative', 'tottime', 'ncalls'],
+                            help='Order of the frames')
+        parser.add_argument('--limit', type=int, default=25, help='Frames to show')
+
+    def handle(self, *args, **options):
+        paths = sorted(glob.glob(os.path.join(options['dir'], '*.prof')))
+        selected = []
+        for path in paths:
+            # <date>_<ms>_<endpoint>_<session_id>.prof; endpoint and session have no underscores
+            parts = os.path.basename(path)[:-len('.prof')].split('_')
+            if len(parts) != 4:
+                continue
+            _date, _millis, endpoint, session_id = parts
+            if options['endpoint'] and endpoint != options['endpoint'].replace('_', '-'):
+                continue
+            if options['session'] and options['session'] not in session_id:
+                continue
+            selected.append((path, endpoint))
+        if not selected:
+            raise CommandError(f"No matching profiles in {options['dir']}")
+
+        endpoints = {}
+        for _path, endpoint in selected:
+            endpoints[endpoint] = endpoints.get(endpoint, 0) + 1
+        self.stdout.write(f"{len(selected)} profiles: " + ", ".join(
+            f"{endpoint} x{count}" for endpoint, count in sorted(endpoints.items())
+        ))
+
+        # pstats prints in fragments; collect them so OutputWrapper doesn't add line breaks
+        report = io.StringIO()
+        stats = pstats.Stats(*[path for path, _endpoint in selected], stream=report)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(report.getvalue())
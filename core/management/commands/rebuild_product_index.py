@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.product_index import get_product_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the BM25 product search index from the InternalProduct table"
+
+    def handle(self, *args, **options):
+        count = get_product_index().rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
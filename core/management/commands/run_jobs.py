@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_worker
+from core.models import Job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (final notes, recommendations, transcriptions)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 4),
+                            help='Jobs run at once by this process')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty instead of polling for new jobs')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between polls when the queue is empty')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue previously failed jobs again before starting')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = Job.objects.filter(status=Job.STATUS_FAILED).update(
+                status=Job.STATUS_QUEUED, attempts=0, error=''
+            )
+            self.stdout.write(f"Requeued {requeued} failed jobs")
+
+        total = run_worker(
+            concurrency=options['concurrency'],
+            interval=options['interval'],
+            loop=not options['once'],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {total} jobs"))
@@ -0,0 +1,344 @@
+"""
+In-process metrics in the Prometheus text exposition format, served at /metrics.
+
+A small registry of counters and histograms (no client library, no extra
+server): ai_handler entry points, model calls, PDF extraction and rendering
+record into it, and MetricsMiddleware records latency, status and ORM query
+counts per view. Counters that already live in shared stores (LLM response
+cache, rate limiter) or in process-wide services (single-flight, PDF render
+pool) are read when /metrics is scraped.
+
+Values are per process, like prometheus_client without multiprocess mode:
+scrape every worker, or run one worker per scrape target.
+"""
+import functools
+import threading
+import time
+import types
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def snapshot(self, **labels):
+        """Observation count, sum and per-bucket (not cumulative) counts for one label set"""
+        with self._lock:
+            counts, total = self._values.get(self._key(labels), ([0] * len(self.buckets), 0.0))
+            counts = list(counts)
+        return {
+            'count': sum(counts),
+            'sum': total,
+            'buckets': dict(zip([_number(bound) for bound in self.buckets], counts)),
+        }
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(total, 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# -- LLM ---------------------------------------------------------------------
+
+AI_HANDLER_SECONDS = Histogram(
+    'ai_handler_seconds', 'Latency of ai_handler entry points (streams until exhausted)', ['function'])
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_seconds', 'Model call latency on cache misses, including rate-limit waits and retries', ['function'])
+LLM_PROMPT_CHARS = Counter('llm_prompt_chars_total', 'Characters sent to the model', ['function'])
+LLM_RESPONSE_CHARS = Counter('llm_response_chars_total', 'Characters received from the model', ['function'])
+LLM_PROMPT_TOKENS = Counter('llm_prompt_tokens_total', 'Estimated tokens sent to the model (~4 chars/token)', ['function'])
+LLM_RESPONSE_TOKENS = Counter(
+    'llm_response_tokens_total', 'Estimated tokens received from the model (~4 chars/token)', ['function'])
+LLM_ERRORS = Counter('llm_errors_total', 'Model calls that failed after retries, by exception type', ['function', 'type'])
+
+# -- PDF ---------------------------------------------------------------------
+
+PDF_EXTRACTION_SECONDS = Histogram('pdf_extraction_seconds', 'PDF text extraction time', ['mode'])
+PDF_EXTRACTION_PAGES = Counter('pdf_extraction_pages_total', 'PDF pages parsed', ['mode'])
+PDF_RENDER_SECONDS = Histogram(
+    'pdf_render_seconds', 'Concept-note PDF renders: time in the worker (render) and from submit (total)', ['phase'])
+PDF_RENDER_FAILURES = Counter('pdf_render_failures_total', 'PDF renders that raised or were rejected', ['reason'])
+PDF_CACHE_REQUESTS = Counter('pdf_cache_requests_total', 'Rendered-PDF cache lookups', ['result'])
+
+# -- HTTP / ORM --------------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram('http_request_seconds', 'View latency until the response is returned', ['view'])
+HTTP_DB_QUERIES = Histogram('http_db_queries', 'ORM queries per request', ['view'], buckets=QUERY_BUCKETS)
+HTTP_DB_SECONDS = Counter('http_db_seconds_total', 'Time spent in ORM queries', ['view'])
+HTTP_RESPONSES = Counter('http_responses_total', 'Responses by status code', ['view', 'status'])
+HTTP_EXCEPTIONS = Counter('http_exceptions_total', 'Unhandled view exceptions by type', ['view', 'type'])
+
+
+# -- Instrumentation helpers -------------------------------------------------
+
+def _timed_generator(generator, started, function):
+    try:
+        yield from generator
+    finally:
+        AI_HANDLER_SECONDS.observe(time.perf_counter() - started, function=function)
+
+
+def instrumented(func=None, timing='llm'):
+    """
+    Record an ai_handler entry point's latency; returned generators are timed
+    until exhausted. The call also counts towards the request's `timing` phase.
+    """
+    if func is None:
+        return functools.partial(instrumented, timing=timing)
+
+    @functools.wraps(func)
+    def entry_point(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with phase(timing):
+                result = func(*args, **kwargs)
+        except BaseException:
+            AI_HANDLER_SECONDS.observe(time.perf_counter() - started, function=func.__name__)
+            raise
+        if isinstance(result, types.GeneratorType):
+            return _timed_generator(result, started, func.__name__)
+        AI_HANDLER_SECONDS.observe(time.perf_counter() - started, function=func.__name__)
+        return result
+    return entry_point
+
+
+def record_llm_call(function, prompt, response_text, seconds):
+    from .rate_limit import estimate_tokens
+    LLM_REQUEST_SECONDS.observe(seconds, function=function)
+    prompt_chars = len(prompt) if isinstance(prompt, str) else sum(len(p) for p in prompt if isinstance(p, str))
+    LLM_PROMPT_CHARS.inc(prompt_chars, function=function)
+    LLM_PROMPT_TOKENS.inc(estimate_tokens(prompt), function=function)
+    LLM_RESPONSE_CHARS.inc(len(response_text), function=function)
+    LLM_RESPONSE_TOKENS.inc(estimate_tokens(response_text) if response_text else 0, function=function)
+
+
+# -- Per-request ORM accounting ----------------------------------------------
+
+class RequestStats:
+    """Where one request spent its time; read by ServerTimingMiddleware"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.phases = {}                  # name -> [seconds, count]
+        self._lock = threading.Lock()     # phases may be added from worker threads
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            total = self.phases.setdefault(name, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+
+_request_stats = ContextVar('request_stats', default=None)
+_active_phases = ContextVar('active_phases', default=frozenset())
+
+
+def current_request():
+    return _request_stats.get()
+
+
+@contextmanager
+def phase(name):
+    """
+    Add the enclosed time to the current request's `name` phase. Nested
+    phases of the same name (an entry point calling another) count once.
+    """
+    stats = _request_stats.get()
+    active = _active_phases.get()
+    if stats is None or name in active:
+        yield
+        return
+    token = _active_phases.set(active | {name})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add_phase(name, time.perf_counter() - started)
+        _active_phases.reset(token)
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    """connection_created receiver: count queries run on every new DB connection"""
+    if connection is not None and _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _request_stats.set(stats)
+
+
+def finish_request(token, stats, request, response, seconds):
+    _request_stats.reset(token)
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(seconds, view=view)
+    HTTP_DB_QUERIES.observe(stats.queries, view=view)
+    HTTP_DB_SECONDS.inc(stats.db_seconds, view=view)
+    if response is not None:
+        HTTP_RESPONSES.inc(view=view, status=response.status_code)
+
+
+# -- Exposition --------------------------------------------------------------
+
+def _family(name, kind, documentation, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels([key for key, _ in labels], [value for _, value in labels])} {_number(value)}"
+              for labels, value in samples]
+    return lines
+
+
+def _shared_stats():
+    """Families read from the cache, rate limiter, single-flight group and render pool at scrape time"""
+    from .llm_cache import get_response_cache
+    from .pdf_service import get_render_service
+    from .rate_limit import get_rate_limiter
+    from .single_flight import get_single_flight
+
+    lines = []
+    cache = get_response_cache()
+    if cache is not None:
+        functions = cache.stats()['functions']
+        lines += _family('llm_cache_hits_total', 'counter', 'LLM response cache hits (host-wide)',
+                         [([('function', name)], item['hits']) for name, item in functions.items()])
+        lines += _family('llm_cache_misses_total', 'counter', 'LLM response cache misses (host-wide)',
+                         [([('function', name)], item['misses']) for name, item in functions.items()])
+        lines += _family('llm_cache_hit_ratio', 'gauge', 'LLM response cache hit ratio (host-wide)',
+                         [([('function', name)], item['hit_ratio']) for name, item in functions.items()])
+        lines += _family('llm_cache_saved_seconds_total', 'counter', 'Model latency avoided by cache hits',
+                         [([('function', name)], item['saved_seconds']) for name, item in functions.items()])
+
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        limits = limiter.stats()
+        lines += _family('llm_rate_limit_waits_total', 'counter', 'Model calls that waited for quota (host-wide)',
+                         [([], limits['waits'])])
+        lines += _family('llm_rate_limit_wait_seconds_total', 'counter', 'Time spent waiting for quota (host-wide)',
+                         [([], limits['wait_seconds'])])
+        lines += _family('llm_rate_limit_rejected_total', 'counter', 'Calls refused after waiting too long',
+                         [([], limits['rejected'])])
+        lines += _family('llm_retries_total', 'counter', 'Model calls retried after quota/availability errors',
+                         [([], limits['retries'])])
+
+    flights = get_single_flight().stats()
+    lines += _family('llm_coalesced_total', 'counter', 'Calls that waited on an identical in-flight call',
+                     [([], flights['coalesced'])])
+
+    render = get_render_service().stats()
+    lines += _family('pdf_render_in_flight', 'gauge', 'PDF renders running or queued', [([], render['in_flight'])])
+    lines += _family('pdf_render_queue_size', 'gauge', 'PDF render queue capacity', [([], render['queue_size'])])
+    return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.header()
+        lines += metric.samples()
+    try:
+        lines += _shared_stats()
+    except Exception as e:
+        print(f"Metrics collection error: {e}")
+    return "\n".join(lines) + "\n"
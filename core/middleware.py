@@ -0,0 +1,278 @@
+"""
+Request middleware for the API.
+
+MetricsMiddleware records per-view latency, response status and the number
+and duration of ORM queries each request runs (see core/metrics.py).
+ServerTimingMiddleware turns the same per-request breakdown (LLM calls, PDF
+parsing, ReportLab rendering, ORM, JSON serialization) into a Server-Timing
+header for /api/ responses, shown under Timing in browser devtools, and
+optionally one JSON log line per request. It must come after
+MetricsMiddleware in settings.MIDDLEWARE.
+ProfilerMiddleware runs a single request under cProfile when
+settings.PROFILING_ENABLED is on and the request asks for it with an
+X-Profile: 1 header or ?profile=1; see 'manage.py profile_summary'.
+
+Both handle sync and async views, so ASGI requests stay on the event loop.
+"""
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger('core.timing')
+
+# Phase name -> Server-Timing description, in header order
+TIMING_PHASES = (
+    ('llm', 'LLM calls'),
+    ('pdf_parse', 'PDF parsing'),
+    ('pdf_render', 'ReportLab rendering'),
+    ('json', 'JSON serialization'),
+)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            metrics.finish_request(token, stats, request, response, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            metrics.finish_request(token, stats, request, response, time.perf_counter() - started)
+
+    def process_exception(self, request, exception):
+        match = getattr(request, 'resolver_match', None)
+        metrics.HTTP_EXCEPTIONS.inc(view=match.view_name if match else 'unmatched', type=type(exception).__name__)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'SERVER_TIMING_ENABLED', True)
+        self.log = getattr(settings, 'SERVER_TIMING_LOG', False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.add_timing(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.add_timing(request, response, time.perf_counter() - started)
+        return response
+
+    def add_timing(self, request, response, seconds):
+        stats = metrics.current_request()
+        if not self.enabled or stats is None or not request.path.startswith('/api/'):
+            return
+        entries = []
+        for name, description in TIMING_PHASES:
+            if name in stats.phases:
+                phase_seconds, count = stats.phases[name]
+                entries.append(f'{name};dur={phase_seconds * 1000:.1f};desc="{description} ({count})"')
+        entries.append(f'db;dur={stats.db_seconds * 1000:.1f};desc="ORM ({stats.queries} queries)"')
+        # Streaming responses send their headers before the body is generated
+        entries.append(f'total;dur={seconds * 1000:.1f};desc="{"Until first byte" if response.streaming else "Total"}"')
+        response['Server-Timing'] = ', '.join(entries)
+
+        if self.log:
+            match = getattr(request, 'resolver_match', None)
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'total_ms': round(seconds * 1000, 1),
+                'db_ms': round(stats.db_seconds * 1000, 1),
+                'db_queries': stats.queries,
+                **{f'{name}_ms': round(stats.phases[name][0] * 1000, 1) for name, _ in TIMING_PHASES if name in stats.phases},
+            }))
+
+
+class ProfilerMiddleware:
+    """
+    Profiles the view (and, for streaming responses, the generation of the
+    body) on the request's thread. Model calls made on worker threads show up
+    as time spent waiting for them.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', False)
+        self.directory = getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def wants_profile(self, request):
+        return self.enabled and (
+            request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        # As in __acall__, one profiled request at a time: threaded WSGI
+        # servers run requests concurrently, so later ones go unprofiled
+        if not self._lock.acquire(blocking=False):
+            logger.debug("Profiler busy, not profiling %s", request.path)
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(self.get_response, request)
+        except BaseException:
+            self._lock.release()
+            raise
+        if response.streaming:
+            response.streaming_content = self.profile_stream(
+                profiler, request, response.streaming_content, self._lock.release)
+        else:
+            self._lock.release()
+            response['X-Profile-File'] = self.save(profiler, request)
+        return response
+
+    async def __acall__(self, request):
+        if not self.wants_profile(request):
+            return await self.get_response(request)
+        # Only one profiler can be active per process (Python 3.12 raises
+        # "Another profiling tool is already active"), and concurrent requests
+        # on the event loop would overlap; serve the later ones unprofiled.
+        if self._async_lock.locked():
+            logger.debug("Profiler busy, not profiling %s", request.path)
+            return await self.get_response(request)
+        await self._async_lock.acquire()
+        loop = asyncio.get_running_loop()
+
+        def release():
+            # A sync body is consumed on a worker thread
+            loop.call_soon_threadsafe(self._async_lock.release)
+
+        # Runs on the event loop thread, so other requests served meanwhile are included
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+        except BaseException:
+            self._async_lock.release()
+            raise
+        if not response.streaming:
+            self._async_lock.release()
+            response['X-Profile-File'] = self.save(profiler, request)
+        elif response.is_async:
+            response.streaming_content = self.aprofile_stream(profiler, request, response.streaming_content, release)
+        else:
+            response.streaming_content = self.profile_stream(profiler, request, response.streaming_content, release)
+        return response
+
+    def profile_stream(self, profiler, request, chunks, release):
+        chunks = iter(chunks)
+        try:
+            while True:
+                profiler.enable()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    profiler.disable()
+                yield chunk
+        finally:
+            self.save(profiler, request)
+            release()
+
+    async def aprofile_stream(self, profiler, request, chunks, release):
+        chunks = chunks.__aiter__()
+        try:
+            while True:
+                profiler.enable()
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    return
+                finally:
+                    profiler.disable()
+                yield chunk
+        finally:
+            self.save(profiler, request)
+            release()
+
+    def save(self, profiler, request):
+        """Write the profile as <timestamp>_<endpoint>_<session_id>.prof and return the file name"""
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match and match.url_name else 'unmatched'
+        filename = '_'.join([
+            time.strftime('%Y%m%dT%H%M%S'),
+            f"{int(time.time() * 1000) % 1000:03d}",
+            _safe_name(endpoint),
+            _safe_name(_session_id(request)),
+        ]) + '.prof'
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, filename))
+        return filename
+
+
+def _safe_name(value):
+    return re.sub(r'[^A-Za-z0-9-]+', '-', str(value)).strip('-')[:64] or 'none'
+
+
+def _session_id(request):
+    """session_id from the query string, or from a body the view already parsed"""
+    if request.GET.get('session_id'):
+        return request.GET['session_id']
+    if '_post' in request.__dict__ and request.POST.get('session_id'):
+        return request.POST['session_id']
+    if hasattr(request, '_body') and request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return 'nosession'
+        if isinstance(data, dict) and data.get('session_id'):
+            return data['session_id']
+    return 'nosession'
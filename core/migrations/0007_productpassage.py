@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-16 21:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_internalproduct_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPassage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinal', models.PositiveIntegerField()),
+                ('page_number', models.PositiveIntegerField()),
+                ('heading', models.CharField(blank=True, default='', max_length=200)),
+                ('text', models.TextField()),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passages', to='core.internalproduct')),
+            ],
+            options={
+                'ordering': ['product', 'ordinal'],
+                'unique_together': {('product', 'ordinal')},
+            },
+        ),
+    ]
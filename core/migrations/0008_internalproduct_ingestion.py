@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-16 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_productpassage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='internalproduct',
+            name='ingested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='internalproduct',
+            name='ingestion_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='internalproduct',
+            name='ingestion_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='internalproduct',
+            name='ingestion_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-16 21:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_internalproduct_ingestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('filename', models.CharField(blank=True, default='', max_length=255)),
+                ('size_bytes', models.PositiveBigIntegerField(default=0)),
+                ('text', models.TextField(blank=True, default='')),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('pages_read', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-16 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_uploaded_text(apps, schema_editor):
+    """Each project's uploaded_pdf_text becomes its first SupportingDocument"""
+    ConceptProject = apps.get_model('core', 'ConceptProject')
+    SupportingDocument = apps.get_model('core', 'SupportingDocument')
+    projects = ConceptProject.objects.exclude(uploaded_pdf_text__isnull=True).exclude(uploaded_pdf_text='')
+    for project_id, text in projects.values_list('id', 'uploaded_pdf_text').iterator():
+        SupportingDocument.objects.create(project_id=project_id, text=text, char_count=len(text))
+
+
+def restore_uploaded_text(apps, schema_editor):
+    ConceptProject = apps.get_model('core', 'ConceptProject')
+    SupportingDocument = apps.get_model('core', 'SupportingDocument')
+    texts = {}
+    for document in SupportingDocument.objects.order_by('project_id', 'id').iterator():
+        if document.project_id in texts:
+            texts[document.project_id] += f"\n\n--- Additional Document: {document.filename} ---\n{document.text}"
+        else:
+            texts[document.project_id] = document.text
+    for project_id, text in texts.items():
+        ConceptProject.objects.filter(pk=project_id).update(uploaded_pdf_text=text)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_uploadeddocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupportingDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(blank=True, default='', max_length=64)),
+                ('filename', models.CharField(blank=True, default='', max_length=255)),
+                ('text', models.TextField(blank=True, default='')),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('pages_read', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='core.conceptproject')),
+            ],
+            options={
+                'ordering': ['project', 'id'],
+            },
+        ),
+        migrations.RunPython(move_uploaded_text, restore_uploaded_text),
+        migrations.RemoveField(
+            model_name='conceptproject',
+            name='uploaded_pdf_text',
+        ),
+    ]
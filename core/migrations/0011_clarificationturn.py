@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-16 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_conversation_history(apps, schema_editor):
+    """conversation_history entries become ClarificationTurn rows"""
+    ConceptProject = apps.get_model('core', 'ConceptProject')
+    ClarificationTurn = apps.get_model('core', 'ClarificationTurn')
+    for project_id, history in ConceptProject.objects.values_list('id', 'conversation_history').iterator():
+        turns = [
+            ClarificationTurn(
+                project_id=project_id,
+                ordinal=ordinal,
+                question=str(item.get('question') or ''),
+                answer=str(item.get('answer') or ''),
+            )
+            for ordinal, item in enumerate(item for item in history or [] if isinstance(item, dict))
+        ]
+        ClarificationTurn.objects.bulk_create(turns)
+        ConceptProject.objects.filter(pk=project_id).update(version=len(turns))
+
+
+def restore_conversation_history(apps, schema_editor):
+    ConceptProject = apps.get_model('core', 'ConceptProject')
+    ClarificationTurn = apps.get_model('core', 'ClarificationTurn')
+    histories = {}
+    for turn in ClarificationTurn.objects.order_by('project_id', 'ordinal').iterator():
+        histories.setdefault(turn.project_id, []).append({'question': turn.question, 'answer': turn.answer})
+    for project_id, history in histories.items():
+        ConceptProject.objects.filter(pk=project_id).update(conversation_history=history)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_supportingdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conceptproject',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ClarificationTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordinal', models.PositiveIntegerField()),
+                ('question', models.TextField(blank=True, default='')),
+                ('answer', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clarifications', to='core.conceptproject')),
+            ],
+            options={
+                'ordering': ['project', 'ordinal'],
+                'unique_together': {('project', 'ordinal')},
+            },
+        ),
+        migrations.RunPython(move_conversation_history, restore_conversation_history),
+        migrations.RemoveField(
+            model_name='conceptproject',
+            name='conversation_history',
+        ),
+    ]
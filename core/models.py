@@ -1,38 +1,11 @@
-from django.db import models
-from django.core.validators import FileExtensionValidator
-
-class InternalProduct(models.Model):
-    name = models.CharField(max_length=200)
-    description = models.TextField(blank=True, null=True)
-    pdf_file = models.FileField(
-        upload_to='products/',
-        validators=[FileExtensionValidator(allowed_extensions=['pdf'])]
-    )
-    # NEW: Cache extracted text to avoid re-processing
-    extracted_text = models.TextField(blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-    
-    def __str__(self):
-        return self.name
-    
-    def save(self, *args, **kwargs):
-        # Auto-extract text when PDF is first uploaded
-        if self.pdf_file and not self.extracted_text:
-            try:
-                from .ai_handler import extract_text_from_pdf
-                self.extracted_text = extract_text_from_pdf(self.pdf_file)[:5000]  # Limit to 5000 chars
-            except Exception as e:
-                print(f"Error extracting text from {self.name}: {e}")
-        super().save(*args, **kwargs)
+import uuid
 
+from django.db import models
 
 class ConceptProject(models.Model):
     session_id = models.CharField(max_length=50, unique=True)
     raw_input = models.TextField(blank=True, null=True)
-    uploaded_pdf_text = models.TextField(blank=True, null=True)
     formatted_preview = models.TextField(blank=True, null=True)
-    conversation_history = models.JSONField(default=list, blank=True)
     internal_recommendations = models.TextField(blank=True, null=True)
     external_recommendations = models.TextField(blank=True, null=True)
     final_concept_note = models.TextField(blank=True, null=True)
@@ -45,21 +18,196 @@ class ConceptProject(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Bumped atomically by every clarification append (core.clarifications);
+    # clients may send it back for an optimistic concurrency check
+    version = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f"Project {self.session_id} - {self.client_name or 'Unnamed'}"
 
+    def save(self, *args, **kwargs):
+        # A full save of a stale instance must not roll back `version`, which
+        # is only ever changed with an F() update
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'version'
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
 
 class InternalProduct(models.Model):
+    INGESTION_PENDING = 'pending'
+    INGESTION_PROCESSING = 'processing'
+    INGESTION_DONE = 'done'
+    INGESTION_FAILED = 'failed'
+    INGESTION_STATUS_CHOICES = [
+        (INGESTION_PENDING, 'Pending'),
+        (INGESTION_PROCESSING, 'Processing'),
+        (INGESTION_DONE, 'Done'),
+        (INGESTION_FAILED, 'Failed'),
+    ]
+
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
     pdf_file = models.FileField(upload_to='products/', blank=True, null=True)
     extracted_text = models.TextField(blank=True, null=True)  # Cache extracted text
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # feeds the catalog ETag
+
+    # PDF ingestion runs in the background (manage.py ingest_products)
+    ingestion_status = models.CharField(
+        max_length=20, choices=INGESTION_STATUS_CHOICES, default=INGESTION_PENDING, db_index=True
+    )
+    ingestion_started_at = models.DateTimeField(blank=True, null=True)
+    ingested_at = models.DateTimeField(blank=True, null=True)
+    ingestion_error = models.TextField(blank=True, default='')
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Queue (re-)ingestion whenever a new PDF is attached; text extraction
+        # happens in the ingestion worker, never in the save request
+        update_fields = kwargs.get('update_fields')
+        if self.pdf_file and (update_fields is None or 'pdf_file' in update_fields) and self._pdf_changed():
+            self.ingestion_status = self.INGESTION_PENDING
+            self.ingestion_error = ''
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'ingestion_status', 'ingestion_error'}
+        super().save(*args, **kwargs)
+
+    def _pdf_changed(self):
+        if self._state.adding or self.pk is None:
+            return True
+        previous = type(self).objects.filter(pk=self.pk).values_list('pdf_file', flat=True).first()
+        return previous != self.pdf_file.name
+
+    class Meta:
+        ordering = ['name']
+
+class ProductPassage(models.Model):
+    """Page/heading-level chunk of a product PDF, used for passage retrieval"""
+    product = models.ForeignKey(InternalProduct, on_delete=models.CASCADE, related_name='passages')
+    ordinal = models.PositiveIntegerField()
+    page_number = models.PositiveIntegerField()
+    heading = models.CharField(max_length=200, blank=True, default='')
+    text = models.TextField()
+    char_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product.name} p.{self.page_number} #{self.ordinal}"
+
+    class Meta:
+        ordering = ['product', 'ordinal']
+        unique_together = [('product', 'ordinal')]
+
+
+class UploadedDocument(models.Model):
+    """
+    Extracted text of an uploaded PDF, keyed by the SHA-256 of its bytes so a
+    repeat upload (same RFP, another session) is never parsed twice.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    filename = models.CharField(max_length=255, blank=True, default='')
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    text = models.TextField(blank=True, default='')
+    char_count = models.PositiveIntegerField(default=0)
+    page_count = models.PositiveIntegerField(default=0)
+    pages_read = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename or self.sha256[:12]} ({self.page_count} pages)"
+
+    class Meta:
+        ordering = ['-last_used_at']
+
+
+class SupportingDocument(models.Model):
+    """
+    Text of one document attached to a ConceptProject. Rows are only ever
+    inserted, so a new upload never rewrites earlier documents or the project
+    row, and loading a project does not load any document text.
+    """
+    project = models.ForeignKey(ConceptProject, on_delete=models.CASCADE, related_name='documents')
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    filename = models.CharField(max_length=255, blank=True, default='')
+    text = models.TextField(blank=True, default='')
+    char_count = models.PositiveIntegerField(default=0)
+    page_count = models.PositiveIntegerField(default=0)
+    pages_read = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename or 'Document'} ({self.char_count} chars) for {self.project.session_id}"
+
+    class Meta:
+        ordering = ['project', 'id']
+
+
+class ClarificationTurn(models.Model):
+    """One answered clarification question. Appending a turn is a single insert."""
+    project = models.ForeignKey(ConceptProject, on_delete=models.CASCADE, related_name='clarifications')
+    ordinal = models.PositiveIntegerField()
+    question = models.TextField(blank=True, default='')
+    answer = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.project.session_id} Q{self.ordinal}"
+
+    class Meta:
+        ordering = ['project', 'ordinal']
+        unique_together = [('project', 'ordinal')]
+
+
+class Job(models.Model):
+    """
+    A long-running step (LLM generation, transcription) run by 'manage.py
+    run_jobs' instead of inside the HTTP request. See core.jobs.
+    """
+    KIND_FINAL_NOTE = 'generate_final_note'
+    KIND_RECOMMENDATIONS = 'get_recommendations'
+    KIND_AUDIO = 'upload_audio'
+    KIND_CHOICES = [
+        (KIND_FINAL_NOTE, 'Generate final note'),
+        (KIND_RECOMMENDATIONS, 'Get recommendations'),
+        (KIND_AUDIO, 'Transcribe audio'),
+    ]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=40, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    session_id = models.CharField(max_length=50, blank=True, default='', db_index=True)
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.id} ({self.status})"
+
     class Meta:
-        ordering = ['name']
\ No newline at end of file
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='core_job_status_created')]
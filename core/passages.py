@@ -0,0 +1,215 @@
+"""
+Passage-level knowledge base over the internal product PDFs.
+
+Each product PDF is split into page- and heading-level passages
+(ProductPassage rows) which are indexed with BM25. The recommendation prompt
+is then filled with the top-k passages across all products instead of the
+first few thousand characters of every product, so features documented deep
+inside a PDF are still found and the prompt stays small.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .pdf_extraction import iter_pdf_pages
+from .product_index import PersistentIndex, tokenize
+
+MAX_PASSAGE_CHARS = 1200
+
+# "# Title", "2.1 SYSTEM ARCHITECTURE", "KEY FEATURES:" ...
+HEADING_RE = re.compile(
+    r"^(?:#{1,6}\s+\S.*"
+    r"|\d+(?:\.\d+)*[.)]?\s+[A-Z][A-Z0-9 &/,:()\-]{3,}"
+    r"|[A-Z][A-Z0-9 &/,:()\-]{4,})$"
+)
+
+
+def is_heading(line):
+    return len(line) <= 120 and bool(HEADING_RE.match(line))
+
+
+def split_passages(pages, max_chars=MAX_PASSAGE_CHARS):
+    """
+    Split (page_number, text) pairs into passages.
+    A passage never spans pages; it is closed at every heading and whenever it
+    would grow past max_chars (at a line boundary). Headings carry over to the
+    following pages until a new one appears.
+    Returns [{'page_number', 'heading', 'text'}].
+    """
+    passages = []
+    heading = ''
+
+    for page_number, page_text in pages:
+        lines = []
+        size = 0
+
+        def flush():
+            text = "\n".join(lines).strip()
+            if text:
+                passages.append({'page_number': page_number, 'heading': heading[:200], 'text': text})
+            lines.clear()
+
+        for raw_line in (page_text or '').splitlines():
+            line = raw_line.strip()
+            if not line:
+                continue
+            if is_heading(line):
+                flush()
+                size = 0
+                heading = line.lstrip('#').strip()
+                continue
+            if size + len(line) > max_chars and lines:
+                flush()
+                size = 0
+            lines.append(line)
+            size += len(line) + 1
+        flush()
+
+    return passages
+
+
+def passage_terms(passage, product_name=''):
+    terms = Counter()
+    for token in tokenize(passage.text):
+        terms[token] += 1
+    for token in tokenize(passage.heading):
+        terms[token] += 2
+    for token in tokenize(product_name):
+        terms[token] += 2
+    return terms
+
+
+class PassageIndex(PersistentIndex):
+    def documents(self):
+        from .models import ProductPassage
+        for passage in ProductPassage.objects.select_related('product').only(
+                'id', 'heading', 'text', 'product__name'):
+            yield passage.pk, passage_terms(passage, passage.product.name)
+
+
+_passage_index = None
+_passage_index_lock = threading.Lock()
+
+
+def get_passage_index():
+    global _passage_index
+    if _passage_index is None:
+        with _passage_index_lock:
+            if _passage_index is None:
+                _passage_index = PassageIndex(
+                    getattr(settings, 'PASSAGE_INDEX_PATH', os.path.join(settings.BASE_DIR, 'passage_index.json'))
+                )
+    return _passage_index
+
+
+def read_pdf_pages(pdf_file):
+    """[(page_number, text)] for every page of the PDF"""
+    return list(iter_pdf_pages(pdf_file))
+
+
+def rebuild_product_passages(product, pages=None):
+    """
+    Replace the stored passages of one product (from its PDF unless `pages`
+    is given) and update the passage index. Returns the number of passages.
+    """
+    from .models import ProductPassage
+
+    if pages is None:
+        if not product.pdf_file:
+            pages = []
+        else:
+            with product.pdf_file.open('rb') as pdf_file:
+                pages = read_pdf_pages(pdf_file)
+
+    chunks = split_passages(pages)
+    with transaction.atomic():
+        old_ids = list(product.passages.values_list('id', flat=True))
+        product.passages.all().delete()
+        passages = ProductPassage.objects.bulk_create([
+            ProductPassage(
+                product=product,
+                ordinal=ordinal,
+                page_number=chunk['page_number'],
+                heading=chunk['heading'],
+                text=chunk['text'],
+                char_count=len(chunk['text']),
+            )
+            for ordinal, chunk in enumerate(chunks)
+        ])
+
+    # bulk_create only returns primary keys on some backends; re-read if needed
+    if passages and passages[0].pk is None:
+        passages = list(product.passages.all())
+    get_passage_index().update(
+        upserts=[(passage.pk, passage_terms(passage, product.name)) for passage in passages],
+        removals=old_ids,
+    )
+    return len(passages)
+
+
+class Retrieval:
+    """Top-k passages for a query, with the cost of finding them"""
+
+    def __init__(self, passages, retrieval_ms):
+        self.passages = passages          # [(ProductPassage, score)] best first
+        self.retrieval_ms = retrieval_ms
+
+    def __len__(self):
+        return len(self.passages)
+
+    def prompt_context(self, max_chars=None):
+        """Passages formatted for the recommendation prompt, grouped under their product"""
+        if max_chars is None:
+            max_chars = getattr(settings, 'PASSAGE_PROMPT_CHARS', 3000)
+        blocks = []
+        used = 0
+        for passage, _score in self.passages:
+            label = f"=== {passage.product.name} (p.{passage.page_number}"
+            label += f" - {passage.heading}) ===" if passage.heading else ") ==="
+            block = f"{label}\n{passage.text}"
+            if blocks and used + len(block) > max_chars:
+                break
+            blocks.append(block[:max_chars])
+            used += len(block) + 2
+        return "\n\n".join(blocks)
+
+
+def retrieve_passages(query_text, product_ids=None, k=None, max_per_product=3):
+    """
+    Top-k passages across all products (optionally restricted to product_ids),
+    at most max_per_product from any single product.
+    """
+    from .models import ProductPassage
+
+    if k is None:
+        k = getattr(settings, 'RECOMMENDATION_PASSAGES', 8)
+    started = time.perf_counter()
+    ranked = get_passage_index().get().search(query_text)
+
+    # Over-fetch, then apply the product filter and per-product cap in order
+    candidate_ids = [int(doc_id) for doc_id, _score in ranked[:k * 10]]
+    by_id = ProductPassage.objects.select_related('product').in_bulk(candidate_ids)
+    if product_ids is not None:
+        product_ids = set(product_ids)
+
+    selected = []
+    per_product = Counter()
+    for doc_id, score in ranked[:k * 10]:
+        passage = by_id.get(int(doc_id))
+        if passage is None:
+            continue
+        if product_ids is not None and passage.product_id not in product_ids:
+            continue
+        if per_product[passage.product_id] >= max_per_product:
+            continue
+        per_product[passage.product_id] += 1
+        selected.append((passage, score))
+        if len(selected) >= k:
+            break
+
+    return Retrieval(selected, (time.perf_counter() - started) * 1000)
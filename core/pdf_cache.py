@@ -0,0 +1,155 @@
+"""
+On-disk cache of rendered concept-note PDFs.
+
+A PDF is addressed by the SHA-256 of the note text and the client name it is
+titled with, and stored as <PDF_CACHE_DIR>/<key>.pdf (written to a temp file
+and renamed into place, so readers never see a partial file). The key doubles
+as the ETag served by download_pdf. generate_final_note pre-renders the note in
+a background thread, so the download itself is a file send. The directory is
+pruned by total size, least recently used first (settings.PDF_CACHE_MAX_BYTES).
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from . import metrics
+from .pdf_service import RenderQueueFull, get_render_service
+
+_render_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'PDF_PRERENDER_WORKERS', 2),
+    thread_name_prefix='pdf-prerender'
+)
+_key_locks = {}
+_key_locks_lock = threading.Lock()
+
+
+def cache_dir():
+    directory = getattr(settings, 'PDF_CACHE_DIR', os.path.join(settings.BASE_DIR, 'pdf_cache'))
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def pdf_key(concept_note_text, client_name=None):
+    digest = hashlib.sha256()
+    digest.update((concept_note_text or '').encode('utf-8'))
+    digest.update(b'\0')
+    digest.update((client_name or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_path(key):
+    """Path of the cached PDF for this key, or None"""
+    path = os.path.join(cache_dir(), f"{key}.pdf")
+    if not os.path.exists(path):
+        return None
+    try:
+        os.utime(path)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return path
+
+
+def _lock_for(key):
+    with _key_locks_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def get_or_render_pdf(concept_note_text, client_name=None):
+    """
+    Returns (path, key, cached). Concurrent requests for the same note in this
+    process render it once.
+    """
+    key = pdf_key(concept_note_text, client_name)
+    path = cached_path(key)
+    if path:
+        metrics.PDF_CACHE_REQUESTS.inc(result='hit')
+        return path, key, True
+
+    lock = _lock_for(key)
+    try:
+        with lock:
+            path = cached_path(key)
+            if path:
+                metrics.PDF_CACHE_REQUESTS.inc(result='hit')
+                return path, key, True
+            metrics.PDF_CACHE_REQUESTS.inc(result='miss')
+            # Rendered in the PDF process pool; raises RenderQueueFull when saturated
+            pdf = get_render_service().render(concept_note_text, client_name)
+            path = os.path.join(cache_dir(), f"{key}.pdf")
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as tmp:
+                    tmp.write(pdf)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+    finally:
+        # Also after a render error or a hit found under the lock
+        with _key_locks_lock:
+            _key_locks.pop(key, None)
+
+    evict_pdfs()
+    return path, key, False
+
+
+def open_cached_pdf(concept_note_text, client_name=None, attempts=2):
+    """
+    Returns (open binary file, key, cached). The file is opened here because
+    eviction may delete it as soon as get_or_render_pdf returns; an open
+    handle stays readable after the unlink, and a deleted file is rendered again.
+    """
+    for attempt in range(attempts):
+        path, key, cached = get_or_render_pdf(concept_note_text, client_name)
+        try:
+            return open(path, 'rb'), key, cached
+        except FileNotFoundError:
+            if attempt + 1 >= attempts:
+                raise
+
+
+def prerender(concept_note_text, client_name=None):
+    """Render in the background so the first download is already cached"""
+    def render():
+        try:
+            get_or_render_pdf(concept_note_text, client_name)
+        except RenderQueueFull:
+            # Downloads have priority; the first one renders the note instead
+            print("PDF pre-render skipped: render queue is full")
+        except Exception as e:
+            print(f"PDF pre-render error: {e}")
+    return _render_pool.submit(render)
+
+
+def evict_pdfs(max_bytes=None):
+    """Delete the least recently used PDFs until the cache fits in max_bytes. Returns files deleted."""
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'PDF_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+    entries = []
+    total = 0
+    with os.scandir(cache_dir()) as scan:
+        for entry in scan:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+    deleted = 0
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return deleted
@@ -0,0 +1,174 @@
+"""
+Lazy, budget-aware PDF text extraction.
+
+PyPDF2 only decodes a page's content stream when extract_text() is called on
+it, so walking pages one at a time and stopping once a character or page
+budget is met avoids paying for pages no caller ever reads (prompts only use
+the first few thousand characters of an uploaded RFP).
+
+When the full text of a large document is needed, extract_pdf_text_parallel
+splits the page range across a process pool; see bench_pdf_extraction. The
+ingestion worker splits long product PDFs the same way (core/ingestion.py).
+"""
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+from django.conf import settings
+
+
+class PDFText:
+    """Extracted text plus what it cost to get it"""
+
+    def __init__(self, text, page_count, pages_read, truncated):
+        self.text = text
+        self.page_count = page_count      # pages in the document
+        self.pages_read = pages_read      # pages actually parsed
+        self.truncated = truncated        # stopped early because of the budget
+
+    def __str__(self):
+        return self.text
+
+    def as_dict(self):
+        return {
+            'page_count': self.page_count,
+            'pages_read': self.pages_read,
+            'truncated': self.truncated,
+        }
+
+
+def open_pdf(pdf_file):
+    pdf_file.seek(0)
+    return PyPDF2.PdfReader(pdf_file)
+
+
+def iter_pdf_pages(pdf_file, max_pages=None, start=0, reader=None):
+    """Yield (page_number, text) one page at a time, parsing each page only when asked for"""
+    reader = reader or open_pdf(pdf_file)
+    pages = reader.pages
+    stop = len(pages) if max_pages is None else min(len(pages), start + max_pages)
+    for index in range(start, stop):
+        yield index + 1, pages[index].extract_text() or ''
+
+
+def extract_pdf_text(pdf_file, max_chars=None, max_pages=None):
+    """
+    Text of the PDF, parsing pages until max_chars characters or max_pages
+    pages have been read (both optional). Returns a PDFText.
+    """
+    reader = open_pdf(pdf_file)
+    page_count = len(reader.pages)
+    parts = []
+    chars = 0
+    pages_read = 0
+    for _number, text in iter_pdf_pages(pdf_file, max_pages=max_pages, reader=reader):
+        pages_read += 1
+        parts.append(text)
+        chars += len(text)
+        if max_chars is not None and chars >= max_chars:
+            break
+
+    text = "".join(parts)
+    truncated = pages_read < page_count
+    if max_chars is not None and len(text) > max_chars:
+        text = text[:max_chars]
+        truncated = True
+    return PDFText(text, page_count, pages_read, truncated)
+
+
+def _extract_page_range(path, start, stop):
+    """Process-pool task: text of pages [start, stop) of the PDF at `path`"""
+    with open(path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        return [page.extract_text() or '' for page in reader.pages[start:stop]]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool():
+    """Process pool shared by parallel extractions in this process"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'PDF_EXTRACTION_WORKERS', None))
+    return _pool
+
+
+def _local_path(pdf_file):
+    """
+    (path, is_temporary) for a file the worker processes can open themselves,
+    so only page numbers and text cross the process boundary.
+    """
+    if isinstance(pdf_file, (str, os.PathLike)):
+        return os.fspath(pdf_file), False
+    for attribute in ('temporary_file_path', 'path'):
+        try:
+            path = getattr(pdf_file, attribute)
+            path = path() if callable(path) else path
+            if path and os.path.exists(path):
+                return path, False
+        except (AttributeError, NotImplementedError, ValueError):
+            continue
+    pdf_file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
+        shutil.copyfileobj(pdf_file, temp_file)
+    return temp_file.name, True
+
+
+def extract_pdf_text_parallel(pdf_file, max_chars=None, pages_per_task=None, executor=None):
+    """
+    Like extract_pdf_text, but page ranges are parsed in a process pool.
+    Page order is preserved, and at most two ranges per worker are in flight
+    at once, so memory stays bounded however long the document is. Documents
+    shorter than settings.PDF_PARALLEL_MIN_PAGES are parsed in-process.
+    """
+    path, is_temporary = _local_path(pdf_file)
+    try:
+        with open(path, 'rb') as source:
+            page_count = len(PyPDF2.PdfReader(source).pages)
+        if page_count < getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 20) and executor is None:
+            with open(path, 'rb') as source:
+                return extract_pdf_text(source, max_chars=max_chars)
+
+        executor = executor or get_extraction_pool()
+        workers = getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+        if pages_per_task is None:
+            pages_per_task = getattr(settings, 'PDF_PAGES_PER_TASK', 8)
+        ranges = [(start, min(start + pages_per_task, page_count))
+                  for start in range(0, page_count, pages_per_task)]
+
+        parts = []
+        chars = 0
+        pages_read = 0
+        window = []
+        next_range = 0
+        while next_range < len(ranges) or window:
+            # Keep the window full, then consume the oldest range to preserve order
+            while next_range < len(ranges) and len(window) < workers * 2:
+                start, stop = ranges[next_range]
+                window.append(executor.submit(_extract_page_range, path, start, stop))
+                next_range += 1
+            texts = window.pop(0).result()
+            pages_read += len(texts)
+            parts.extend(texts)
+            chars += sum(len(text) for text in texts)
+            if max_chars is not None and chars >= max_chars:
+                for future in window:
+                    future.cancel()
+                break
+
+        text = "".join(parts)
+        truncated = pages_read < page_count
+        if max_chars is not None and len(text) > max_chars:
+            text = text[:max_chars]
+            truncated = True
+        return PDFText(text, page_count, pages_read, truncated)
+    finally:
+        if is_temporary:
+            os.unlink(path)
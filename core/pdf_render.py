@@ -0,0 +1,285 @@
+"""
+Single-pass Markdown -> ReportLab flowables compiler for concept-note PDFs.
+
+The note is read line by line exactly once. Each line is classified by one
+precompiled pattern (rule, heading, bullet, numbered item, table row) and
+turned into headings, bullet/numbered lists, tables and paragraphs with
+bold/italic inline markup. Patterns, paragraph styles and the table style
+are built once at import and shared by every render.
+
+    buffer = render_concept_note(text, client_name="Acme Hospital")
+"""
+import re
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import (
+    ListFlowable,
+    ListItem,
+    Paragraph,
+    SimpleDocTemplate,
+    Spacer,
+    Table,
+    TableStyle,
+)
+
+PAGE_SIZE = A4
+LEFT_MARGIN = RIGHT_MARGIN = 1 * inch
+TOP_MARGIN = BOTTOM_MARGIN = 0.75 * inch
+FRAME_WIDTH = PAGE_SIZE[0] - LEFT_MARGIN - RIGHT_MARGIN
+ACCENT = colors.HexColor("#4d9eff")
+
+# -- Patterns ---------------------------------------------------------------
+
+LINE_RE = re.compile(r"""
+    ^\s*(?:
+        (?P<rule>(?:[-*_=─═]\s*){3,})$                        # --- *** ─── ═══
+      | (?P<hashes>\#{1,6})\s*(?P<heading>.*?)\s*\#*$         # # Heading
+      | (?P<bullet>[-•*+▪◦])\s+(?P<bullet_text>.+)            # - item
+      | (?P<number>\d{1,3})[.)]\s+(?P<number_text>.+)         # 1. item / 1. SECTION
+      | (?P<row>\|.*\|)\s*$                                   # | table | row |
+    )
+""", re.VERBOSE)
+
+# "Concept Note - Acme" banner lines the model sometimes adds
+BANNER_RE = re.compile(r"^\s*concept\s*note\s*[-:]\s*\w+\s*$", re.IGNORECASE)
+TABLE_DIVIDER_RE = re.compile(r"^\|?(?:\s*:?-{2,}:?\s*\|)*\s*:?-{2,}:?\s*\|?$")
+BOLD_LINE_RE = re.compile(r"^\*\*(?P<text>[^*]+?)\*\*:?$")
+INLINE_RE = re.compile(
+    r"\*\*(?P<b1>.+?)\*\*"
+    r"|__(?P<b2>.+?)__"
+    r"|(?<![\w*])\*(?!\s)(?P<i1>.+?)(?<!\s)\*(?![\w*])"
+    r"|(?<![\w_])_(?!\s)(?P<i2>.+?)(?<!\s)_(?![\w_])"
+)
+
+# Box-drawing separators are dropped from text; XML specials are escaped for Paragraph
+STRIP_CHARS = str.maketrans('', '', '─═')
+XML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+# -- Styles -----------------------------------------------------------------
+
+_base = getSampleStyleSheet()
+
+CLIENT_STYLE = ParagraphStyle(
+    "ClientTitle",
+    parent=_base["Heading1"],
+    fontSize=18,
+    textColor=ACCENT,
+    spaceAfter=14,
+    alignment=TA_CENTER,
+    fontName="Helvetica-Bold",
+)
+
+HEADING_STYLE = ParagraphStyle(
+    "CustomHeading",
+    parent=_base["Heading2"],
+    fontSize=14,
+    textColor=ACCENT,
+    spaceAfter=10,
+    spaceBefore=14,
+    fontName="Helvetica-Bold",
+)
+
+SUBHEADING_STYLE = ParagraphStyle(
+    "CustomSubheading",
+    parent=_base["Heading3"],
+    fontSize=12,
+    textColor=colors.black,
+    spaceAfter=6,
+    spaceBefore=10,
+    fontName="Helvetica-Bold",
+)
+
+BODY_STYLE = ParagraphStyle(
+    "CustomBody",
+    parent=_base["BodyText"],
+    fontSize=11,
+    leading=15,
+    alignment=TA_LEFT,
+    spaceAfter=8,
+    textColor=colors.black,
+)
+
+LIST_ITEM_STYLE = ParagraphStyle(
+    "CustomListItem",
+    parent=BODY_STYLE,
+    spaceAfter=3,
+)
+
+TABLE_CELL_STYLE = ParagraphStyle(
+    "CustomTableCell",
+    parent=BODY_STYLE,
+    fontSize=10,
+    leading=13,
+    spaceAfter=0,
+)
+
+TABLE_HEADER_STYLE = ParagraphStyle(
+    "CustomTableHeader",
+    parent=TABLE_CELL_STYLE,
+    fontName="Helvetica-Bold",
+    textColor=colors.white,
+)
+
+TABLE_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), ACCENT),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.HexColor("#b0c4de")),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("TOPPADDING", (0, 0), (-1, -1), 4),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 4),
+])
+
+
+# -- Compiler ---------------------------------------------------------------
+
+def _inline_sub(match):
+    bold = match.group('b1') or match.group('b2')
+    if bold is not None:
+        return f"<b>{bold}</b>"
+    return f"<i>{match.group('i1') or match.group('i2')}</i>"
+
+
+def inline_markup(text):
+    """Escape XML specials and turn **bold** / *italic* into Paragraph markup"""
+    return INLINE_RE.sub(_inline_sub, text.translate(STRIP_CHARS).translate(XML_ESCAPES).strip())
+
+
+def plain_text(text):
+    """Text with emphasis markers removed, for heading detection"""
+    return text.replace('*', '').replace('_', '').strip()
+
+
+class _StoryBuilder:
+    """Collects flowables while the lines stream past, closing open blocks as needed"""
+
+    def __init__(self):
+        self.story = []
+        self.paragraph = []
+        self.list_items = []
+        self.list_kind = None
+        self.list_start = 1
+        self.table_rows = []
+
+    def flush(self):
+        if self.paragraph:
+            self.story.append(Paragraph(" ".join(self.paragraph), BODY_STYLE))
+            self.paragraph = []
+        if self.list_items:
+            kwargs = {'bulletType': '1', 'start': self.list_start} if self.list_kind == 'number' else {
+                'bulletType': 'bullet', 'start': '•'
+            }
+            self.story.append(ListFlowable(
+                [ListItem(Paragraph(item, LIST_ITEM_STYLE)) for item in self.list_items],
+                leftIndent=14, bulletFontSize=9, spaceAfter=6, **kwargs
+            ))
+            self.list_items = []
+            self.list_kind = None
+        if self.table_rows:
+            self.story.append(self._table())
+            self.table_rows = []
+
+    def _table(self):
+        columns = max(len(row) for row in self.table_rows)
+        data = []
+        for index, row in enumerate(self.table_rows):
+            style = TABLE_HEADER_STYLE if index == 0 else TABLE_CELL_STYLE
+            cells = row + [''] * (columns - len(row))
+            data.append([Paragraph(inline_markup(cell), style) for cell in cells])
+        table = Table(data, colWidths=[FRAME_WIDTH / columns] * columns, repeatRows=1, hAlign='LEFT')
+        table.setStyle(TABLE_STYLE)
+        return table
+
+    def heading(self, text, style=HEADING_STYLE):
+        self.flush()
+        self.story.append(Paragraph(inline_markup(text), style))
+
+    def list_item(self, kind, text, number=1):
+        if self.paragraph or self.table_rows or (self.list_items and self.list_kind != kind):
+            self.flush()
+        if not self.list_items:
+            self.list_kind = kind
+            self.list_start = number
+        self.list_items.append(inline_markup(text))
+
+    def table_row(self, row):
+        if TABLE_DIVIDER_RE.match(row):
+            return
+        if self.paragraph or self.list_items:
+            self.flush()
+        self.table_rows.append([cell.strip() for cell in row.strip().strip('|').split('|')])
+
+    def text(self, line):
+        if self.list_items or self.table_rows:
+            self.flush()
+        self.paragraph.append(inline_markup(line))
+
+
+def build_story(concept_note_text, client_name=None):
+    """Compile the note into a list of flowables in one pass over its lines"""
+    builder = _StoryBuilder()
+    if client_name:
+        builder.story.append(Paragraph(inline_markup(client_name), CLIENT_STYLE))
+        builder.story.append(Spacer(1, 0.3 * inch))
+
+    for line in (concept_note_text or "").splitlines():
+        if not line.strip():
+            builder.flush()
+            continue
+        match = LINE_RE.match(line)
+        if match is None:
+            if BANNER_RE.match(line):
+                continue
+            bold_line = BOLD_LINE_RE.match(line.strip())
+            plain = plain_text(line)
+            if bold_line and len(plain) < 100:
+                builder.heading(bold_line.group('text'), HEADING_STYLE if plain.isupper() else SUBHEADING_STYLE)
+            elif plain.isupper() and len(plain) > 5:
+                builder.heading(plain)
+            else:
+                builder.text(line)
+        elif match.group('rule') is not None:
+            builder.flush()
+        elif match.group('hashes') is not None:
+            if match.group('heading'):
+                builder.heading(match.group('heading'), HEADING_STYLE if len(match.group('hashes')) <= 2 else SUBHEADING_STYLE)
+        elif match.group('bullet') is not None:
+            builder.list_item('bullet', match.group('bullet_text'))
+        elif match.group('number') is not None:
+            text = match.group('number_text')
+            plain = plain_text(text)
+            if plain.isupper() and len(plain) > 3:
+                # "1. ABOUT US": numbered section heading
+                builder.heading(f"{match.group('number')}. {plain}")
+            else:
+                builder.list_item('number', text, int(match.group('number')))
+        else:
+            builder.table_row(match.group('row'))
+
+    builder.flush()
+    return builder.story
+
+
+def render_story(story, buffer=None):
+    """Lay out flowables onto A4 pages. Returns (buffer, page_count)."""
+    buffer = buffer or BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=PAGE_SIZE,
+        topMargin=TOP_MARGIN,
+        bottomMargin=BOTTOM_MARGIN,
+        leftMargin=LEFT_MARGIN,
+        rightMargin=RIGHT_MARGIN,
+    )
+    doc.build(story)
+    buffer.seek(0)
+    return buffer, doc.page
+
+
+def render_concept_note(concept_note_text, client_name=None):
+    """PDF of the note as a BytesIO positioned at 0"""
+    buffer, _pages = render_story(build_story(concept_note_text, client_name))
+    return buffer
@@ -0,0 +1,126 @@
+"""
+PDF rendering off the request thread.
+
+ReportLab layout is CPU-bound, so renders run in a dedicated process pool
+(settings.PDF_RENDER_WORKERS) instead of on the worker thread that accepted
+the request. At most PDF_RENDER_QUEUE_SIZE renders may be running or waiting
+per web process; beyond that submit() raises RenderQueueFull, which
+download_pdf turns into 503 + Retry-After instead of piling up requests.
+stats() (see get_stats) reports the queue depth kept here alongside render
+counts and latency read from the pdf_render_* metrics.
+"""
+import math
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from . import metrics
+from .pdf_render import render_concept_note
+
+
+class RenderQueueFull(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"PDF render queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def render_pdf_bytes(concept_note_text, client_name=None):
+    """Process-pool task: (pdf bytes, seconds spent rendering)"""
+    started = time.perf_counter()
+    pdf = render_concept_note(concept_note_text, client_name=client_name).getvalue()
+    return pdf, time.perf_counter() - started
+
+
+class PDFRenderService:
+    def __init__(self, workers=2, queue_size=8):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, from the mean render time"""
+        total = metrics.PDF_RENDER_SECONDS.snapshot(phase='total')
+        mean = total['sum'] / total['count'] if total['count'] else 1.0
+        return max(1, math.ceil(mean * self._in_flight / self.workers))
+
+    def submit(self, concept_note_text, client_name=None):
+        """Queue a render. Returns a Future of (pdf bytes, render seconds)."""
+        with self._lock:
+            if self._in_flight >= self.queue_size:
+                metrics.PDF_RENDER_FAILURES.inc(reason='queue_full')
+                raise RenderQueueFull(self.retry_after())
+            self._in_flight += 1
+            executor = self._get_executor()
+        submitted = time.perf_counter()
+        try:
+            future = executor.submit(render_pdf_bytes, concept_note_text, client_name)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(lambda done: self._finished(done, submitted))
+        return future
+
+    def _finished(self, future, submitted):
+        elapsed = time.perf_counter() - submitted
+        with self._lock:
+            self._in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            metrics.PDF_RENDER_FAILURES.inc(reason='error')
+            return
+        metrics.PDF_RENDER_SECONDS.observe(future.result()[1], phase='render')
+        metrics.PDF_RENDER_SECONDS.observe(elapsed, phase='total')
+
+    def render(self, concept_note_text, client_name=None, timeout=None):
+        """Render and wait for the PDF bytes. Raises RenderQueueFull when saturated."""
+        if timeout is None:
+            timeout = getattr(settings, 'PDF_RENDER_TIMEOUT', 120)
+        with metrics.phase('pdf_render'):
+            pdf, _seconds = self.submit(concept_note_text, client_name).result(timeout=timeout)
+        return pdf
+
+    def stats(self):
+        # Render figures come from the process-wide metrics; there is one
+        # service per process (get_render_service)
+        render = metrics.PDF_RENDER_SECONDS.snapshot(phase='render')
+        total = metrics.PDF_RENDER_SECONDS.snapshot(phase='total')
+        with self._lock:
+            in_flight = self._in_flight
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'in_flight': in_flight,
+            'rendered': total['count'],
+            'failed': metrics.PDF_RENDER_FAILURES.value(reason='error'),
+            'rejected': metrics.PDF_RENDER_FAILURES.value(reason='queue_full'),
+            'render_seconds': round(render['sum'], 3),
+            'total_seconds': round(total['sum'], 3),
+            'mean_latency': round(total['sum'] / total['count'], 3) if total['count'] else 0.0,
+            'latency_buckets': total['buckets'],
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_render_service():
+    """Process-wide render service sized by settings"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = PDFRenderService(
+                    workers=getattr(settings, 'PDF_RENDER_WORKERS', 2),
+                    queue_size=getattr(settings, 'PDF_RENDER_QUEUE_SIZE', 8),
+                )
+    return _service
@@ -0,0 +1,281 @@
+"""
+Local BM25 index over the internal product catalog.
+
+Replaces the LLM keyword-extraction round trip in find_internal_matches:
+products are ranked against the project preview + clarifications locally.
+Each product is indexed from its name (weight 3), description (weight 2) and
+extracted PDF text (weight 1), mirroring the old name/description scoring.
+
+The index is stored as postings lists (term -> {product id: term frequency}),
+i.e. a sparse term/document matrix, persisted to settings.PRODUCT_INDEX_PATH
+and updated incrementally by the InternalProduct signals in core.signals.
+"""
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: in-process locking only
+    fcntl = None
+
+from django.conf import settings
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could do does for from has have how if in into is it its
+may more most must no not of on or our over should so such than that the their them then there
+these they this those through to under up us use used using very was we were what when which while
+who will with within would you your all any each other only own same also via per etc
+""".split())
+
+FIELD_WEIGHTS = (('name', 3), ('description', 2), ('extracted_text', 1))
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall((text or "").lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def product_terms(product):
+    """Weighted term frequencies for one product"""
+    terms = Counter()
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokenize(getattr(product, field, None)):
+            terms[token] += weight
+    return terms
+
+
+class BM25Index:
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}                      # doc id -> {term: tf}
+        self.doc_len = {}                   # doc id -> sum of tf
+        self.postings = defaultdict(dict)   # term -> {doc id: tf}
+        self.total_len = 0
+
+    def __contains__(self, doc_id):
+        return str(doc_id) in self.docs
+
+    def __len__(self):
+        return len(self.docs)
+
+    def upsert(self, doc_id, terms):
+        doc_id = str(doc_id)
+        self.remove(doc_id)
+        terms = dict(terms)
+        self.docs[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_len[doc_id] = length
+        self.total_len += length
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+
+    def remove(self, doc_id):
+        doc_id = str(doc_id)
+        terms = self.docs.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_len -= self.doc_len.pop(doc_id, 0)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query_text, limit=None):
+        """[(doc id, score)] with score > 0, best first"""
+        n_docs = len(self.docs)
+        if not n_docs:
+            return []
+        avg_len = self.total_len / n_docs or 1.0
+        scores = defaultdict(float)
+        for term in set(tokenize(query_text)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def to_dict(self):
+        return {'k1': self.k1, 'b': self.b, 'docs': self.docs}
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(k1=data.get('k1', 1.5), b=data.get('b', 0.75))
+        for doc_id, terms in data.get('docs', {}).items():
+            index.upsert(doc_id, terms)
+        return index
+
+
+class PersistentIndex:
+    """
+    BM25Index persisted to a JSON file shared by all worker processes.
+    Subclasses provide documents(), the (doc id, terms) pairs to build from.
+    Writers hold an flock on <path>.lock and re-read the file inside it, so
+    concurrent updates from other processes are merged rather than lost.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+
+    def documents(self):
+        raise NotImplementedError
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across processes for read-modify-write of the index file"""
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """(Re)load from disk when another process has rewritten the file"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if self._index is not None and mtime == self._mtime:
+            return self._index
+        if mtime is None:
+            with self._file_lock():
+                return self._read_or_build()
+        return self._read()
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            self._mtime = os.fstat(f.fileno()).st_mtime
+            self._index = BM25Index.from_dict(json.load(f))
+        return self._index
+
+    def _read_or_build(self):
+        """Current file contents, building and writing the index if there is none. Call under _file_lock."""
+        if os.path.exists(self.path):
+            return self._read()
+        self._index = self._build()
+        self._write()
+        return self._index
+
+    def _build(self):
+        index = BM25Index()
+        for doc_id, terms in self.documents():
+            index.upsert(doc_id, terms)
+        return index
+
+    def _write(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self._index.to_dict(), f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    def get(self):
+        with self._lock:
+            return self._load()
+
+    def update(self, upserts=(), removals=()):
+        """
+        Apply (doc id, terms) upserts and doc id removals, then persist.
+        Copy-on-write, so concurrent searches never see a half-updated index.
+        """
+        with self._lock, self._file_lock():
+            # Always re-read under the file lock: another process may have just written
+            index = BM25Index.from_dict(self._read_or_build().to_dict())
+            for doc_id in removals:
+                index.remove(doc_id)
+            for doc_id, terms in upserts:
+                index.upsert(doc_id, terms)
+            self._index = index
+            self._write()
+
+    def rebuild(self):
+        with self._lock, self._file_lock():
+            self._index = self._build()
+            self._write()
+            return len(self._index)
+
+
+class ProductIndex(PersistentIndex):
+    def documents(self):
+        from .models import InternalProduct
+        for product in InternalProduct.objects.only('id', 'name', 'description', 'extracted_text'):
+            yield product.pk, product_terms(product)
+
+    def update_product(self, product):
+        self.update(upserts=[(product.pk, product_terms(product))])
+
+    def remove_product(self, product_id):
+        self.update(removals=[product_id])
+
+
+_product_index = None
+_product_index_lock = threading.Lock()
+
+
+def get_product_index():
+    global _product_index
+    if _product_index is None:
+        with _product_index_lock:
+            if _product_index is None:
+                _product_index = ProductIndex(
+                    getattr(settings, 'PRODUCT_INDEX_PATH', os.path.join(settings.BASE_DIR, 'product_index.json'))
+                )
+    return _product_index
+
+
+def rank_products(query_text, products):
+    """
+    Score the given products against the query text.
+    Uses the persisted catalog index when it covers every product, otherwise
+    (unsaved products, stale index) ranks them with a throwaway index.
+    Returns [(product, score)] in the input order (0.0 when nothing matched).
+    """
+    products = list(products)
+    index = None
+    if products and all(product.pk is not None for product in products):
+        try:
+            index = get_product_index().get()
+        except Exception as e:
+            print(f"Product index unavailable, ranking in memory: {e}")
+        if index is not None and not all(product.pk in index for product in products):
+            index = None
+
+    if index is None:
+        index = BM25Index()
+        for position, product in enumerate(products):
+            index.upsert(position, product_terms(product))
+        positions = {str(position): position for position in range(len(products))}
+    else:
+        positions = {str(product.pk): position for position, product in enumerate(products)}
+
+    scores = [0.0] * len(products)
+    for doc_id, score in index.search(query_text):
+        position = positions.get(doc_id)
+        if position is not None:
+            scores[position] = score
+    return list(zip(products, scores))
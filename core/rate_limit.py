@@ -0,0 +1,238 @@
+"""
+Client-side quota handling for model calls.
+
+Two token buckets, one for requests per minute and one for (estimated) tokens
+per minute, live in a small SQLite file next to the LLM response cache, so
+every worker process on the host draws from the same budget. A call takes a
+request and its estimated prompt tokens from the buckets before going to the
+model, waiting for them to refill if needed; the response's tokens are
+charged afterwards. Calls the API still rejects with ResourceExhausted (or
+ServiceUnavailable) are retried with full-jitter exponential backoff before
+the error reaches the views. Waits, retries and give-ups are counted in the
+same file and reported by get_stats.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+RETRYABLE = (ResourceExhausted, ServiceUnavailable)
+
+
+def estimate_tokens(contents):
+    """Rough token count (~4 characters per token) of a prompt or response"""
+    if isinstance(contents, (list, tuple)):
+        contents = "\n".join(part for part in contents if isinstance(part, str))
+    return max(1, len(contents or "") // 4)
+
+
+class RateLimiter:
+    def __init__(self, path, requests_per_minute=60, tokens_per_minute=1_000_000, max_wait=60.0):
+        self.path = str(path)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._local = threading.local()
+        self._ensure_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value REAL NOT NULL DEFAULT 0
+            );
+        """)
+
+    def _limits(self):
+        """(bucket name, capacity per minute) for every enabled bucket"""
+        return [
+            (name, capacity) for name, capacity in
+            (('requests', self.requests_per_minute), ('tokens', self.tokens_per_minute))
+            if capacity
+        ]
+
+    def _take(self, conn, wanted):
+        """
+        Refill the buckets and take `wanted` {bucket: amount} if all of them
+        have enough. Returns 0 on success, else the seconds until they will.
+        """
+        now = time.time()
+        levels = {}
+        wait = 0.0
+        for name, capacity in self._limits():
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / 60)
+            levels[name] = level
+            # A request bigger than the whole bucket only has to wait for a full one
+            needed = min(wanted.get(name, 0), capacity)
+            if level < needed:
+                wait = max(wait, (needed - level) * 60 / capacity)
+        if wait:
+            return wait
+        for name, level in levels.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, level - wanted.get(name, 0), now)
+            )
+        return 0.0
+
+    def acquire(self, tokens=1):
+        """
+        Block until one request and `tokens` tokens are available. Returns the
+        seconds spent waiting; raises ResourceExhausted past max_wait.
+        """
+        conn = self._connect()
+        wanted = {'requests': 1, 'tokens': tokens}
+        started = time.monotonic()
+        slept = False
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                wait = self._take(conn, wanted)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            waited = time.monotonic() - started if slept else 0.0
+            if not wait:
+                self.count(acquired=1, waits=1 if slept else 0, wait_seconds=waited)
+                self.record_max('max_wait_seconds', waited)
+                return waited
+            if waited + wait > self.max_wait:
+                self.count(rejected=1, wait_seconds=waited)
+                raise ResourceExhausted(f"Client-side rate limit: no capacity within {self.max_wait:.0f}s")
+            # Small jitter so waiting processes don't all retry in the same instant
+            time.sleep(wait + random.uniform(0, 0.05))
+            slept = True
+
+    def charge(self, tokens):
+        """Debit tokens used by a response; the bucket may go negative until it refills"""
+        if not self.tokens_per_minute or tokens <= 0:
+            return
+        conn = self._connect()
+        conn.execute(
+            "UPDATE buckets SET tokens = tokens - ? WHERE name = 'tokens'",
+            (tokens,)
+        )
+
+    def count(self, **amounts):
+        conn = self._connect()
+        for name, amount in amounts.items():
+            conn.execute(
+                """INSERT INTO counters (name, value) VALUES (?, ?)
+                   ON CONFLICT(name) DO UPDATE SET value = value + excluded.value""",
+                (name, amount)
+            )
+
+    def record_max(self, name, value):
+        conn = self._connect()
+        conn.execute(
+            """INSERT INTO counters (name, value) VALUES (?, ?)
+               ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)""",
+            (name, value)
+        )
+
+    def reset(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM buckets")
+        conn.execute("DELETE FROM counters")
+
+    def stats(self):
+        """Configured limits, bucket levels and wait/retry counters for the host"""
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        acquired = int(counters.get('acquired', 0))
+        wait_seconds = counters.get('wait_seconds', 0.0)
+        return {
+            'requests_per_minute': self.requests_per_minute,
+            'tokens_per_minute': self.tokens_per_minute,
+            'buckets': {
+                name: round(level, 1) for name, level in
+                conn.execute("SELECT name, tokens FROM buckets ORDER BY name")
+            },
+            'acquired': acquired,
+            'waits': int(counters.get('waits', 0)),
+            'wait_seconds': round(wait_seconds, 3),
+            'mean_wait_seconds': round(wait_seconds / acquired, 3) if acquired else 0.0,
+            'max_wait_seconds': round(counters.get('max_wait_seconds', 0.0), 3),
+            'rejected': int(counters.get('rejected', 0)),
+            'retries': int(counters.get('retries', 0)),
+            'retry_sleep_seconds': round(counters.get('retry_sleep_seconds', 0.0), 3),
+            'exhausted': int(counters.get('exhausted', 0)),
+        }
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff for the given (0-based) retry"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retry(call, contents, limiter=None, attempts=None):
+    """
+    Run call() under the rate limiter, retrying quota/availability errors with
+    jittered exponential backoff. The last error is re-raised once attempts
+    run out, so the views still answer 429.
+    """
+    if attempts is None:
+        attempts = getattr(settings, 'LLM_RETRY_ATTEMPTS', 4)
+    base = getattr(settings, 'LLM_RETRY_BASE_SECONDS', 1.0)
+    cap = getattr(settings, 'LLM_RETRY_MAX_SECONDS', 30.0)
+    tokens = estimate_tokens(contents)
+    for attempt in range(max(1, attempts)):
+        if limiter is not None:
+            limiter.acquire(tokens)
+        try:
+            return call()
+        except RETRYABLE as e:
+            if attempt + 1 >= attempts:
+                if limiter is not None:
+                    limiter.count(exhausted=1)
+                raise
+            delay = backoff_delay(attempt, base, cap)
+            print(f"LLM call failed ({type(e).__name__}), retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+            if limiter is not None:
+                limiter.count(retries=1, retry_sleep_seconds=delay)
+            time.sleep(delay)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Process-wide limiter, or None when rate limiting is disabled in settings"""
+    global _limiter
+    if not getattr(settings, 'LLM_RATE_LIMIT_ENABLED', True):
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    getattr(settings, 'LLM_RATE_LIMIT_PATH', os.path.join(settings.BASE_DIR, 'llm_rate_limit.sqlite3')),
+                    requests_per_minute=getattr(settings, 'LLM_REQUESTS_PER_MINUTE', 60),
+                    tokens_per_minute=getattr(settings, 'LLM_TOKENS_PER_MINUTE', 1_000_000),
+                    max_wait=getattr(settings, 'LLM_RATE_LIMIT_MAX_WAIT', 60.0),
+                )
+    return _limiter
@@ -0,0 +1,19 @@
+"""
+JsonResponse whose serialization time counts towards the request's 'json'
+Server-Timing phase (see core/metrics.py). Drop-in for django.http.JsonResponse.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse as DjangoJsonResponse
+
+from . import metrics
+
+
+class TimedJSONEncoder(DjangoJSONEncoder):
+    def encode(self, o):
+        with metrics.phase('json'):
+            return super().encode(o)
+
+
+class JsonResponse(DjangoJsonResponse):
+    def __init__(self, data, encoder=TimedJSONEncoder, **kwargs):
+        super().__init__(data, encoder=encoder, **kwargs)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import InternalProduct
+from .product_index import FIELD_WEIGHTS, get_product_index
+from .passages import get_passage_index
+
+
+@receiver(post_save, sender=InternalProduct)
+def index_saved_product(sender, instance, created=False, update_fields=None, **kwargs):
+    """
+    Keep the product search index in step with the catalog. PDF text and
+    passages are filled in later by the ingestion worker (core.ingestion).
+    Saves limited to fields the index doesn't read (ingestion status) leave
+    the index file alone.
+    """
+    if update_fields and not set(update_fields) & {field for field, _weight in FIELD_WEIGHTS}:
+        return
+    try:
+        get_product_index().update_product(instance)
+    except Exception as e:
+        print(f"Error indexing product {instance.name}: {e}")
+
+
+@receiver(pre_delete, sender=InternalProduct)
+def remember_product_passages(sender, instance, **kwargs):
+    # Passages are cascade-deleted with the product; keep their ids for the index
+    instance._passage_ids = list(instance.passages.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=InternalProduct)
+def unindex_deleted_product(sender, instance, **kwargs):
+    try:
+        get_product_index().remove_product(instance.pk)
+        get_passage_index().update(removals=getattr(instance, '_passage_ids', []))
+    except Exception as e:
+        print(f"Error removing product {instance.name} from index: {e}")
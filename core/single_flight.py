@@ -0,0 +1,78 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+The first caller for a key (the leader) runs the function; callers that
+arrive with the same key while it is running wait for it and receive the
+same result, or the same exception, instead of starting a second model call.
+Nothing is kept once the call finishes; repeat requests after that are the
+response cache's job.
+
+ai_handler.generate_text coalesces on the prompt's cache key, and
+get_recommendations on the session, so a double-click or a client retry
+costs one generation. Coalescing is per process; workers on other processes
+are covered by the response cache once the first call completes.
+"""
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._leaders = 0
+        self._coalesced = 0
+
+    def do(self, key, func):
+        """Run func() once per key at a time. Returns (result, shared)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+            else:
+                self._coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self._leaders,
+                'coalesced': self._coalesced,
+            }
+
+
+_flights = SingleFlight()
+
+
+def single_flight(key, func):
+    """Coalesce func() on the process-wide group; returns only the result"""
+    result, _shared = _flights.do(key, func)
+    return result
+
+
+def get_single_flight():
+    return _flights
@@ -1,3 +1,1533 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import PyPDF2
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from google.api_core.exceptions import ResourceExhausted
+from reportlab.pdfgen import canvas
+from reportlab.platypus import ListFlowable, Paragraph, Table
+
+from . import (
+    ai_handler,
+    llm_backends,
+    llm_cache,
+    metrics,
+    passages,
+    pdf_cache,
+    pdf_extraction,
+    pdf_service,
+    product_index,
+    rate_limit,
+)
+from .catalog import DESCRIPTION_CHARS, catalog_page, decode_cursor, encode_cursor
+from .clarifications import VersionConflict, append_turn, load_history
+from .documents import (
+    attach_documents,
+    evict_documents,
+    get_or_extract_document,
+    parse_document_ids,
+    supporting_context,
+)
+from .export import stream_export
+from .ingestion import claim_pending, run_ingestion
+from .jobs import claim_jobs, fail_exhausted
+from .llm_backends import FakeBackend, build_backend
+from .llm_cache import LLMResponseCache
+from .middleware import ProfilerMiddleware
+from .models import (
+    ClarificationTurn,
+    ConceptProject,
+    InternalProduct,
+    Job,
+    ProductPassage,
+    SupportingDocument,
+    UploadedDocument,
+)
+from .passages import PassageIndex, rebuild_product_passages, retrieve_passages, split_passages
+from .pdf_cache import evict_pdfs, get_or_render_pdf, pdf_key
+from .pdf_extraction import extract_pdf_text, extract_pdf_text_parallel
+from .pdf_render import BODY_STYLE, CLIENT_STYLE, HEADING_STYLE, SUBHEADING_STYLE, build_story, render_concept_note
+from .pdf_service import PDFRenderService, RenderQueueFull
+from .product_index import BM25Index, ProductIndex, product_terms, rank_products
+from .rate_limit import RateLimiter, call_with_retry
+from .single_flight import SingleFlight
+
+
+class TempDirMixin:
+    """A scratch directory per test, removed afterwards"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+
+class LLMResponseCacheTests(TempDirMixin, SimpleTestCase):
+    def make_cache(self, **kwargs):
+        return LLMResponseCache(os.path.join(self.tmp, 'cache.sqlite3'), **kwargs)
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.make_cache(ttl_seconds=60)
+        with mock.patch('core.llm_cache.time.time', return_value=1000.0):
+            cache.set('k', 'answer', 'model', 'fn')
+        with mock.patch('core.llm_cache.time.time', return_value=1059.0):
+            self.assertEqual(cache.get('k', 'fn'), 'answer')
+        with mock.patch('core.llm_cache.time.time', return_value=1060.0):
+            self.assertIsNone(cache.get('k', 'fn'))
+        self.assertEqual(cache.stats()['functions']['fn'], {
+            'hits': 1, 'misses': 1, 'hit_ratio': 0.5, 'saved_seconds': 0.0,
+        })
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache(max_entries=2)
+        clock = mock.patch('core.llm_cache.time.time', side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 5.0, 5.0])
+        with clock:
+            cache.set('a', 'A', 'model')
+            cache.set('b', 'B', 'model')
+            cache.get('a')  # a is now more recently used than b
+            cache.set('c', 'C', 'model')
+            self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('A', None, 'C'))
+
+    def test_key_ignores_whitespace_but_not_model(self):
+        key = LLMResponseCache.make_key('m1', 'Hello   world\n')
+        self.assertEqual(key, LLMResponseCache.make_key('m1', ' Hello world'))
+        self.assertNotEqual(key, LLMResponseCache.make_key('m2', 'Hello world'))
+
+
+@override_settings(LLM_RATE_LIMIT_ENABLED=False)
+class GenerateTextCacheTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = LLMResponseCache(os.path.join(self.tmp, 'cache.sqlite3'))
+        self.model = mock.Mock()
+        self.model.generate_content.side_effect = lambda prompt: mock.Mock(text=f"answer {self.model.generate_content.call_count}")
+        for patcher in [mock.patch('core.ai_handler.get_response_cache', return_value=self.cache),
+                        mock.patch('core.ai_handler.model', self.model)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_repeated_prompt_is_served_from_cache(self):
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn'), 'answer 1')
+        self.assertEqual(ai_handler.generate_text(' prompt ', 'fn'), 'answer 1')
+        self.assertEqual(self.model.generate_content.call_count, 1)
+
+    def test_use_cache_false_always_calls_the_model(self):
+        ai_handler.generate_text('prompt', 'fn')
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn', use_cache=False), 'answer 2')
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn'), 'answer 1')
+
+    @override_settings(LLM_CACHE_EXCLUDED_FUNCTIONS=['fn'])
+    def test_excluded_function_is_not_cached(self):
+        ai_handler.generate_text('prompt', 'fn')
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn'), 'answer 2')
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_rejected_responses_are_returned_but_not_cached(self):
+        replies = iter(['not json', '```json\n[{"id": 1}]\n```'])
+        self.model.generate_content.side_effect = lambda prompt: mock.Mock(text=next(replies))
+        validate = ai_handler.is_json_response
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn', validate=validate), 'not json')
+        self.assertEqual(self.cache.stats()['entries'], 0)
+        reply = ai_handler.generate_text('prompt', 'fn', validate=validate)
+        self.assertEqual(ai_handler.parse_json_response(reply), [{'id': 1}])
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn', validate=validate), reply)
+        self.assertEqual(self.model.generate_content.call_count, 2)
+
+    def test_cached_responses_are_validated_too(self):
+        ai_handler.generate_text('prompt', 'fn')
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn', validate=lambda text: text != 'answer 1'), 'answer 2')
+        self.assertEqual(ai_handler.generate_text('prompt', 'fn'), 'answer 2')
+
+    def test_pre_preview_questions_retry_after_unparseable_answer(self):
+        replies = iter(['Sorry, here are some questions', '[{"id": 1, "question": "Budget?"}]'])
+        self.model.generate_content.side_effect = lambda prompt: mock.Mock(text=next(replies))
+        fallback = ai_handler.generate_pre_preview_questions('A CRM for dentists')
+        self.assertEqual(fallback[0]['category'], 'client_identification')
+        self.assertEqual(ai_handler.generate_pre_preview_questions('A CRM for dentists'),
+                         [{'id': 1, 'question': 'Budget?'}])
+
+
+class FakeBackendTests(SimpleTestCase):
+    def test_canned_response_matches_prompt(self):
+        backend = FakeBackend(responses=[('needle', 'canned')])
+        self.assertEqual(backend.generate_content('a needle here').text, 'canned')
+        self.assertTrue(backend.generate_content('no match').text.startswith('FAKE RESPONSE'))
+
+    def test_error_rate_raises_resource_exhausted(self):
+        with self.assertRaises(ResourceExhausted):
+            FakeBackend(error_rate=1.0).generate_content('prompt')
+        self.assertEqual(FakeBackend(error_rate=0.0).generate_content('prompt').text[:4], 'FAKE')
+
+    def test_error_rate_is_reproducible_with_a_seed(self):
+        def outcomes(backend):
+            results = []
+            for _ in range(20):
+                try:
+                    backend.generate_content('prompt')
+                    results.append(True)
+                except ResourceExhausted:
+                    results.append(False)
+            return results
+
+        first = outcomes(FakeBackend(error_rate=0.5, seed=7))
+        self.assertEqual(first, outcomes(FakeBackend(error_rate=0.5, seed=7)))
+        self.assertIn(True, first)
+        self.assertIn(False, first)
+
+    def test_stream_yields_text_in_chunks(self):
+        backend = FakeBackend(responses=[('', 'abcdefghij')], chunk_size=4)
+        chunks = [chunk.text for chunk in backend.generate_content('prompt', stream=True)]
+        self.assertEqual(chunks, ['abcd', 'efgh', 'ij'])
+
+    @override_settings(LLM_BACKEND='fake', LLM_BACKEND_OPTIONS={'chunk_size': 5, 'error_rate': 0.25})
+    def test_build_backend_from_settings(self):
+        backend = build_backend()
+        self.assertIsInstance(backend, FakeBackend)
+        self.assertEqual((backend.chunk_size, backend.error_rate), (5, 0.25))
+
+
+class FakeLLMMixin:
+    """Route every model call to an offline FakeBackend, bypassing the response cache and rate limiter"""
+    backend_options = {}
+
+    def setUp(self):
+        super().setUp()
+        self.backend = llm_backends.FakeBackend(**self.backend_options)
+        for patcher in [mock.patch('core.ai_handler.model', self.backend),
+                        mock.patch.object(llm_backends, '_backend', self.backend)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        llm_settings = override_settings(LLM_CACHE_ENABLED=False, LLM_RATE_LIMIT_ENABLED=False, LLM_RETRY_ATTEMPTS=1)
+        llm_settings.enable()
+        self.addCleanup(llm_settings.disable)
+
+
+def read_sse(response):
+    """(event, payload) pairs from a Server-Sent Events response"""
+    body = b''.join(response.streaming_content).decode()
+    events = []
+    for frame in body.split('\n\n'):
+        if not frame:
+            continue
+        event = None
+        for line in frame.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                events.append((event, json.loads(line[len('data: '):])))
+    return events
+
+
+class PreviewStreamTests(FakeLLMMixin, TestCase):
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json')
+
+    def test_preview_streams_deltas_then_done(self):
+        response = self.post('/api/generate-preview-stream/', {'raw_input': 'A CRM for dentists'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = read_sse(response)
+        self.assertEqual(events[0][0], 'start')
+        session_id = events[0][1]['session_id']
+        deltas = [payload['delta'] for event, payload in events[1:-1]]
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual({event for event, _payload in events[1:-1]}, {None})
+        self.assertEqual(events[-1], ('done', {'session_id': session_id, 'preview': ''.join(deltas).strip()}))
+        self.assertEqual(ConceptProject.objects.get(session_id=session_id).formatted_preview, ''.join(deltas).strip())
+
+    def test_quota_error_is_an_error_event(self):
+        self.backend.error_rate = 1.0
+        events = read_sse(self.post('/api/generate-preview-stream/', {'raw_input': 'A CRM for dentists'}))
+        self.assertEqual([event for event, _payload in events], ['start', 'error'])
+        self.assertEqual(events[-1][1]['status'], 429)
+        self.assertFalse(ConceptProject.objects.exists())
+
+    def test_final_note_streams_meta_deltas_then_done(self):
+        ConceptProject.objects.create(session_id='note-1', raw_input='A CRM for dentists',
+                                      formatted_preview='Preview text')
+        with mock.patch('core.views.prerender_pdf') as prerender:
+            events = read_sse(self.post('/api/generate-final-note-stream/', {'session_id': 'note-1'}))
+        names = [event for event, _payload in events]
+        self.assertEqual(names[:2], ['start', 'meta'])
+        self.assertEqual(names[-1], 'done')
+        note = ''.join(payload['delta'] for event, payload in events if event is None).strip()
+        done = events[-1][1]
+        self.assertEqual(done['concept_note'], note)
+        self.assertEqual(done['client_name'], events[1][1]['client_name'])
+        self.assertEqual(ConceptProject.objects.get(session_id='note-1').final_concept_note, note)
+        prerender.assert_called_once_with(note, done['client_name'])
+
+    def test_final_note_for_unknown_session_is_404(self):
+        self.assertEqual(self.post('/api/generate-final-note-stream/', {'session_id': 'missing'}).status_code, 404)
+
+
+class AsyncViewTests(FakeLLMMixin, TestCase):
+    async def apost(self, url, data):
+        client = AsyncClient(enforce_csrf_checks=True)
+        return await client.post(url, data, content_type='application/json')
+
+    async def test_initiate_project_stores_questions(self):
+        response = await self.apost('/api/async/initiate-project/', {'raw_input': 'A CRM for dentists'})
+        self.assertEqual(response.status_code, 200)
+        body = json.loads(response.content)
+        project = await ConceptProject.objects.aget(session_id=body['session_id'])
+        self.assertEqual(len(body['questions']), 3)
+        self.assertEqual(project.pre_preview_questions, body['questions'])
+
+    async def test_generate_preview_saves_preview(self):
+        await ConceptProject.objects.acreate(session_id='async-1', raw_input='A CRM for dentists')
+        response = await self.apost('/api/async/generate-preview/', {'session_id': 'async-1'})
+        self.assertEqual(response.status_code, 200)
+        preview = json.loads(response.content)['preview']
+        self.assertTrue(preview.startswith('FAKE RESPONSE'))
+        self.assertEqual((await ConceptProject.objects.aget(session_id='async-1')).formatted_preview, preview)
+
+    async def test_generate_preview_maps_quota_errors_to_429(self):
+        self.backend.error_rate = 1.0
+        response = await self.apost('/api/async/generate-preview/', {'raw_input': 'A CRM for dentists'})
+        self.assertEqual(response.status_code, 429)
+
+    async def test_unknown_session_is_404(self):
+        response = await self.apost('/api/async/generate-final-note/', {'session_id': 'missing'})
+        self.assertEqual(response.status_code, 404)
+
+
+class GenerateRecommendationsTests(SimpleTestCase):
+    def patch_branches(self, internal, external):
+        for name, func in [('find_internal_matches', internal), ('search_external_solutions', external)]:
+            patcher = mock.patch(f'core.ai_handler.{name}', side_effect=func)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_branches_run_concurrently(self):
+        def slow(result):
+            def branch(*args):
+                time.sleep(0.2)
+                return result
+            return branch
+
+        self.patch_branches(slow('internal'), slow('external'))
+        started = time.monotonic()
+        self.assertEqual(ai_handler.generate_recommendations('preview', 'clarifications', []),
+                         ('internal', 'external'))
+        self.assertLess(time.monotonic() - started, 0.35)
+
+    def test_slow_branch_falls_back_alone(self):
+        self.patch_branches(lambda *args: 'internal', lambda *args: time.sleep(0.5))
+        internal, external = ai_handler.generate_recommendations('preview', 'clarifications', [], timeout=0.1)
+        self.assertEqual((internal, external), ('internal', ai_handler.EXTERNAL_RECOMMENDATIONS_FALLBACK))
+
+    def test_failed_branch_falls_back_alone(self):
+        def fail(*args):
+            raise RuntimeError('boom')
+
+        self.patch_branches(fail, lambda *args: 'external')
+        self.assertEqual(ai_handler.generate_recommendations('preview', 'clarifications', []),
+                         (ai_handler.INTERNAL_RECOMMENDATIONS_FALLBACK, 'external'))
+
+
+class RecommendationsViewTests(TestCase):
+    def post(self):
+        response = self.client.post('/api/get-recommendations/', {'session_id': 'recs-1'},
+                                    content_type='application/json')
+        return response.json()
+
+    def test_fallback_is_not_served_from_the_project(self):
+        ConceptProject.objects.create(session_id='recs-1', formatted_preview='A CRM for dentists')
+        results = [('internal', ai_handler.EXTERNAL_RECOMMENDATIONS_FALLBACK), ('internal 2', 'external')]
+        with mock.patch('core.views.generate_recommendations', side_effect=results) as generate:
+            first = self.post()
+            second = self.post()
+            third = self.post()
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual((first['external'], first['cached']),
+                         (ai_handler.EXTERNAL_RECOMMENDATIONS_FALLBACK, False))
+        self.assertEqual((second['internal'], second['external'], second['cached']), ('internal 2', 'external', False))
+        self.assertTrue(third['cached'])
+
+
+class BM25IndexTests(SimpleTestCase):
+    def test_ranks_more_relevant_documents_first(self):
+        index = BM25Index()
+        index.upsert(1, {'crm': 1, 'dental': 1})
+        index.upsert(2, {'crm': 3, 'dental': 2, 'scheduling': 1})
+        index.upsert(3, {'payroll': 2})
+        self.assertEqual([doc_id for doc_id, _score in index.search('dental crm')], ['2', '1'])
+        self.assertEqual(index.search('payroll', limit=1)[0][0], '3')
+        self.assertEqual(index.search('unknown words'), [])
+
+    def test_remove_and_round_trip(self):
+        index = BM25Index()
+        index.upsert(1, {'crm': 1})
+        index.upsert(2, {'crm': 1, 'payroll': 1})
+        index.remove(1)
+        self.assertNotIn(1, index)
+        self.assertEqual([doc_id for doc_id, _score in index.search('crm')], ['2'])
+        copy = BM25Index.from_dict(json.loads(json.dumps(index.to_dict())))
+        self.assertEqual(copy.search('crm payroll'), index.search('crm payroll'))
+
+    def test_product_terms_weight_fields(self):
+        product = InternalProduct(name='Dental CRM', description='CRM for clinics', extracted_text='clinics')
+        self.assertEqual(product_terms(product), {'dental': 3, 'crm': 5, 'clinics': 3})
+
+
+class ProductIndexMixin(TempDirMixin):
+    """Point the catalog and passage indexes at scratch files"""
+
+    def setUp(self):
+        super().setUp()
+        self.index = ProductIndex(os.path.join(self.tmp, 'products.json'))
+        self.passage_index = PassageIndex(os.path.join(self.tmp, 'passages.json'))
+        for patcher in [mock.patch.object(product_index, '_product_index', self.index),
+                        mock.patch.object(passages, '_passage_index', self.passage_index)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class ProductIndexTests(ProductIndexMixin, TestCase):
+    def test_saves_and_deletes_update_the_index(self):
+        crm = InternalProduct.objects.create(name='Dental CRM', description='Patient records')
+        payroll = InternalProduct.objects.create(name='Payroll', description='Salaries')
+        self.assertEqual(self.index.get().search('dental patient')[0][0], str(crm.pk))
+        payroll.description = 'Salaries for dental clinics'
+        payroll.save()
+        self.assertIn(str(payroll.pk), dict(self.index.get().search('dental')))
+        crm.delete()
+        self.assertNotIn(crm.pk, self.index.get())
+
+    def test_saves_of_unindexed_fields_leave_the_index_alone(self):
+        product = InternalProduct.objects.create(name='Dental CRM')
+        with mock.patch.object(self.index, 'update', wraps=self.index.update) as update:
+            product.ingestion_status = InternalProduct.INGESTION_FAILED
+            product.save(update_fields=['ingestion_status'])
+            update.assert_not_called()
+            product.description = 'Patient records'
+            product.save(update_fields=['description'])
+            update.assert_called_once()
+
+    def test_changes_are_persisted_for_other_processes(self):
+        crm = InternalProduct.objects.create(name='Dental CRM')
+        other = ProductIndex(self.index.path)
+        self.assertIn(crm.pk, other.get())
+        self.index.remove_product(crm.pk)
+        self.assertNotIn(crm.pk, other.get())
+
+    def test_missing_file_is_rebuilt_from_the_catalog(self):
+        InternalProduct.objects.bulk_create([InternalProduct(name='Dental CRM'), InternalProduct(name='Payroll')])
+        self.assertEqual(len(self.index.get()), 2)
+        self.assertTrue(os.path.exists(self.index.path))
+
+    def test_rank_products_orders_by_relevance(self):
+        crm = InternalProduct.objects.create(name='Dental CRM', description='Patient records')
+        payroll = InternalProduct.objects.create(name='Payroll', description='Salaries')
+        ranked = dict(rank_products('dental patient records', [payroll, crm]))
+        self.assertGreater(ranked[crm], 0)
+        self.assertEqual(ranked[payroll], 0.0)
+        # Unsaved products are ranked with a throwaway index
+        unsaved = InternalProduct(name='Dental imaging')
+        self.assertGreater(rank_products('dental', [unsaved])[0][1], 0)
+
+
+class SplitPassagesTests(SimpleTestCase):
+    def test_headings_close_passages_and_carry_across_pages(self):
+        pages = [
+            (1, "Intro line\nKEY FEATURES:\nScheduling\nReminders"),
+            (2, "Billing\n2.1 SYSTEM ARCHITECTURE\nCloud hosted"),
+        ]
+        self.assertEqual(split_passages(pages), [
+            {'page_number': 1, 'heading': '', 'text': 'Intro line'},
+            {'page_number': 1, 'heading': 'KEY FEATURES:', 'text': 'Scheduling\nReminders'},
+            {'page_number': 2, 'heading': 'KEY FEATURES:', 'text': 'Billing'},
+            {'page_number': 2, 'heading': '2.1 SYSTEM ARCHITECTURE', 'text': 'Cloud hosted'},
+        ])
+
+    def test_long_text_splits_at_line_boundaries(self):
+        lines = [f"line {n} " + 'x' * 40 for n in range(10)]
+        passages = split_passages([(1, "\n".join(lines))], max_chars=150)
+        self.assertTrue(all(len(passage['text']) <= 150 for passage in passages))
+        self.assertEqual("\n".join(passage['text'] for passage in passages), "\n".join(lines))
+
+
+class RetrievePassagesTests(ProductIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.crm = InternalProduct.objects.create(name='Dental CRM')
+        self.payroll = InternalProduct.objects.create(name='Payroll')
+        rebuild_product_passages(self.crm, pages=[
+            (1, f"SECTION {n}\nPatient scheduling reminders number {n}") for n in range(5)
+        ])
+        rebuild_product_passages(self.payroll, pages=[(1, "Salary runs\nPAYSLIPS\nScheduling of payslips")])
+
+    def test_top_k_is_capped_per_product(self):
+        retrieval = retrieve_passages('patient scheduling', k=3, max_per_product=2)
+        products = [passage.product_id for passage, _score in retrieval.passages]
+        self.assertEqual(products.count(self.crm.pk), 2)
+        self.assertEqual(len(retrieval), 3)
+        self.assertIn(self.payroll.pk, products)
+
+    def test_product_filter(self):
+        retrieval = retrieve_passages('scheduling', product_ids=[self.payroll.pk], k=5)
+        self.assertEqual({passage.product_id for passage, _score in retrieval.passages}, {self.payroll.pk})
+        self.assertIn('=== Payroll (p.1 - PAYSLIPS) ===', retrieval.prompt_context())
+
+    def test_deleted_product_leaves_the_passage_index(self):
+        passage_ids = list(self.payroll.passages.values_list('id', flat=True))
+        self.payroll.delete()
+        self.assertFalse(ProductPassage.objects.filter(id__in=passage_ids).exists())
+        self.assertTrue(all(passage_id not in self.passage_index.get() for passage_id in passage_ids))
+        self.assertEqual(retrieve_passages('payslips').passages, [])
+
+
+def make_pdf(pages):
+    """PDF bytes with one page per string in `pages` (one line of text per line)"""
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for text in pages:
+        for n, line in enumerate(text.splitlines()):
+            pdf.drawString(72, 800 - 14 * n, line)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class IngestionTests(ProductIndexMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        media = override_settings(MEDIA_ROOT=self.tmp)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def product(self, name, pdf_pages=None):
+        product = InternalProduct(name=name)
+        if pdf_pages is not None:
+            product.pdf_file.save(f"{name}.pdf", ContentFile(make_pdf(pdf_pages)), save=False)
+        product.save()
+        return product
+
+    def test_claims_pending_products_once(self):
+        first = self.product('First')
+        second = self.product('Second')
+        self.assertEqual([product.pk for product in claim_pending()], [first.pk, second.pk])
+        self.assertEqual(claim_pending(), [])
+        self.assertEqual(InternalProduct.objects.get(pk=first.pk).ingestion_status,
+                         InternalProduct.INGESTION_PROCESSING)
+
+    def test_stale_processing_products_are_reclaimed(self):
+        product = self.product('Stale')
+        InternalProduct.objects.filter(pk=product.pk).update(
+            ingestion_status=InternalProduct.INGESTION_PROCESSING,
+            ingestion_started_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(claim_pending(stale_after=timedelta(hours=2)), [])
+        self.assertEqual([claimed.pk for claimed in claim_pending(stale_after=timedelta(minutes=30))], [product.pk])
+
+    def test_run_ingestion_stores_text_and_passages(self):
+        product = self.product('Dental CRM', ["FEATURES\nPatient scheduling", "Billing exports"])
+        self.assertEqual(product.ingestion_status, InternalProduct.INGESTION_PENDING)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(run_ingestion(executor, log=lambda message: None), 1)
+        product.refresh_from_db()
+        self.assertEqual(product.ingestion_status, InternalProduct.INGESTION_DONE)
+        self.assertIn('Billing exports', product.extracted_text)
+        self.assertEqual(list(product.passages.values_list('page_number', 'heading')),
+                         [(1, 'FEATURES'), (2, 'FEATURES')])
+        self.assertIn(str(product.pk), dict(self.index.get().search('billing')))
+
+    @override_settings(PDF_PARALLEL_MIN_PAGES=4, PDF_PAGES_PER_TASK=2)
+    def test_long_pdfs_are_split_into_page_ranges(self):
+        product = self.product('Brochure', [f"Page {n}" for n in range(1, 6)])
+        with ThreadPoolExecutor(max_workers=3) as executor, \
+                mock.patch.object(executor, 'submit', wraps=executor.submit) as submit:
+            run_ingestion(executor, log=lambda message: None)
+        self.assertEqual([call.args[2:] for call in submit.call_args_list], [(0, 2), (2, 4), (4, 5)])
+        product.refresh_from_db()
+        self.assertEqual(product.extracted_text.split()[1::2], ['1', '2', '3', '4', '5'])
+        self.assertEqual(list(product.passages.values_list('page_number', flat=True)), [1, 2, 3, 4, 5])
+
+    def test_ingestion_indexes_each_product_once(self):
+        self.product('Dental CRM', ["Patient scheduling"])
+        self.product('Broken')
+        InternalProduct.objects.filter(name='Broken').update(pdf_file='missing.pdf')
+        with ThreadPoolExecutor(max_workers=2) as executor, \
+                mock.patch.object(self.index, 'update', wraps=self.index.update) as update:
+            run_ingestion(executor, log=lambda message: None)
+        self.assertEqual(update.call_count, 1)
+        self.assertEqual(InternalProduct.objects.get(name='Broken').ingestion_status,
+                         InternalProduct.INGESTION_FAILED)
+
+    def test_unreadable_pdf_is_marked_failed(self):
+        product = InternalProduct(name='Broken')
+        product.pdf_file.save('broken.pdf', ContentFile(b'not a pdf'), save=False)
+        product.save()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            run_ingestion(executor, log=lambda message: None)
+        product.refresh_from_db()
+        self.assertEqual(product.ingestion_status, InternalProduct.INGESTION_FAILED)
+        self.assertTrue(product.ingestion_error)
+
+    def test_new_pdf_requeues_ingestion(self):
+        product = self.product('Dental CRM', ["Page one"])
+        InternalProduct.objects.filter(pk=product.pk).update(ingestion_status=InternalProduct.INGESTION_DONE)
+        product.refresh_from_db()
+        product.description = 'Edited'
+        product.save()
+        self.assertEqual(product.ingestion_status, InternalProduct.INGESTION_DONE)
+        product.pdf_file.save('v2.pdf', ContentFile(make_pdf(["Page two"])))
+        self.assertEqual(InternalProduct.objects.get(pk=product.pk).ingestion_status,
+                         InternalProduct.INGESTION_PENDING)
+
+
+class ExtractPDFTextTests(TestCase):
+    pages = [f"Page {n} " + 'x' * 90 for n in range(1, 6)]
+
+    def extract(self, **budget):
+        return extract_pdf_text(io.BytesIO(make_pdf(self.pages)), **budget)
+
+    def test_without_budget_reads_everything(self):
+        extraction = self.extract()
+        self.assertEqual(extraction.as_dict(), {'page_count': 5, 'pages_read': 5, 'truncated': False})
+        self.assertIn('Page 5', extraction.text)
+
+    def test_stops_at_the_character_budget(self):
+        real_extract = PyPDF2.PageObject.extract_text
+        with mock.patch.object(PyPDF2.PageObject, 'extract_text', autospec=True,
+                               side_effect=real_extract) as parsed:
+            extraction = self.extract(max_chars=150)
+        self.assertEqual(extraction.as_dict(), {'page_count': 5, 'pages_read': 2, 'truncated': True})
+        self.assertEqual(parsed.call_count, 2)
+        self.assertEqual(len(extraction.text), 150)
+        self.assertTrue(extraction.text.startswith('Page 1'))
+
+    def test_stops_at_the_page_budget(self):
+        extraction = self.extract(max_pages=3)
+        self.assertEqual(extraction.as_dict(), {'page_count': 5, 'pages_read': 3, 'truncated': True})
+        self.assertIn('Page 3', extraction.text)
+        self.assertNotIn('Page 4', extraction.text)
+
+    @override_settings(PDF_TEXT_MAX_CHARS=150)
+    def test_upload_reports_truncation(self):
+        upload = SimpleUploadedFile('rfp.pdf', make_pdf(self.pages), content_type='application/pdf')
+        body = self.client.post('/api/upload-file/', {'file': upload}).json()
+        self.assertEqual((body['pages_read'], body['truncated']), (2, True))
+        self.assertEqual(body['char_count'], 150)
+
+
+class ParallelExtractionTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp, 'large.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(make_pdf([f"Page {n}" for n in range(1, 12)]))
+
+    def test_page_order_survives_out_of_order_completion(self):
+        real_extract = pdf_extraction._extract_page_range
+
+        def later_ranges_finish_first(path, start, stop):
+            time.sleep(0.05 * (11 - start) / 11)
+            return real_extract(path, start, stop)
+
+        with mock.patch.object(pdf_extraction, '_extract_page_range', side_effect=later_ranges_finish_first), \
+                ThreadPoolExecutor(max_workers=4) as executor:
+            extraction = extract_pdf_text_parallel(self.path, pages_per_task=2, executor=executor)
+        with open(self.path, 'rb') as pdf_file:
+            self.assertEqual(extraction.text, extract_pdf_text(pdf_file).text)
+        self.assertEqual(extraction.as_dict(), {'page_count': 11, 'pages_read': 11, 'truncated': False})
+
+    def test_character_budget_stops_submitting_ranges(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            extraction = extract_pdf_text_parallel(self.path, max_chars=10, pages_per_task=2, executor=executor)
+        self.assertEqual(len(extraction.text), 10)
+        self.assertTrue(extraction.text.startswith('Page 1'))
+        self.assertEqual((extraction.pages_read, extraction.truncated), (2, True))
+
+    @override_settings(PDF_PARALLEL_MIN_PAGES=20)
+    def test_short_documents_are_parsed_in_process(self):
+        with mock.patch.object(pdf_extraction, 'get_extraction_pool') as pool:
+            with open(self.path, 'rb') as pdf_file:
+                extraction = extract_pdf_text_parallel(pdf_file)
+        pool.assert_not_called()
+        self.assertEqual(extraction.pages_read, 11)
+
+
+class DocumentCacheTests(TestCase):
+    pdf = make_pdf([f"Page {n} " + 'x' * 90 for n in range(1, 6)])
+
+    def upload(self, content=None):
+        return SimpleUploadedFile('rfp.pdf', content or self.pdf, content_type='application/pdf')
+
+    def test_same_bytes_are_extracted_once(self):
+        with mock.patch('core.documents.extract_pdf_text', side_effect=extract_pdf_text) as extract:
+            first, first_cached = get_or_extract_document(self.upload(), max_chars=150)
+            second, second_cached = get_or_extract_document(self.upload(), max_chars=100)
+        self.assertEqual((first_cached, second_cached), (False, True))
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(first.sha256, hashlib.sha256(self.pdf).hexdigest())
+        self.assertEqual(extract.call_count, 1)
+
+    def test_larger_budget_than_cached_is_re_extracted(self):
+        get_or_extract_document(self.upload(), max_chars=150)
+        document, cached = get_or_extract_document(self.upload(), max_chars=None)
+        self.assertFalse(cached)
+        self.assertFalse(document.truncated)
+        self.assertEqual(UploadedDocument.objects.count(), 1)
+
+    def test_upload_handler_hash_is_reused(self):
+        first = self.client.post('/api/upload-file/', {'file': self.upload()}).json()
+        second = self.client.post('/api/upload-file/', {'file': self.upload()}).json()
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(UploadedDocument.objects.get().sha256, hashlib.sha256(self.pdf).hexdigest())
+
+    def test_evicts_stale_then_least_recently_used(self):
+        now = timezone.now()
+        for n, (age_days, chars) in enumerate([(40, 10), (3, 50), (2, 50), (1, 50)]):
+            UploadedDocument.objects.create(sha256=f"{n:064d}", char_count=chars)
+            UploadedDocument.objects.filter(sha256=f"{n:064d}").update(last_used_at=now - timedelta(days=age_days))
+        self.assertEqual(evict_documents(max_chars=100, max_age=timedelta(days=30)), 2)
+        self.assertEqual(sorted(UploadedDocument.objects.values_list('sha256', flat=True)),
+                         [f"{2:064d}", f"{3:064d}"])
+
+
+class DocumentHandleTests(FakeLLMMixin, TestCase):
+    def upload(self, pages):
+        upload = SimpleUploadedFile('rfp.pdf', make_pdf(pages), content_type='application/pdf')
+        return self.client.post('/api/upload-file/', {'file': upload}).json()['document_id']
+
+    def initiate(self, **data):
+        return self.client.post('/api/initiate-project/', {'raw_input': 'A CRM for dentists', **data},
+                                content_type='application/json')
+
+    def test_parse_document_ids(self):
+        self.assertEqual(parse_document_ids({'document_id': 'b', 'document_ids': ['a', 'b', '', 'c']}),
+                         ['b', 'a', 'c'])
+        self.assertEqual(parse_document_ids({'document_ids': 'a'}), ['a'])
+        self.assertEqual(parse_document_ids({}), [])
+
+    def test_initiate_project_reads_documents_by_id(self):
+        first = self.upload(["Scope of work"])
+        second = self.upload(["Budget annex"])
+        response = self.initiate(document_ids=[first, second])
+        self.assertEqual(response.status_code, 200)
+        text = supporting_context(ConceptProject.objects.get(session_id=response.json()['session_id']), 10000)
+        self.assertTrue(text.startswith('Scope of work'))
+        self.assertIn('--- Additional Document: rfp.pdf ---\nBudget annex', text)
+
+    def test_unknown_document_id_is_404(self):
+        response = self.initiate(document_ids=['0' * 64])
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(ConceptProject.objects.exists())
+
+
+class SupportingDocumentTests(TestCase):
+    def setUp(self):
+        self.project = ConceptProject.objects.create(session_id='docs-1')
+
+    def test_supporting_context_reads_only_the_budgeted_prefix(self):
+        attach_documents(self.project, [], pdf_text='a' * 30)
+        SupportingDocument.objects.create(project=self.project, filename='annex.pdf', text='b' * 30, char_count=30)
+        SupportingDocument.objects.create(project=self.project, filename='late.pdf', text='c' * 30, char_count=30)
+        self.assertEqual(supporting_context(self.project, 20), 'a' * 20)
+        context = supporting_context(self.project, 80)
+        self.assertEqual(len(context), 80)
+        self.assertTrue(context.startswith('a' * 30 + '\n\n--- Additional Document: annex.pdf ---\nbbb'))
+        self.assertNotIn('late.pdf', context)
+
+    def test_upload_appends_a_row_without_rewriting_the_project(self):
+        updated_at = self.project.updated_at
+        for name in ['first.pdf', 'second.pdf']:
+            upload = SimpleUploadedFile(name, make_pdf([f"Text of {name}"]), content_type='application/pdf')
+            response = self.client.post('/api/upload-supporting-document/', {'session_id': 'docs-1', 'file': upload})
+            self.assertEqual(response.status_code, 200)
+        stats = response.json()['documents']
+        self.assertEqual([document['filename'] for document in stats['documents']], ['first.pdf', 'second.pdf'])
+        self.assertEqual((stats['count'], stats['total_chars']),
+                         (2, sum(document.char_count for document in self.project.documents.all())))
+        self.assertEqual(ConceptProject.objects.get(pk=self.project.pk).updated_at, updated_at)
+
+    def test_upload_for_unknown_session_is_404(self):
+        upload = SimpleUploadedFile('rfp.pdf', make_pdf(['x']), content_type='application/pdf')
+        response = self.client.post('/api/upload-supporting-document/', {'session_id': 'missing', 'file': upload})
+        self.assertEqual(response.status_code, 404)
+
+
+class AppendTurnTests(TestCase):
+    def setUp(self):
+        self.project = ConceptProject.objects.create(session_id='clarify-1')
+
+    def test_turns_are_appended_in_order(self):
+        for n in range(3):
+            turn, version = append_turn(self.project.pk, f"Q{n}", f"A{n}")
+            self.assertEqual(turn.ordinal, n)
+            self.assertEqual(version, n + 1)
+        self.assertEqual(load_history(self.project), [
+            {'question': 'Q0', 'answer': 'A0'},
+            {'question': 'Q1', 'answer': 'A1'},
+            {'question': 'Q2', 'answer': 'A2'},
+        ])
+
+    def test_matching_version_is_accepted(self):
+        _turn, version = append_turn(self.project.pk, 'Q0', 'A0', expected_version=0)
+        turn, version = append_turn(self.project.pk, 'Q1', 'A1', expected_version=version)
+        self.assertEqual((turn.ordinal, version), (1, 2))
+
+    def test_stale_version_raises_conflict(self):
+        append_turn(self.project.pk, 'Q0', 'A0')
+        with self.assertRaises(VersionConflict) as raised:
+            append_turn(self.project.pk, 'Q1', 'A1', expected_version=0)
+        self.assertEqual(raised.exception.current_version, 1)
+        # The rejected answer is not stored and the version is untouched
+        self.assertEqual(ClarificationTurn.objects.filter(project=self.project).count(), 1)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.version, 1)
+
+    def test_returned_version_is_read_inside_the_transaction(self):
+        real_atomic = transaction.atomic
+
+        @contextmanager
+        def atomic_then_rival_commit():
+            with real_atomic():
+                yield
+            # Another writer commits between our commit and any later read
+            ConceptProject.objects.filter(pk=self.project.pk).update(version=F('version') + 1)
+
+        with mock.patch('core.clarifications.transaction.atomic', atomic_then_rival_commit):
+            _turn, version = append_turn(self.project.pk, 'Q0', 'A0')
+        self.assertEqual(version, 1)
+        self.assertEqual(ConceptProject.objects.get(pk=self.project.pk).version, 2)
+
+    def test_stale_save_does_not_roll_back_version(self):
+        stale = ConceptProject.objects.get(pk=self.project.pk)
+        append_turn(self.project.pk, 'Q0', 'A0')
+        stale.client_name = 'Acme'
+        stale.save()
+        self.assertEqual(ConceptProject.objects.get(pk=self.project.pk).version, 1)
+
+
+class SaveClarificationViewTests(TestCase):
+    def setUp(self):
+        self.project = ConceptProject.objects.create(session_id='clarify-2')
+
+    def post(self, **data):
+        return self.client.post(
+            '/api/save-clarification/', {'session_id': 'clarify-2', **data}, content_type='application/json'
+        )
+
+    def test_saves_and_returns_version(self):
+        response = self.post(question='Q0', answer='A0', version=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'saved', 'turn': 0, 'version': 1})
+
+    def test_conflict_returns_409_with_current_version(self):
+        self.post(question='Q0', answer='A0')
+        response = self.post(question='Q1', answer='A1', version=0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(len(load_history(self.project)), 1)
+
+    def test_unknown_session_returns_404(self):
+        response = self.client.post(
+            '/api/save-clarification/', {'session_id': 'missing', 'question': 'Q', 'answer': 'A'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class ClarificationTurnMigrationTests(TransactionTestCase):
+    before = [('core', '0010_supportingdocument')]
+    after = [('core', '0011_clarificationturn')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        self.migrate(executor.loader.graph.leaf_nodes('core'))
+
+    def test_conversation_history_becomes_turns(self):
+        apps = self.migrate(self.before)
+        OldProject = apps.get_model('core', 'ConceptProject')
+        with_history = OldProject.objects.create(session_id='migrate-1', conversation_history=[
+            {'question': 'Q0', 'answer': 'A0'},
+            'not a turn',
+            {'question': 'Q1', 'answer': None},
+        ])
+        empty = OldProject.objects.create(session_id='migrate-2', conversation_history=[])
+
+        apps = self.migrate(self.after)
+        Project = apps.get_model('core', 'ConceptProject')
+        Turn = apps.get_model('core', 'ClarificationTurn')
+        turns = list(
+            Turn.objects.filter(project_id=with_history.pk).order_by('ordinal').values_list('ordinal', 'question', 'answer')
+        )
+        self.assertEqual(turns, [(0, 'Q0', 'A0'), (1, 'Q1', '')])
+        self.assertEqual(Project.objects.get(pk=with_history.pk).version, 2)
+        self.assertFalse(Turn.objects.filter(project_id=empty.pk).exists())
+        self.assertEqual(Project.objects.get(pk=empty.pk).version, 0)
+
+    def test_reverse_restores_conversation_history(self):
+        apps = self.migrate(self.after)
+        Project = apps.get_model('core', 'ConceptProject')
+        Turn = apps.get_model('core', 'ClarificationTurn')
+        project = Project.objects.create(session_id='migrate-3')
+        Turn.objects.create(project=project, ordinal=1, question='Q1', answer='A1')
+        Turn.objects.create(project=project, ordinal=0, question='Q0', answer='A0')
+
+        apps = self.migrate(self.before)
+        OldProject = apps.get_model('core', 'ConceptProject')
+        self.assertEqual(OldProject.objects.get(pk=project.pk).conversation_history, [
+            {'question': 'Q0', 'answer': 'A0'},
+            {'question': 'Q1', 'answer': 'A1'},
+        ])
+
+
+class CursorTests(TestCase):
+    def test_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor('Ümlaut / product', 42)), ('Ümlaut / product', 42))
+
+    def test_malformed_cursors_raise_value_error(self):
+        for cursor in ['not base64!', encode_cursor('a', 1)[:-3], 'WzEsMl0', 'eyJhIjogMX0', 'WyJhIiwgIjEiXQ']:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class CatalogPageTests(TestCase):
+    def setUp(self):
+        # bulk_create skips the post_save signal that updates the search index
+        InternalProduct.objects.bulk_create(
+            [InternalProduct(name=name, description=f"{name} " + 'x' * 200)
+             for name in ['Delta', 'Alpha', 'Charlie', 'Bravo', 'Bravo', 'Echo']]
+        )
+
+    def test_pages_walk_the_catalog_once_in_order(self):
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = catalog_page(cursor, limit=2)
+            self.assertLessEqual(len(page), 2)
+            seen.extend(page)
+            if cursor is None:
+                break
+        expected = list(InternalProduct.objects.order_by('name', 'id').values_list('id', 'name'))
+        self.assertEqual([(product['id'], product['name']) for product in seen], expected)
+
+    def test_last_page_has_no_cursor(self):
+        page, cursor = catalog_page(limit=6)
+        self.assertEqual(len(page), 6)
+        self.assertIsNone(cursor)
+
+    def test_descriptions_are_truncated(self):
+        page, _cursor = catalog_page(limit=1)
+        self.assertEqual(len(page[0]['description']), DESCRIPTION_CHARS)
+        self.assertTrue(page[0]['description'].startswith('Alpha '))
+
+    def test_view_rejects_bad_cursor(self):
+        response = self.client.get('/api/get-products/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_view_answers_304_until_the_catalog_changes(self):
+        response = self.client.get('/api/get-products/', {'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/get-products/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        InternalProduct.objects.bulk_create([InternalProduct(name='Foxtrot')])
+        self.assertEqual(self.client.get('/api/get-products/', {'limit': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class PDFCacheMixin(TempDirMixin):
+    def setUp(self):
+        super().setUp()
+        pdf_settings = override_settings(PDF_CACHE_DIR=self.tmp)
+        pdf_settings.enable()
+        self.addCleanup(pdf_settings.disable)
+
+
+class PDFCacheTests(PDFCacheMixin, TestCase):
+    def test_renders_once_then_serves_from_disk(self):
+        with mock.patch('core.pdf_cache.get_render_service') as service:
+            service.return_value.render.return_value = b'%PDF-1.4 note'
+            path, key, cached = get_or_render_pdf('Note text', 'Acme')
+            self.assertEqual(get_or_render_pdf('Note text', 'Acme'), (path, key, True))
+        self.assertFalse(cached)
+        self.assertEqual(service.return_value.render.call_count, 1)
+        self.assertEqual(key, pdf_key('Note text', 'Acme'))
+        self.assertNotEqual(key, pdf_key('Note text', 'Other'))
+        with open(path, 'rb') as pdf_file:
+            self.assertEqual(pdf_file.read(), b'%PDF-1.4 note')
+
+    def test_concurrent_requests_render_once(self):
+        def slow_render(text, client_name=None):
+            time.sleep(0.1)
+            return b'%PDF-1.4'
+
+        with mock.patch('core.pdf_cache.get_render_service') as service, \
+                ThreadPoolExecutor(max_workers=4) as executor:
+            service.return_value.render.side_effect = slow_render
+            results = list(executor.map(lambda _n: get_or_render_pdf('Note text'), range(4)))
+        self.assertEqual(service.return_value.render.call_count, 1)
+        self.assertEqual(len({path for path, _key, _cached in results}), 1)
+
+    def test_key_lock_is_dropped_after_errors_and_late_hits(self):
+        key = pdf_key('Note text')
+        with mock.patch('core.pdf_cache.get_render_service') as service:
+            service.return_value.render.side_effect = RenderQueueFull(3)
+            with self.assertRaises(RenderQueueFull):
+                get_or_render_pdf('Note text')
+        self.assertNotIn(key, pdf_cache._key_locks)
+
+        # Another thread finished the render while this one waited for the lock
+        path = os.path.join(self.tmp, f"{key}.pdf")
+        with mock.patch('core.pdf_cache.cached_path', side_effect=[None, path]):
+            self.assertEqual(get_or_render_pdf('Note text'), (path, key, True))
+        self.assertNotIn(key, pdf_cache._key_locks)
+
+    def test_evicts_least_recently_used_files(self):
+        for n, name in enumerate(['old', 'mid', 'new']):
+            path = os.path.join(self.tmp, f"{name}.pdf")
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            os.utime(path, (1000 + n, 1000 + n))
+        self.assertEqual(evict_pdfs(max_bytes=150), 2)
+        self.assertEqual(os.listdir(self.tmp), ['new.pdf'])
+
+
+class RenderServiceMixin(PDFCacheMixin):
+    """A render service on a thread pool instead of worker processes, recording into fresh metrics"""
+
+    def setUp(self):
+        super().setUp()
+        self.service = PDFRenderService(workers=2, queue_size=2)
+        self.service._executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.service._executor.shutdown)
+        render_seconds = metrics.Histogram('test_pdf_render_seconds', 'Test renders', ['phase'])
+        render_failures = metrics.Counter('test_pdf_render_failures_total', 'Test render failures', ['reason'])
+        for metric in [render_seconds, render_failures]:
+            self.addCleanup(metrics.REGISTRY.remove, metric)
+        for patcher in [mock.patch.object(pdf_service, '_service', self.service),
+                        mock.patch.object(metrics, 'PDF_RENDER_SECONDS', render_seconds),
+                        mock.patch.object(metrics, 'PDF_RENDER_FAILURES', render_failures)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class DownloadPDFTests(RenderServiceMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.note = '# Concept Note\n\nBody text'
+        ConceptProject.objects.create(session_id='pdf-1', client_name='Acme', final_concept_note=self.note)
+
+    def test_download_sets_etag_and_answers_304_when_it_matches(self):
+        response = self.client.get('/api/download-pdf/', {'session_id': 'pdf-1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(response['ETag'], f'"{pdf_key(self.note, "Acme")}"')
+        self.assertEqual(response['X-PDF-Cache'], 'miss')
+        response.close()
+
+        again = self.client.get('/api/download-pdf/', {'session_id': 'pdf-1'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        stale = self.client.get('/api/download-pdf/', {'session_id': 'pdf-1'}, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual((stale.status_code, stale['X-PDF-Cache']), (200, 'hit'))
+        stale.close()
+
+
+class PDFRenderTests(SimpleTestCase):
+    def describe(self, story):
+        described = []
+        for flowable in story:
+            if isinstance(flowable, Paragraph):
+                described.append((flowable.style.name, flowable.text))
+            elif isinstance(flowable, ListFlowable):
+                described.append(('list', [item._flowables[0].text for item in flowable._flowables]))
+            elif isinstance(flowable, Table):
+                described.append(('table', len(flowable._cellvalues)))
+        return described
+
+    def test_headings_lists_and_inline_bold(self):
+        story = build_story(
+            "# Overview\n"
+            "Some **bold** words & more\n"
+            "continued line\n\n"
+            "### Details\n"
+            "- first\n"
+            "- second with *italic*\n"
+            "1. ABOUT US\n"
+            "2. step two\n"
+            "3. step three\n"
+            "**Key Benefits:**\n"
+            "| Phase | Weeks |\n|---|---|\n| Build | 6 |\n"
+        )
+        self.assertEqual(self.describe(story), [
+            (HEADING_STYLE.name, 'Overview'),
+            (BODY_STYLE.name, 'Some <b>bold</b> words &amp; more continued line'),
+            (SUBHEADING_STYLE.name, 'Details'),
+            ('list', ['first', 'second with <i>italic</i>']),
+            (HEADING_STYLE.name, '1. ABOUT US'),
+            ('list', ['step two', 'step three']),
+            (SUBHEADING_STYLE.name, 'Key Benefits:'),
+            ('table', 2),
+        ])
+
+    def test_numbered_list_keeps_its_start(self):
+        story = build_story("4. fourth\n5. fifth")
+        self.assertEqual(story[0]._start, 4)
+
+    def test_client_name_is_the_title(self):
+        story = build_story("Body", client_name='Acme & Co')
+        self.assertEqual((story[0].style.name, story[0].text), (CLIENT_STYLE.name, 'Acme &amp; Co'))
+
+    def test_renders_a_readable_pdf(self):
+        buffer = render_concept_note("# Overview\n- **Scheduling** for clinics", client_name='Acme')
+        text = extract_pdf_text(buffer).text
+        self.assertIn('Acme', text)
+        self.assertIn('Scheduling for clinics', text)
+
+
+class PDFRenderServiceTests(RenderServiceMixin, TestCase):
+    def block_renders(self):
+        """Make renders wait until the returned event is set"""
+        release = threading.Event()
+
+        def blocked_render(text, client_name=None):
+            release.wait(5)
+            return b'%PDF-1.4', 0.01
+
+        patcher = mock.patch.object(pdf_service, 'render_pdf_bytes', side_effect=blocked_render)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(release.set)
+        return release
+
+    def wait_until_idle(self):
+        # Future.result() can return before the done callback has freed the slot
+        deadline = time.monotonic() + 5
+        while self.service.stats()['in_flight'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_full_queue_is_rejected_until_a_slot_frees(self):
+        release = self.block_renders()
+        futures = [self.service.submit('one'), self.service.submit('two')]
+        with self.assertRaises(RenderQueueFull) as raised:
+            self.service.submit('three')
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+        self.wait_until_idle()
+        self.assertEqual(self.service.render('four', timeout=5), b'%PDF-1.4')
+        self.wait_until_idle()
+        stats = self.service.stats()
+        self.assertEqual((stats['in_flight'], stats['rendered'], stats['rejected']), (0, 3, 1))
+
+    def test_stats_and_retry_after_come_from_the_render_histogram(self):
+        for seconds in [0.5, 3.5]:
+            metrics.PDF_RENDER_SECONDS.observe(seconds / 2, phase='render')
+            metrics.PDF_RENDER_SECONDS.observe(seconds, phase='total')
+        metrics.PDF_RENDER_FAILURES.inc(reason='error')
+        stats = self.service.stats()
+        self.assertEqual((stats['rendered'], stats['failed'], stats['rejected']), (2, 1, 0))
+        self.assertEqual((stats['render_seconds'], stats['total_seconds'], stats['mean_latency']), (2.0, 4.0, 2.0))
+        self.assertEqual((stats['latency_buckets']['0.5'], stats['latency_buckets']['5']), (1, 1))
+        release = self.block_renders()
+        self.service.submit('one')
+        self.service.submit('two')
+        self.assertEqual(self.service.retry_after(), 2)
+        release.set()
+        self.wait_until_idle()
+
+    def test_download_answers_503_with_retry_after_when_saturated(self):
+        ConceptProject.objects.create(session_id='busy-1', client_name='Acme', final_concept_note='Note')
+        with mock.patch.object(self.service, 'submit', side_effect=RenderQueueFull(7)):
+            response = self.client.get('/api/download-pdf/', {'session_id': 'busy-1'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+
+
+class ExportTests(PDFCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('core.export.ProcessPoolExecutor', ThreadPoolExecutor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for session_id, day, note in [('jan-1', 5, '# January note'), ('feb-1', 35, '# February note'),
+                                      ('feb-2', 36, ''), ('mar-1', 70, '# March note')]:
+            project = ConceptProject.objects.create(session_id=session_id, client_name='Acme',
+                                                    final_concept_note=note)
+            ConceptProject.objects.filter(pk=project.pk).update(
+                created_at=timezone.make_aware(datetime(2026, 1, 1)) + timedelta(days=day)
+            )
+
+    def read_zip(self, chunks):
+        return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+    def test_archive_holds_one_pdf_per_note_and_a_manifest(self):
+        archive = self.read_zip(stream_export(date(2026, 1, 1), date(2026, 2, 28), workers=2))
+        self.assertEqual(archive.namelist(), ['concept_note_jan-1.pdf', 'concept_note_feb-1.pdf', 'index.csv'])
+        rows = list(csv.DictReader(io.StringIO(archive.read('index.csv').decode())))
+        self.assertEqual([row['session_id'] for row in rows], ['jan-1', 'feb-1'])
+        for row in rows:
+            pdf = archive.read(row['filename'])
+            self.assertTrue(pdf.startswith(b'%PDF'))
+            self.assertEqual(int(row['bytes']), len(pdf))
+            self.assertEqual(row['client_name'], 'Acme')
+
+    def test_cached_pdfs_are_not_rendered_again(self):
+        with open(os.path.join(self.tmp, f"{pdf_key('# March note', 'Acme')}.pdf"), 'wb') as f:
+            f.write(b'%PDF cached')
+        with mock.patch('core.export.render_pdf_bytes') as render:
+            archive = self.read_zip(stream_export(date(2026, 3, 1), None, workers=1))
+        render.assert_not_called()
+        self.assertEqual(archive.read('concept_note_mar-1.pdf'), b'%PDF cached')
+
+    def test_view_is_staff_only_and_validates_dates(self):
+        self.assertEqual(self.client.get('/api/export-concept-notes/').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get('/api/export-concept-notes/', {'from': 'soon'}).status_code, 400)
+        response = self.client.get('/api/export-concept-notes/', {'from': '2026-03-01'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(self.read_zip(response.streaming_content).namelist(),
+                         ['concept_note_mar-1.pdf', 'index.csv'])
+
+
+class ClaimJobsTests(TestCase):
+    def job(self, minutes_ago=0, **fields):
+        job = Job.objects.create(kind=Job.KIND_RECOMMENDATIONS, payload={'session_id': 's'})
+        Job.objects.filter(pk=job.pk).update(created_at=timezone.now() - timedelta(minutes=minutes_ago), **fields)
+        return Job.objects.get(pk=job.pk)
+
+    def test_claims_oldest_queued_jobs_up_to_limit(self):
+        newest = self.job(minutes_ago=1)
+        oldest = self.job(minutes_ago=3)
+        middle = self.job(minutes_ago=2)
+        claimed = claim_jobs('worker-a', limit=2)
+        self.assertEqual([job.pk for job in claimed], [oldest.pk, middle.pk])
+        for job in claimed:
+            self.assertEqual((job.status, job.worker, job.attempts), (Job.STATUS_RUNNING, 'worker-a', 1))
+            self.assertIsNotNone(job.started_at)
+        self.assertEqual(Job.objects.get(pk=newest.pk).status, Job.STATUS_QUEUED)
+
+    def test_claimed_job_is_not_claimed_again(self):
+        job = self.job()
+        self.assertEqual([claimed.pk for claimed in claim_jobs('worker-a')], [job.pk])
+        self.assertEqual(claim_jobs('worker-b'), [])
+        self.assertEqual(Job.objects.get(pk=job.pk).worker, 'worker-a')
+
+    def test_lost_race_is_not_returned(self):
+        job = self.job()
+        real_filter = Job.objects.filter
+
+        def filter_after_rival(*args, **kwargs):
+            # Another worker claims the row between our SELECT and our UPDATE
+            if kwargs.get('pk') == job.pk:
+                real_filter(pk=job.pk).update(status=Job.STATUS_RUNNING, worker='worker-b', started_at=timezone.now())
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Job.objects, 'filter', side_effect=filter_after_rival):
+            self.assertEqual(claim_jobs('worker-a'), [])
+        self.assertEqual(Job.objects.get(pk=job.pk).worker, 'worker-b')
+
+    def test_stale_running_job_is_reclaimed(self):
+        stale = self.job(status=Job.STATUS_RUNNING, worker='dead', attempts=1,
+                         started_at=timezone.now() - timedelta(minutes=30))
+        self.job(status=Job.STATUS_RUNNING, worker='alive', attempts=1, started_at=timezone.now())
+        claimed = claim_jobs('worker-a', limit=5, stale_after=timedelta(minutes=15))
+        self.assertEqual([job.pk for job in claimed], [stale.pk])
+        self.assertEqual((claimed[0].worker, claimed[0].attempts), ('worker-a', 2))
+
+    def test_exhausted_job_is_failed_not_reclaimed(self):
+        job = self.job(status=Job.STATUS_RUNNING, worker='dead', attempts=3,
+                       started_at=timezone.now() - timedelta(minutes=30))
+        self.assertEqual(claim_jobs('worker-a', stale_after=timedelta(minutes=15), max_attempts=3), [])
+        self.assertEqual(fail_exhausted(stale_after=timedelta(minutes=15), max_attempts=3), 1)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_FAILED)
+
+    def test_finished_jobs_are_ignored(self):
+        self.job(status=Job.STATUS_DONE, started_at=timezone.now() - timedelta(hours=1))
+        self.job(status=Job.STATUS_FAILED, started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(claim_jobs('worker-a', limit=5), [])
+
+
+class FakeClock:
+    """time.time/time.sleep stand-in: sleeping advances the clock"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class RateLimiterTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        for patcher in [mock.patch('core.rate_limit.time.time', self.clock.time),
+                        mock.patch('core.rate_limit.time.monotonic', self.clock.time),
+                        mock.patch('core.rate_limit.time.sleep', self.clock.sleep),
+                        # Jitter and backoff always take their upper bound
+                        mock.patch('core.rate_limit.random.uniform', side_effect=lambda low, high: high)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def limiter(self, **kwargs):
+        return RateLimiter(os.path.join(self.tmp, 'limits.sqlite3'), **kwargs)
+
+    def test_bucket_refills_at_the_configured_rate(self):
+        limiter = self.limiter(requests_per_minute=60, tokens_per_minute=0)
+        for _ in range(60):
+            self.assertEqual(limiter.acquire(), 0.0)
+        self.assertEqual(self.clock.slept, [])
+        # Empty bucket: one request refills in a second (plus the 0.05s jitter)
+        self.assertAlmostEqual(limiter.acquire(), 1.05)
+        stats = limiter.stats()
+        self.assertEqual((stats['acquired'], stats['waits']), (61, 1))
+
+    def test_token_budget_limits_large_prompts(self):
+        limiter = self.limiter(requests_per_minute=0, tokens_per_minute=600)
+        limiter.acquire(tokens=500)
+        limiter.acquire(tokens=300)   # 200 tokens short: 20s at 10 tokens/s
+        self.assertAlmostEqual(self.clock.slept[0], 20.05)
+
+    def test_waits_past_max_wait_are_rejected(self):
+        limiter = self.limiter(requests_per_minute=1, max_wait=5)
+        limiter.acquire()
+        with self.assertRaises(ResourceExhausted):
+            limiter.acquire()
+        self.assertEqual(limiter.stats()['rejected'], 1)
+
+    @override_settings(LLM_RETRY_BASE_SECONDS=1.0, LLM_RETRY_MAX_SECONDS=3.0)
+    def test_retries_back_off_exponentially_up_to_the_cap(self):
+        limiter = self.limiter()
+        call = mock.Mock(side_effect=[ResourceExhausted('quota')] * 3 + ['ok'])
+        self.assertEqual(call_with_retry(call, 'prompt', limiter, attempts=4), 'ok')
+        self.assertEqual(self.clock.slept, [1.0, 2.0, 3.0])
+        self.assertEqual(limiter.stats()['retries'], 3)
+
+    def test_last_error_is_raised_when_attempts_run_out(self):
+        call = mock.Mock(side_effect=ResourceExhausted('quota'))
+        with self.assertRaises(ResourceExhausted):
+            call_with_retry(call, 'prompt', attempts=2)
+        self.assertEqual(call.call_count, 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.release = threading.Event()
+
+    def run_concurrently(self, flights, func, callers=4):
+        """Call flights.do('key', func) from several threads while the first call is still running"""
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            futures = [executor.submit(flights.do, 'key', func) for _ in range(callers)]
+            deadline = time.monotonic() + 5
+            while flights.stats()['coalesced'] < callers - 1 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            self.release.set()
+            return futures
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        def work():
+            calls.append(1)
+            self.release.wait(5)
+            return 'result'
+
+        futures = self.run_concurrently(flights, work)
+        results = sorted((future.result() for future in futures), key=lambda result: result[1])
+        self.assertEqual(results, [('result', False)] + [('result', True)] * 3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats(), {'in_flight': 0, 'leaders': 1, 'coalesced': 3})
+
+    def test_followers_receive_the_leaders_error(self):
+        flights = SingleFlight()
+
+        def fail():
+            self.release.wait(5)
+            raise ResourceExhausted('quota')
+
+        for future in self.run_concurrently(flights, fail, callers=3):
+            with self.assertRaises(ResourceExhausted):
+                future.result()
+        # Nothing is remembered once the call has finished
+        self.assertEqual(flights.do('key', lambda: 'again'), ('again', False))
+
+    def test_different_keys_do_not_wait_for_each_other(self):
+        flights = SingleFlight()
+        self.assertEqual(flights.do('a', lambda: flights.do('b', lambda: 'inner')), (('inner', False), False))
+
+
+class GenerateTextCoalescingTests(FakeLLMMixin, SimpleTestCase):
+    backend_options = {'latency': {'distribution': 'constant', 'mean': 0.2}}
+
+    def test_identical_prompts_in_flight_make_one_model_call(self):
+        with mock.patch.object(self.backend, 'generate_content', wraps=self.backend.generate_content) as generate, \
+                ThreadPoolExecutor(max_workers=4) as executor:
+            texts = list(executor.map(lambda _n: ai_handler.generate_text('same prompt', 'fn'), range(4)))
+        self.assertEqual(len(set(texts)), 1)
+        self.assertEqual(generate.call_count, 1)
+
+
+class MetricsExpositionTests(SimpleTestCase):
+    def metric(self, kind, *args, **kwargs):
+        metric = kind(*args, **kwargs)
+        self.addCleanup(metrics.REGISTRY.remove, metric)
+        return metric
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.metric(metrics.Histogram, 'test_seconds', 'Test latency', ['phase'], buckets=(0.1, 1))
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(value, phase='render')
+        self.assertEqual(histogram.header() + histogram.samples(), [
+            '# HELP test_seconds Test latency',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{phase="render",le="0.1"} 1',
+            'test_seconds_bucket{phase="render",le="1"} 2',
+            'test_seconds_bucket{phase="render",le="+Inf"} 3',
+            'test_seconds_sum{phase="render"} 5.55',
+            'test_seconds_count{phase="render"} 3',
+        ])
+
+    def test_counter_label_values_are_escaped(self):
+        counter = self.metric(metrics.Counter, 'test_total', 'Test counter', ['name'])
+        counter.inc(name='say "hi"\n')
+        counter.inc(2, name='say "hi"\n')
+        self.assertEqual(counter.samples(), ['test_total{name="say \\"hi\\"\\n"} 3'])
+
+
+class MetricsViewTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        for patcher in [
+            mock.patch.object(llm_cache, '_cache', LLMResponseCache(os.path.join(self.tmp, 'cache.sqlite3'))),
+            mock.patch.object(rate_limit, '_limiter', RateLimiter(os.path.join(self.tmp, 'limits.sqlite3'))),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_exposes_request_and_shared_metrics(self):
+        self.client.get('/api/get-products/')
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertRegex(text, r'http_responses_total\{view="get_products",status="200"\} \d+')
+        self.assertIn('# TYPE http_request_seconds histogram', text)
+        self.assertIn('# TYPE llm_rate_limit_waits_total counter', text)
+        self.assertIn('pdf_render_queue_size ', text)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+
+class ServerTimingTests(FakeLLMMixin, TestCase):
+    backend_options = {'latency': {'distribution': 'constant', 'mean': 0.05}}
+
+    def timings(self, response):
+        """Server-Timing entry name -> duration in ms"""
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, duration = entry.split(';')[:2]
+            entries[name] = float(duration[len('dur='):])
+        return entries
+
+    def test_api_response_breaks_down_llm_db_and_json(self):
+        response = self.client.post('/api/generate-preview/', {'raw_input': 'A CRM for dentists'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        timings = self.timings(response)
+        self.assertEqual(list(timings), ['llm', 'json', 'db', 'total'])
+        self.assertGreaterEqual(timings['llm'], 50)
+        self.assertLessEqual(timings['llm'], timings['total'])
+        self.assertIn('desc="LLM calls (1)"', response['Server-Timing'])
+
+    def test_only_api_paths_get_the_header(self):
+        self.assertIn('Server-Timing', self.client.get('/api/get-products/'))
+        self.assertNotIn('Server-Timing', self.client.get('/'))
+
+    @override_settings(SERVER_TIMING_ENABLED=False)
+    def test_can_be_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/get-products/'))
+
+
+class ProfilerMiddlewareTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        profiling = override_settings(PROFILING_ENABLED=True, PROFILE_DIR=self.tmp)
+        profiling.enable()
+        self.addCleanup(profiling.disable)
+
+    def test_requested_profile_is_written(self):
+        response = self.client.get('/api/get-products/', {'session_id': 'abc123'}, HTTP_X_PROFILE='1')
+        filename = response['X-Profile-File']
+        self.assertEqual(os.listdir(self.tmp), [filename])
+        self.assertTrue(filename.endswith('_get-products_abc123.prof'))
+        stats = pstats.Stats(os.path.join(self.tmp, filename))
+        self.assertTrue(any(name == 'get_products' for _file, _line, name in stats.stats))
+
+    def test_unrequested_requests_are_not_profiled(self):
+        response = self.client.get('/api/get-products/')
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_concurrent_sync_requests_are_not_profiled(self):
+        middleware = ProfilerMiddleware(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/api/get-products/', HTTP_X_PROFILE='1')
+        with middleware._lock:
+            self.assertNotIn('X-Profile-File', middleware(request))
+        self.assertEqual(os.listdir(self.tmp), [])
+        self.assertIn('X-Profile-File', middleware(request))
+        self.assertFalse(middleware._lock.locked())
+
+    def test_streaming_response_holds_the_profiler_until_consumed(self):
+        middleware = ProfilerMiddleware(lambda request: StreamingHttpResponse(iter([b'a', b'b'])))
+        response = middleware(RequestFactory().get('/api/generate-preview-stream/', HTTP_X_PROFILE='1'))
+        self.assertTrue(middleware._lock.locked())
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertFalse(middleware._lock.locked())
+        self.assertEqual(len(os.listdir(self.tmp)), 1)
+
+    def test_summary_filters_by_endpoint(self):
+        self.client.get('/api/get-products/?profile=1')
+        self.client.get('/?profile=1')
+        out = io.StringIO()
+        call_command('profile_summary', '--dir', self.tmp, '--endpoint', 'get_products', stdout=out)
+        self.assertTrue(out.getvalue().startswith('1 profiles: get-products x1'))
+
+
+class BenchRecommendationsTests(ProductIndexMixin, TestCase):
+    def test_fake_calls_bypass_the_shared_rate_limiter(self):
+        out = io.StringIO()
+        with mock.patch.object(rate_limit, '_limiter', None), \
+                mock.patch.object(rate_limit, 'RateLimiter') as limiter_class:
+            call_command('bench_recommendations', latency=0.01, rounds=1, products=2, stdout=out)
+        limiter_class.assert_not_called()
+        self.assertIn('Speedup:', out.getvalue())
@@ -1,21 +1,38 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('api/generate-preview/', views.generate_preview, name='generate_preview'),
+    path('api/generate-preview-stream/', views.generate_preview_stream, name='generate_preview_stream'),
     path('api/get-clarifications/', views.get_clarifications, name='get_clarifications'),
     path('api/save-clarification/', views.save_clarification, name='save_clarification'),
     path('api/get-recommendations/', views.get_recommendations, name='get_recommendations'),
     path('api/generate-final-note/', views.generate_final_note, name='generate_final_note'),
+    path('api/generate-final-note-stream/', views.generate_final_note_stream, name='generate_final_note_stream'),
     path('api/get-products/', views.get_products, name='get_products'),
     path('api/upload-file/', views.upload_file, name='upload_file'), 
     path('api/download-pdf/', views.download_pdf, name='download_pdf'),
+    path('api/export-concept-notes/', views.export_concept_notes, name='export_concept_notes'),
     path('api/get-ai-suggestion/', views.get_ai_suggestion, name='get_ai_suggestion'),
     path('api/initiate-project/', views.initiate_project, name='initiate_project'),
     path('api/save-pre-preview-answers/', views.save_pre_preview_answers, name='save_pre_preview_answers'),
     path('api/upload-supporting-document/', views.upload_supporting_document, name='upload_supporting_document'),
     path('api/chat-edit-assistant/', views.chat_edit_assistant, name='chat_edit_assistant'),
+    path('api/stats/', views.get_stats, name='get_stats'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('api/jobs/submit/', views.submit_job_view, name='submit_job'),
+    path('api/jobs/<uuid:job_id>/status/', views.job_status, name='job_status'),
+    path('api/jobs/<uuid:job_id>/result/', views.job_result, name='job_result'),
+
+    # Async (ASGI) variants of the LLM-bound endpoints
+    path('api/async/upload-audio/', async_views.upload_audio, name='async_upload_audio'),
+    path('api/async/initiate-project/', async_views.initiate_project, name='async_initiate_project'),
+    path('api/async/generate-preview/', async_views.generate_preview, name='async_generate_preview'),
+    path('api/async/get-recommendations/', async_views.get_recommendations, name='async_get_recommendations'),
+    path('api/async/generate-final-note/', async_views.generate_final_note, name='async_generate_final_note'),
+    path('api/async/get-ai-suggestion/', async_views.get_ai_suggestion, name='async_get_ai_suggestion'),
+    path('api/async/chat-edit-assistant/', async_views.chat_edit_assistant, name='async_chat_edit_assistant'),
 
     
 ]
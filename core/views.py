@@ -1,10 +1,13 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse, FileResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse, HttpResponseNotModified
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
 from django.views.decorators.csrf import csrf_exempt
-from .models import ConceptProject, InternalProduct
+from django.views.decorators.http import condition
+from .models import ConceptProject, InternalProduct, UploadedDocument, Job
 import json
 import uuid
-import google.generativeai as genai
 from google.api_core.exceptions import ResourceExhausted
 import os
 from dotenv import load_dotenv
@@ -12,14 +15,209 @@ load_dotenv()
 
 from .ai_handler import (
     generate_preview as ai_generate_preview,
+    generate_preview_stream as ai_generate_preview_stream,
     generate_clarification_questions,
     generate_concept_note,
+    generate_concept_note_stream,
     generate_pdf,
-    extract_text_from_pdf,
     process_audio_with_gemini,
-    find_internal_matches,
-    search_external_solutions
+    generate_recommendations,
+    INTERNAL_RECOMMENDATIONS_FALLBACK,
+    EXTERNAL_RECOMMENDATIONS_FALLBACK,
 )
+from .llm_cache import get_response_cache
+from .rate_limit import get_rate_limiter
+from .single_flight import get_single_flight, single_flight
+from . import metrics
+from .responses import JsonResponse
+from .llm_backends import get_backend
+from .catalog import catalog_etag, catalog_page
+from .pdf_cache import open_cached_pdf, pdf_key, prerender as prerender_pdf
+from .pdf_service import RenderQueueFull, get_render_service
+from .export import stream_export
+from .jobs import submit_job, job_payload, save_job_upload
+from .clarifications import VersionConflict, append_turn, load_history
+from .documents import (
+    SHA256UploadHandler,
+    get_or_extract_document,
+    parse_document_ids,
+    get_documents,
+    documents_text,
+    attach_documents,
+    supporting_context,
+    document_stats
+)
+
+def _build_preview_input(project):
+    """
+    Original description enriched with the pre-preview clarifications and the
+    supporting document context, as fed to ai_generate_preview
+    """
+    enhanced_input = str(project.raw_input)
+    print(f"DEBUG: Base enhanced_input length: {len(enhanced_input)}")
+    
+    # FIX: Safely handle pre_preview_answers - it might be None
+    if project.pre_preview_answers and isinstance(project.pre_preview_answers, list):
+        enhanced_input += "\n\nCLARIFICATIONS PROVIDED:\n"
+        for answer in project.pre_preview_answers:
+            # FIX: Add type checking to avoid 'NoneType' subscript error
+            if isinstance(answer, dict) and answer.get('value'):
+                question_text = answer.get('question', '')
+                answer_value = answer.get('value', '')
+                enhanced_input += f"- {question_text}: {answer_value}\n"
+        print(f"DEBUG: Added {len(project.pre_preview_answers)} clarifications")
+    else:
+        print(f"DEBUG: No pre_preview_answers or not a list: {project.pre_preview_answers}")
+    
+    # Add PDF context if available (only the head of the documents is read)
+    pdf_snippet = supporting_context(project, 2000)
+    if pdf_snippet:
+        enhanced_input += f"\n\nSUPPORTING DOCUMENTS:\n{pdf_snippet}"
+        print(f"DEBUG: Added PDF context (first 2000 chars)")
+    
+    print(f"DEBUG: Final enhanced_input length: {len(enhanced_input)}")
+    return enhanced_input
+
+
+def _concept_note_inputs(project, selected_internal, selected_external):
+    """
+    Resolve the client name (saving it on the project) and map the project data
+    into generate_concept_note's keyword arguments.
+    Returns (note_inputs, client_name).
+    """
+    # 🎯 FIXED: Extract actual client name intelligently
+    from .ai_handler import extract_client_name_from_content
+    
+    history = load_history(project)
+    actual_client_name = extract_client_name_from_content(
+        project.raw_input or "",
+        project.formatted_preview or "",
+        history
+    )
+    
+    # Save the extracted name for later use
+    project.client_name = actual_client_name
+    project.save(update_fields=['client_name', 'updated_at'])
+
+    note_inputs = _map_concept_note_inputs(project, actual_client_name, selected_internal, selected_external, history)
+    return note_inputs, actual_client_name
+
+
+def _map_concept_note_inputs(project, actual_client_name, selected_internal, selected_external, history):
+    """
+    Map the project data into generate_concept_note's keyword arguments.
+    `history` is the project's clarification history (core.clarifications.load_history).
+    """
+    # ✅ Build clarifications text safely
+    all_clarifications = "\n".join([
+        f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}"
+        for item in history or []
+    ])
+
+    # 🧩 Map existing data into the concept note fields
+    # Use the ACTUAL project content, not generic labels
+    note_inputs = {
+        'description': project.raw_input or "No description provided.",
+        'highlight_points': " ".join(selected_internal[:3]) if selected_internal else "Standard emphasis",
+        'document_content': project.formatted_preview or "No detailed preview available.",
+        'client_vision': all_clarifications or "No clarifications provided yet.",
+        'extracted_requirements': all_clarifications or "No explicit requirements extracted.",
+        'solution_design': "\n".join(selected_internal) if selected_internal else "Solution design to be finalized.",
+        'external_features': "\n".join(selected_external) if selected_external else "External technologies not specified.",
+        'implementation_plan': "Implementation roadmap to be developed collaboratively with the client.",
+        'reference_context': f"Session ID: {project.session_id}\nClient/Project: {actual_client_name}",
+    }
+    return note_inputs
+
+
+def _recommendations_payload(project):
+    """
+    Internal/external recommendations for a project, generated once and then
+    served from the project row. Shared by get_recommendations and the job worker.
+    """
+    # Check if recommendations already exist (caching). A branch that fell back
+    # to its "try again" message is not a result, so it is generated again.
+    if (project.internal_recommendations and project.external_recommendations
+            and project.internal_recommendations != INTERNAL_RECOMMENDATIONS_FALLBACK
+            and project.external_recommendations != EXTERNAL_RECOMMENDATIONS_FALLBACK):
+        return {
+            'internal': project.internal_recommendations,
+            'external': project.external_recommendations,
+            'cached': True
+        }
+    
+    # Generate new recommendations
+    internal_products = InternalProduct.objects.all()
+    
+    all_clarifications = "\n".join([
+        f"Q: {item['question']}\nA: {item['answer']}"
+        for item in load_history(project)
+    ])
+    
+    # Internal and external branches run concurrently, each with its own
+    # timeout and fallback message. Duplicate requests for the session that
+    # arrive meanwhile (double-clicks, client retries) wait for this result.
+    internal, external = single_flight(
+        ('recommendations', project.session_id),
+        lambda: generate_recommendations(project.formatted_preview, all_clarifications, internal_products)
+    )
+    
+    # Cache the recommendations, except branches that timed out or failed
+    update_fields = []
+    if internal != INTERNAL_RECOMMENDATIONS_FALLBACK:
+        project.internal_recommendations = internal
+        update_fields.append('internal_recommendations')
+    if external != EXTERNAL_RECOMMENDATIONS_FALLBACK:
+        project.external_recommendations = external
+        update_fields.append('external_recommendations')
+    if update_fields:
+        project.save(update_fields=update_fields + ['updated_at'])
+    
+    return {
+        'internal': str(internal) if internal else "No internal recommendations available.",
+        'external': str(external) if external else "No external recommendations available.",
+        'cached': False
+    }
+
+
+def _final_note_payload(project, selected_internal, selected_external):
+    """Generate and save the final concept note. Shared by generate_final_note and the job worker."""
+    note_inputs, actual_client_name = _concept_note_inputs(project, selected_internal, selected_external)
+
+    # ✅ Generate the concept note using your AI function
+    concept_note = generate_concept_note(**note_inputs)
+
+    # ✅ Save to DB
+    project.final_concept_note = concept_note
+    project.save(update_fields=['final_concept_note', 'updated_at'])
+    prerender_pdf(concept_note, actual_client_name)
+
+    return {
+        'session_id': project.session_id,
+        'concept_note': concept_note,
+        'client_name': actual_client_name  # Return for frontend use
+    }
+
+
+def _job_accepted(job):
+    """202 response pointing at a queued job's status and result endpoints"""
+    response = JsonResponse(job_payload(job), status=202)
+    response['Location'] = job_payload(job)['status_url']
+    return response
+
+
+def _sse(data, event=None):
+    """Format one Server-Sent Events frame with a JSON payload"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
 
 def index(request):
     return render(request, 'chat.html')
@@ -41,30 +239,48 @@ def upload_audio(request):
             return JsonResponse({'error': str(e)}, status=500)
 
 @csrf_exempt
+@condition(etag_func=catalog_etag)
 def get_products(request):
+    """
+    Product catalog page: ?limit=N&cursor=<next_cursor of the previous page>.
+    Unchanged pages are answered with 304 Not Modified (If-None-Match).
+    """
     if request.method == 'GET':
         try:
-            products = InternalProduct.objects.all()
-            products_list = [
-                {'id': p.id, 'name': p.name, 'description': p.description[:100] if p.description else ''}
-                for p in products
-            ]
-            return JsonResponse({'products': products_list})
+            products_list, next_cursor = catalog_page(request.GET.get('cursor'), request.GET.get('limit'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
+        response = JsonResponse({'products': products_list, 'next_cursor': next_cursor})
+        # Let the browser keep the page but revalidate it with the ETag every time
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+    return JsonResponse({'error': 'GET method required'}, status=405)
 
 @csrf_exempt
 def upload_file(request):
     if request.method == 'POST':
         try:
+            hasher = SHA256UploadHandler(request)
+            request.upload_handlers.insert(0, hasher)
             uploaded_file = request.FILES.get('file')
             if not uploaded_file:
                 return JsonResponse({'error': 'No file provided'}, status=400)
-            file_text = extract_text_from_pdf(uploaded_file)
+            # Prompts only read the head of the document: stop parsing at the budget
+            document, cached = get_or_extract_document(
+                uploaded_file, max_chars=settings.PDF_TEXT_MAX_CHARS, sha256=hasher.digests.get('file')
+            )
+            # The text stays server-side; later steps refer to it by document_id
             return JsonResponse({
                 'success': True,
-                'extracted_text': file_text,
-                'filename': uploaded_file.name
+                'document_id': document.sha256,
+                'filename': uploaded_file.name,
+                'char_count': document.char_count,
+                'page_count': document.page_count,
+                'pages_read': document.pages_read,
+                'truncated': document.truncated,
+                'cached': cached
             })
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
@@ -79,11 +295,19 @@ def initiate_project(request):
             data = json.loads(request.body)
             raw_input = data.get('raw_input', '').strip()
             highlight_points = data.get('highlight_points', '')
-            pdf_text = data.get('pdf_text', '')
             
             if not raw_input:
                 return JsonResponse({'error': 'Description is required'}, status=400)
             
+            # Uploaded documents are referenced by id; 'pdf_text' is still
+            # accepted from older clients
+            try:
+                documents = get_documents(parse_document_ids(data))
+            except UploadedDocument.DoesNotExist as e:
+                return JsonResponse({'error': str(e)}, status=404)
+            legacy_text = data.get('pdf_text', '')
+            pdf_text = documents_text(documents, legacy_text)
+            
             # Create session
             session_id = str(uuid.uuid4())[:8]
             
@@ -95,9 +319,9 @@ def initiate_project(request):
             project = ConceptProject.objects.create(
                 session_id=session_id,
                 raw_input=raw_input,
-                uploaded_pdf_text=pdf_text,
                 pre_preview_questions=questions
             )
+            attach_documents(project, documents, legacy_text)
             
             return JsonResponse({
                 'success': True,
@@ -166,27 +390,37 @@ def upload_supporting_document(request):
     """
     if request.method == 'POST':
         try:
+            hasher = SHA256UploadHandler(request)
+            request.upload_handlers.insert(0, hasher)
             session_id = request.POST.get('session_id')
             uploaded_file = request.FILES.get('file')
             
             if not session_id or not uploaded_file:
                 return JsonResponse({'error': 'Missing session_id or file'}, status=400)
             
-            # Extract text from PDF
-            file_text = extract_text_from_pdf(uploaded_file)
+            # Extract text from PDF (up to the character budget, or all of it
+            # page-parallel when SUPPORTING_DOCUMENT_MAX_CHARS is 0), reusing earlier uploads
+            max_chars = getattr(settings, 'SUPPORTING_DOCUMENT_MAX_CHARS', settings.PDF_TEXT_MAX_CHARS) or None
+            document, _cached = get_or_extract_document(
+                uploaded_file, max_chars=max_chars, sha256=hasher.digests.get('file')
+            )
             
-            # Append to existing PDF text
-            project = ConceptProject.objects.get(session_id=session_id)
-            existing_text = project.uploaded_pdf_text or ""
-            project.uploaded_pdf_text = f"{existing_text}\n\n--- Additional Document: {uploaded_file.name} ---\n{file_text}"
-            project.save()
+            # Append-only: one new SupportingDocument row, the project row is untouched
+            project = ConceptProject.objects.only('id', 'session_id').get(session_id=session_id)
+            attach_documents(project, [document])
             
             return JsonResponse({
                 'success': True,
                 'filename': uploaded_file.name,
+                'char_count': document.char_count,
+                'page_count': document.page_count,
+                'truncated': document.truncated,
+                'documents': document_stats(project),
                 'message': 'Supporting document uploaded successfully'
             })
             
+        except ConceptProject.DoesNotExist:
+            return JsonResponse({'error': 'Project not found'}, status=404)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
     
@@ -201,7 +435,7 @@ def generate_preview(request):
     """
     if request.method == 'POST':
         # Check for API key
-        if not os.getenv("GOOGLE_API_KEY"):
+        if not get_backend().is_configured():
             return JsonResponse({
                 'error': 'Server configuration error: Google API key is not set.'
             }, status=500)
@@ -279,8 +513,8 @@ def generate_preview(request):
                     print(f"DEBUG: Added {len(project.pre_preview_answers)} clarifications to highlights")
                 
                 # Add PDF context to highlights if available
-                if project.uploaded_pdf_text:
-                    pdf_snippet = str(project.uploaded_pdf_text)[:2000]
+                pdf_snippet = supporting_context(project, 2000)
+                if pdf_snippet:
                     highlight_points_enhanced += f"\n\nSUPPORTING DOCUMENTS:\n{pdf_snippet}"
                     print(f"DEBUG: Added PDF context")
                 
@@ -344,7 +578,7 @@ def generate_preview(request):
     """
     if request.method == 'POST':
         # Check for API key
-        if not os.getenv("GOOGLE_API_KEY"):
+        if not get_backend().is_configured():
             return JsonResponse({
                 'error': 'Server configuration error: Google API key is not set.'
             }, status=500)
@@ -368,6 +602,13 @@ def generate_preview(request):
                         'error': 'raw_input is required'
                     }, status=400)
                 
+                try:
+                    documents = get_documents(parse_document_ids(data))
+                except UploadedDocument.DoesNotExist as e:
+                    return JsonResponse({'error': str(e)}, status=404)
+                if documents:
+                    highlight_points = f"{highlight_points}\n\nSUPPORTING DOCUMENTS:\n{documents_text(documents)[:2000]}"
+                
                 session_id = str(uuid.uuid4())[:8]
                 
                 try:
@@ -406,37 +647,20 @@ def generate_preview(request):
                     }, status=404)
                 
                 # Safely get raw_input with fallback
-                enhanced_input = ""
-                if project.raw_input:
-                    enhanced_input = str(project.raw_input)
-                else:
+                if not project.raw_input:
                     print("WARNING: project.raw_input is None or empty")
                     return JsonResponse({
                         'error': 'No initial input found for this project. Please start over.'
                     }, status=400)
                 
-                print(f"DEBUG: Base enhanced_input length: {len(enhanced_input)}")
-                
-                # FIX: Safely handle pre_preview_answers - it might be None
-                if project.pre_preview_answers and isinstance(project.pre_preview_answers, list):
-                    enhanced_input += "\n\nCLARIFICATIONS PROVIDED:\n"
-                    for answer in project.pre_preview_answers:
-                        # FIX: Add type checking to avoid 'NoneType' subscript error
-                        if isinstance(answer, dict) and answer.get('value'):
-                            question_text = answer.get('question', '')
-                            answer_value = answer.get('value', '')
-                            enhanced_input += f"- {question_text}: {answer_value}\n"
-                    print(f"DEBUG: Added {len(project.pre_preview_answers)} clarifications")
-                else:
-                    print(f"DEBUG: No pre_preview_answers or not a list: {project.pre_preview_answers}")
-                
-                # Add PDF context if available
-                if project.uploaded_pdf_text:
-                    pdf_snippet = str(project.uploaded_pdf_text)[:2000]
-                    enhanced_input += f"\n\nSUPPORTING DOCUMENTS:\n{pdf_snippet}"
-                    print(f"DEBUG: Added PDF context (first 2000 chars)")
+                # Documents uploaded since initiate_project are attached by id
+                try:
+                    documents = get_documents(parse_document_ids(data))
+                except UploadedDocument.DoesNotExist as e:
+                    return JsonResponse({'error': str(e)}, status=404)
+                attach_documents(project, documents)
                 
-                print(f"DEBUG: Final enhanced_input length: {len(enhanced_input)}")
+                enhanced_input = _build_preview_input(project)
                 
                 # Generate enhanced preview
                 try:
@@ -479,6 +703,87 @@ def generate_preview(request):
     
     return JsonResponse({'error': 'POST method required'}, status=405)
 
+@csrf_exempt
+def generate_preview_stream(request):
+    """
+    Streaming variant of generate_preview (Server-Sent Events).
+    Events: "start" (session_id), unnamed delta frames ({"delta": text}),
+    then "done" with the full preview, or "error".
+    The finished preview is saved to ConceptProject.formatted_preview.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=405)
+    
+    if not get_backend().is_configured():
+        return JsonResponse({
+            'error': 'Server configuration error: Google API key is not set.'
+        }, status=500)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    session_id = data.get('session_id')
+    try:
+        documents = get_documents(parse_document_ids(data))
+    except UploadedDocument.DoesNotExist as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    project = None
+    if session_id:
+        try:
+            project = ConceptProject.objects.get(session_id=session_id)
+        except ConceptProject.DoesNotExist:
+            return JsonResponse({
+                'error': f'Project not found for session {session_id}'
+            }, status=404)
+        if not project.raw_input:
+            return JsonResponse({
+                'error': 'No initial input found for this project. Please start over.'
+            }, status=400)
+        attach_documents(project, documents)
+        raw_input = _build_preview_input(project)
+        highlight_points = ""
+    else:
+        # OLD FLOW: Direct preview generation without pre-clarifications
+        raw_input = data.get('raw_input')
+        highlight_points = data.get('highlight_points', '')
+        if not raw_input:
+            return JsonResponse({'error': 'raw_input is required'}, status=400)
+        if documents:
+            highlight_points = f"{highlight_points}\n\nSUPPORTING DOCUMENTS:\n{documents_text(documents)[:2000]}"
+        session_id = str(uuid.uuid4())[:8]
+    
+    def events():
+        yield _sse({'session_id': session_id}, event='start')
+        parts = []
+        try:
+            for chunk in ai_generate_preview_stream(raw_input, highlight_points):
+                parts.append(chunk)
+                yield _sse({'delta': chunk})
+        except ResourceExhausted:
+            yield _sse({'error': 'Quota exceeded. Please wait a moment and try again.', 'status': 429}, event='error')
+            return
+        except Exception as ai_error:
+            import traceback
+            print(f"DEBUG: AI streaming error: {traceback.format_exc()}")
+            yield _sse({'error': f'AI generation failed: {str(ai_error)}', 'status': 500}, event='error')
+            return
+        
+        formatted_preview = "".join(parts).strip()
+        if project is not None:
+            project.formatted_preview = formatted_preview
+            project.save()
+        else:
+            ConceptProject.objects.create(
+                session_id=session_id,
+                raw_input=raw_input,
+                formatted_preview=formatted_preview
+            )
+        yield _sse({'session_id': session_id, 'preview': formatted_preview}, event='done')
+    
+    return _sse_response(events())
+
 @csrf_exempt
 def get_clarifications(request):
     if request.method == 'POST':
@@ -487,7 +792,7 @@ def get_clarifications(request):
         project = ConceptProject.objects.get(session_id=session_id)
         questions = generate_clarification_questions(
             project.formatted_preview,
-            project.conversation_history,
+            load_history(project),
             project.raw_input
         )
         return JsonResponse({'questions': questions})
@@ -499,10 +804,16 @@ def save_clarification(request):
         session_id = data.get('session_id')
         question = data.get('question')
         answer = data.get('answer')
-        project = ConceptProject.objects.get(session_id=session_id)
-        project.conversation_history.append({'question': question, 'answer': answer})
-        project.save()
-        return JsonResponse({'status': 'saved'})
+        expected_version = data.get('version')
+        project_id = ConceptProject.objects.filter(session_id=session_id).values_list('pk', flat=True).first()
+        if project_id is None:
+            return JsonResponse({'error': 'Project not found'}, status=404)
+        # One insert plus a version bump, however long the history already is
+        try:
+            turn, version = append_turn(project_id, question, answer, expected_version=expected_version)
+        except VersionConflict as e:
+            return JsonResponse({'error': str(e), 'version': e.current_version}, status=409)
+        return JsonResponse({'status': 'saved', 'turn': turn.ordinal, 'version': version})
 
 @csrf_exempt
 def get_recommendations(request):
@@ -513,52 +824,11 @@ def get_recommendations(request):
         try:
             project = ConceptProject.objects.get(session_id=session_id)
             
-            # Check if recommendations already exist (caching)
-            if project.internal_recommendations and project.external_recommendations:
-                return JsonResponse({
-                    'internal': project.internal_recommendations,
-                    'external': project.external_recommendations,
-                    'cached': True
-                })
-            
-            # Generate new recommendations
-            internal_products = InternalProduct.objects.all()
+            if data.get('background'):
+                # Return 202 at once; poll /api/jobs/<job_id>/status/
+                return _job_accepted(submit_job(Job.KIND_RECOMMENDATIONS, {'session_id': session_id}, session_id))
             
-            all_clarifications = "\n".join([
-                f"Q: {item['question']}\nA: {item['answer']}"
-                for item in project.conversation_history
-            ])
-            
-            # Add error handling for each recommendation type
-            try:
-                internal = find_internal_matches(
-                    project.formatted_preview,
-                    all_clarifications,
-                    internal_products
-                )
-            except Exception as e:
-                print(f"Internal recommendations error: {e}")
-                internal = "Unable to generate internal recommendations at this time. Please try again."
-            
-            try:
-                external = search_external_solutions(
-                    project.formatted_preview,
-                    all_clarifications
-                )
-            except Exception as e:
-                print(f"External recommendations error: {e}")
-                external = "Unable to generate external recommendations at this time. Please try again."
-            
-            # Cache the recommendations
-            project.internal_recommendations = internal
-            project.external_recommendations = external
-            project.save()
-            
-            return JsonResponse({
-                'internal': str(internal) if internal else "No internal recommendations available.",
-                'external': str(external) if external else "No external recommendations available.",
-                'cached': False
-            })
+            return JsonResponse(_recommendations_payload(project))
             
         except ConceptProject.DoesNotExist:
             return JsonResponse({
@@ -592,59 +862,15 @@ def generate_final_note(request):
             except ConceptProject.DoesNotExist:
                 return JsonResponse({'error': f'No project found for session_id {session_id}'}, status=404)
 
-            # ✅ Build clarifications text safely
-            all_clarifications = "\n".join([
-                f"Q: {item.get('question', '')}\nA: {item.get('answer', '')}"
-                for item in project.conversation_history or []
-            ])
-
-            # 🎯 FIXED: Extract actual client name intelligently
-            from .ai_handler import extract_client_name_from_content
-            
-            actual_client_name = extract_client_name_from_content(
-                project.raw_input or "",
-                project.formatted_preview or "",
-                project.conversation_history or []
-            )
-            
-            # Save the extracted name for later use
-            project.client_name = actual_client_name
-            project.save()
-
-            # 🧩 Map existing data into the concept note fields
-            # Use the ACTUAL project content, not generic labels
-            description = project.raw_input or "No description provided."
-            highlight_points = " ".join(selected_internal[:3]) if selected_internal else "Standard emphasis"
-            document_content = project.formatted_preview or "No detailed preview available."
-            client_vision = all_clarifications or "No clarifications provided yet."
-            extracted_requirements = all_clarifications or "No explicit requirements extracted."
-            solution_design = "\n".join(selected_internal) if selected_internal else "Solution design to be finalized."
-            external_features = "\n".join(selected_external) if selected_external else "External technologies not specified."
-            implementation_plan = "Implementation roadmap to be developed collaboratively with the client."
-            reference_context = f"Session ID: {session_id}\nClient/Project: {actual_client_name}"
-
-            # ✅ Generate the concept note using your AI function
-            concept_note = generate_concept_note(
-                description=description,
-                highlight_points=highlight_points,
-                document_content=document_content,
-                client_vision=client_vision,
-                extracted_requirements=extracted_requirements,
-                solution_design=solution_design,
-                external_features=external_features,
-                implementation_plan=implementation_plan,
-                reference_context=reference_context
-            )
-
-            # ✅ Save to DB
-            project.final_concept_note = concept_note
-            project.save()
+            if data.get('background'):
+                # Return 202 at once; poll /api/jobs/<job_id>/status/
+                return _job_accepted(submit_job(Job.KIND_FINAL_NOTE, {
+                    'session_id': session_id,
+                    'selected_internal': selected_internal,
+                    'selected_external': selected_external,
+                }, session_id))
 
-            return JsonResponse({
-                'session_id': session_id,
-                'concept_note': concept_note,
-                'client_name': actual_client_name  # Return for frontend use
-            })
+            return JsonResponse(_final_note_payload(project, selected_internal, selected_external))
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
@@ -655,6 +881,65 @@ def generate_final_note(request):
             return JsonResponse({'error': str(e)}, status=500)
     
     return JsonResponse({'error': 'POST method required'}, status=405)
+
+@csrf_exempt
+def generate_final_note_stream(request):
+    """
+    Streaming variant of generate_final_note (Server-Sent Events).
+    Events: "start" (session_id, client_name), delta frames ({"delta": text}),
+    then "done" with the full concept note, or "error".
+    The finished note is saved to ConceptProject.final_concept_note.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
+    
+    session_id = data.get('session_id')
+    selected_internal = data.get('selected_internal', [])
+    selected_external = data.get('selected_external', [])
+    if not session_id:
+        return JsonResponse({'error': 'Missing session_id'}, status=400)
+    try:
+        project = ConceptProject.objects.get(session_id=session_id)
+    except ConceptProject.DoesNotExist:
+        return JsonResponse({'error': f'No project found for session_id {session_id}'}, status=404)
+    
+    def events():
+        # Flush a first frame before the client-name lookup so the browser
+        # sees the response start immediately
+        yield _sse({'session_id': session_id}, event='start')
+        parts = []
+        try:
+            note_inputs, actual_client_name = _concept_note_inputs(project, selected_internal, selected_external)
+            yield _sse({'client_name': actual_client_name}, event='meta')
+            for chunk in generate_concept_note_stream(**note_inputs):
+                parts.append(chunk)
+                yield _sse({'delta': chunk})
+        except ResourceExhausted:
+            yield _sse({'error': 'Quota exceeded. Please wait a moment and try again.', 'status': 429}, event='error')
+            return
+        except Exception as e:
+            import traceback
+            print("Error streaming final note:", traceback.format_exc())
+            yield _sse({'error': str(e), 'status': 500}, event='error')
+            return
+        
+        concept_note = "".join(parts).strip()
+        project.final_concept_note = concept_note
+        project.save(update_fields=['final_concept_note', 'updated_at'])
+        prerender_pdf(concept_note, actual_client_name)
+        yield _sse({
+            'session_id': session_id,
+            'concept_note': concept_note,
+            'client_name': actual_client_name
+        }, event='done')
+    
+    return _sse_response(events())
+
 @csrf_exempt
 def download_pdf(request):
     import traceback
@@ -695,17 +980,34 @@ def download_pdf(request):
                 client_name = extract_client_name_from_content(
                     project.raw_input or "",
                     project.formatted_preview or "",
-                    project.conversation_history or []
+                    load_history(project)
                 )
+                # Remember it so later downloads hit the PDF cache without a model call
+                project.client_name = client_name
+                project.save(update_fields=['client_name', 'updated_at'])
+            
+            etag = f'"{pdf_key(concept_note_text, client_name)}"'
+            if request.method == 'GET' and etag in parse_etags(request.headers.get('If-None-Match', '')):
+                return HttpResponseNotModified(headers={'ETag': etag})
             
-            # Generate PDF with proper client name
-            pdf_buffer = generate_pdf(concept_note_text, client_name=client_name)
-            pdf_buffer.seek(0)
+            # Rendered PDFs are cached on disk; usually pre-rendered by generate_final_note
+            pdf_file, _key, cached = open_cached_pdf(concept_note_text, client_name=client_name)
+        except RenderQueueFull as e:
+            response = JsonResponse({'error': 'PDF renderer is busy. Please try again shortly.'}, status=503)
+            response['Retry-After'] = str(e.retry_after)
+            return response
         except Exception as e:
             return JsonResponse({'error': f'PDF generation failed: {str(e)}'}, status=500)
 
-        response = FileResponse(pdf_buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="concept_note_{session_id}.pdf"'
+        response = FileResponse(
+            pdf_file,
+            content_type='application/pdf',
+            as_attachment=True,
+            filename=f"concept_note_{session_id}.pdf"
+        )
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['X-PDF-Cache'] = 'hit' if cached else 'miss'
         return response
 
     except Exception as e:
@@ -714,6 +1016,32 @@ def download_pdf(request):
             'error': 'An unexpected error occurred while generating the PDF',
             'details': str(e)
         }, status=500)
+def export_concept_notes(request):
+    """
+    Staff-only ZIP of every final concept note created in a date range
+    (?from=YYYY-MM-DD&to=YYYY-MM-DD, both optional and inclusive), streamed
+    while the PDFs are being rendered.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET method required'}, status=405)
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff login required'}, status=403)
+    start_raw, end_raw = request.GET.get('from'), request.GET.get('to')
+    try:
+        start = parse_date(start_raw) if start_raw else None
+        end = parse_date(end_raw) if end_raw else None
+        if (start_raw and start is None) or (end_raw and end is None):
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'from/to must be dates (YYYY-MM-DD)'}, status=400)
+    
+    response = StreamingHttpResponse(stream_export(start, end), content_type='application/zip')
+    label = f"{start or 'start'}_{end or 'now'}"
+    response['Content-Disposition'] = f'attachment; filename="concept_notes_{label}.zip"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 def get_ai_suggestion(request):
     """
@@ -793,7 +1121,7 @@ def get_ai_suggestion(request):
 def get_ai_suggestion(request):
     if request.method == 'POST':
         try:
-            from .ai_handler import model
+            from .ai_handler import generate_quick_suggestion
             data = json.loads(request.body)
             selected_text = data.get('selected_text', '').strip()
             suggestion_type = data.get('suggestion_type', 'improve')
@@ -802,26 +1130,7 @@ def get_ai_suggestion(request):
             if not selected_text:
                 return JsonResponse({'success': False, 'error': 'No text provided'}, status=400)
 
-            # Build an intelligent prompt for Gemini
-            if multiple:
-                prompt = f"""
-Generate 3 improved variations of the following sentence or paragraph:
-"{selected_text}"
-
-Each version should maintain the same meaning but vary in tone or phrasing.
-Return only the 3 rewritten options, numbered clearly.
-"""
-            else:
-                prompt = f"""
-Rewrite or {suggestion_type} the following text:
-"{selected_text}"
-
-Make it concise, natural, and contextually improved, keeping the same intent.
-Return only the rewritten version, no explanations.
-"""
-
-            response = model.generate_content(prompt)
-            text = response.text.strip()
+            text = generate_quick_suggestion(selected_text, suggestion_type, multiple)
 
             # Format for multiple suggestions
             if multiple:
@@ -868,3 +1177,93 @@ def chat_edit_assistant(request):
             print(traceback.format_exc())
             return JsonResponse({"error": str(e)}, status=500)
     return JsonResponse({"error": "POST method required"}, status=405)
+
+@csrf_exempt
+def submit_job_view(request):
+    """
+    Queue a long-running step and return 202 with its job id.
+    JSON: {"kind": "generate_final_note" | "get_recommendations", "session_id": ..., ...}
+    Multipart: kind=upload_audio with an 'audio' file.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST method required'}, status=405)
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body)
+        else:
+            data = request.POST.dict()
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    kind = data.get('kind')
+    if kind == Job.KIND_AUDIO:
+        uploaded_file = request.FILES.get('audio')
+        if not uploaded_file:
+            return JsonResponse({'error': 'No audio file provided'}, status=400)
+        payload = {'path': save_job_upload(uploaded_file), 'filename': uploaded_file.name}
+        return _job_accepted(submit_job(kind, payload, data.get('session_id', '')))
+    
+    if kind not in (Job.KIND_FINAL_NOTE, Job.KIND_RECOMMENDATIONS):
+        return JsonResponse({'error': f'Unknown job kind: {kind}'}, status=400)
+    session_id = data.get('session_id')
+    if not session_id:
+        return JsonResponse({'error': 'Missing session_id'}, status=400)
+    if not ConceptProject.objects.filter(session_id=session_id).exists():
+        return JsonResponse({'error': f'No project found for session_id {session_id}'}, status=404)
+    payload = {'session_id': session_id}
+    if kind == Job.KIND_FINAL_NOTE:
+        payload['selected_internal'] = data.get('selected_internal', [])
+        payload['selected_external'] = data.get('selected_external', [])
+    return _job_accepted(submit_job(kind, payload, session_id))
+
+
+def job_status(request, job_id):
+    try:
+        job = Job.objects.defer('payload', 'result').get(pk=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    return JsonResponse(job_payload(job))
+
+
+def job_result(request, job_id):
+    """The job's response body once done; 202 while it is queued or running"""
+    try:
+        job = Job.objects.defer('payload').get(pk=job_id)
+    except Job.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+    if job.status == Job.STATUS_DONE:
+        return JsonResponse(job.result or {})
+    if job.status == Job.STATUS_FAILED:
+        return JsonResponse({'error': job.error or 'Job failed', 'job_id': str(job.id)}, status=500)
+    response = JsonResponse(job_payload(job), status=202)
+    response['Retry-After'] = '2'
+    return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's metrics (core/metrics.py)"""
+    if not getattr(settings, 'METRICS_ENABLED', True):
+        return JsonResponse({'error': 'Metrics are disabled'}, status=404)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@csrf_exempt
+def get_stats(request):
+    """
+    Operational counters for the LLM response cache (hits, misses, saved latency),
+    the LLM rate limiter (waits, retries), coalesced duplicate LLM calls and
+    the PDF render pool (queue depth, render latency, rejections)
+    """
+    if request.method == 'GET':
+        try:
+            cache = get_response_cache()
+            limiter = get_rate_limiter()
+            return JsonResponse({
+                'llm_cache': cache.stats() if cache else {'enabled': False},
+                'llm_rate_limit': limiter.stats() if limiter else {'enabled': False},
+                'llm_single_flight': get_single_flight().stats(),
+                'pdf_render': get_render_service().stats()
+            })
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'error': 'GET method required'}, status=405)